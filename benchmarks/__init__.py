@@ -0,0 +1 @@
+"""性能测试工具集（不随主程序加载）"""
@@ -0,0 +1,90 @@
+"""标注数据内存占用对比：普通字典 vs 列式存储
+
+用法:
+    python -m benchmarks.memory [--sizes 100k,1m]
+"""
+import os
+import sys
+import gc
+import json
+import time
+import argparse
+import tracemalloc
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+from benchmarks.run import parse_size
+
+
+def make_annotations(num_images, num_categories=10):
+    """直接生成标注字典（不写图片文件），键和值都来自 json 解析，与实际加载一致"""
+    categories = [f"类别{i + 1}" for i in range(num_categories)]
+    annotations = {
+        os.path.join(f"d{i // 1000:05d}", f"img_{i:07d}.jpg"): {
+            'category': categories[i % num_categories],
+            'category_index': i % num_categories,
+            'timestamp': f"2025-01-01T00:{i // 60 % 60:02d}:{i % 60:02d}.{i % 1000000:06d}"
+        }
+        for i in range(num_images)
+    }
+    return json.dumps(annotations, ensure_ascii=False)
+
+
+def measure(build):
+    """tracemalloc 统计 build() 结果常驻的内存（字节）和耗时"""
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = (time.perf_counter() - start) * 1000
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def bench_size(num_images):
+    from utils.annotation_store import ColumnarAnnotations
+
+    text = make_annotations(num_images)
+    plain, plain_bytes, plain_ms = measure(lambda: json.loads(text))
+    store, store_bytes, store_ms = measure(lambda: ColumnarAnnotations.from_dict(plain))
+
+    paths = list(plain)
+    start = time.perf_counter()
+    store.category_counts(paths)
+    counts_ms = (time.perf_counter() - start) * 1000
+
+    return {
+        "dict_mb": plain_bytes / 1024 / 1024,
+        "columnar_mb": store_bytes / 1024 / 1024,
+        "ratio": plain_bytes / store_bytes if store_bytes else 0.0,
+        "json_load_ms": plain_ms,
+        "from_dict_ms": store_ms,
+        "category_counts_ms": counts_ms,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="标注数据内存占用对比")
+    parser.add_argument("--sizes", default="100k", help="标注条数，逗号分隔，如 100k,1m")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args(argv)
+
+    result = {}
+    for size in (parse_size(s) for s in args.sizes.split(",") if s.strip()):
+        print(f"测试规模 {size}...", file=sys.stderr, flush=True)
+        result[str(size)] = bench_size(size)
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
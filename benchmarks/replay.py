@@ -0,0 +1,134 @@
+"""会话重放
+
+在 offscreen 的 QApplication 中重放录制的会话（主窗口中 Ctrl+Shift+R 录制），
+统计每类事件的处理延迟，可与基线对比用于持续集成中的性能门禁。
+
+用法:
+    python -m benchmarks.replay session.jsonl --annotations data/annotations.json [--folder <图片文件夹>]
+                                [--speed 1] [--output report.json] [--compare baseline.json --threshold 0.2]
+
+--speed 1 为原速，2 为两倍速，0 为不等待、尽快重放。
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def summarize(latencies):
+    """按事件类型汇总延迟"""
+    from utils.instrumentation import percentile
+
+    by_type = {}
+    for event_type, latency in latencies:
+        by_type.setdefault(event_type, []).append(latency)
+    by_type["all"] = [latency for _, latency in latencies]
+
+    summary = {}
+    for event_type, values in by_type.items():
+        values.sort()
+        summary[event_type] = {
+            "count": len(values),
+            "p50": percentile(values, 50),
+            "p95": percentile(values, 95),
+            "p99": percentile(values, 99),
+            "max": values[-1] if values else 0.0,
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="会话重放")
+    parser.add_argument("session", help="会话文件（.jsonl）")
+    parser.add_argument("--annotations", help="标注文件（默认使用空标注）")
+    parser.add_argument("--folder", help="图片文件夹（默认使用会话中记录的根目录）")
+    parser.add_argument("--speed", type=float, default=1.0, help="重放速度倍数，0为尽快重放")
+    parser.add_argument("--output", help="报告JSON输出路径")
+    parser.add_argument("--compare", help="基线报告，p95变慢超过阈值时返回1")
+    parser.add_argument("--threshold", type=float, default=0.2, help="退化阈值比例")
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication, QMessageBox
+    app = QApplication.instance() or QApplication(sys.argv)
+    # 重放中不弹出模态对话框
+    QMessageBox.question = staticmethod(lambda *a, **k: QMessageBox.StandardButton.No)
+    QMessageBox.information = staticmethod(lambda *a, **k: QMessageBox.StandardButton.Ok)
+    QMessageBox.warning = staticmethod(lambda *a, **k: QMessageBox.StandardButton.Ok)
+
+    from ui.session_recorder import load_session, SessionReplayer
+    from utils.file_utils import load_annotations
+    from utils.image_source import canonical_path, is_remote
+
+    header, events = load_session(args.session)
+    folder = args.folder or header.get("image_root", "")
+
+    # 下面会切换到临时目录，相对路径须先转为绝对路径；路径不存在时直接报错，避免静默重放空项目
+    annotations_file = os.path.abspath(args.annotations) if args.annotations else None
+    if annotations_file and not os.path.isfile(annotations_file):
+        print(f"标注文件不存在: {annotations_file}", file=sys.stderr)
+        return 2
+    if folder:
+        folder = canonical_path(folder)
+        if not is_remote(folder) and not os.path.exists(folder):
+            print(f"图片文件夹不存在: {folder}", file=sys.stderr)
+            return 2
+
+    original_cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        # 在临时目录中运行，标注修改不会写回真实文件
+        os.chdir(tmp_dir)
+        try:
+            from ui.main_window import MainWindow
+            window = MainWindow()
+            window.show()
+            while not window.project_loaded:
+                app.processEvents()
+
+            if annotations_file:
+                window.annotations_data = load_annotations(annotations_file)
+                window.category_manager.set_categories(window.annotations_data.get("categories", []))
+            if folder:
+                window.load_images_from_folder(folder)
+
+            latencies = SessionReplayer(window, app).replay(header, events, args.speed)
+
+            window.project_loaded = False
+            window.thumbnail_grid.cache.shutdown()
+            window.background_executor.shutdown(wait=False, cancel_futures=True)
+        finally:
+            os.chdir(original_cwd)
+
+    report = {
+        "session": args.session,
+        "events": len(events),
+        "speed": args.speed,
+        "summary": summarize(latencies),
+    }
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = []
+        for event_type, stats in report["summary"].items():
+            base = baseline.get("summary", {}).get(event_type)
+            if base and base["p95"] > 0 and stats["p95"] > base["p95"] * (1 + args.threshold):
+                regressions.append(event_type)
+                print(f"退化: {event_type} p95 {base['p95']:.2f}ms -> {stats['p95']:.2f}ms", file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+"""端到端性能测试
+
+对不同规模的合成项目计时核心操作，结果写为JSON，并可与之前的结果对比。
+
+用法:
+    python -m benchmarks.run [--sizes 10k,100k,1m] [--workdir /tmp/ica_bench] [--output result.json]
+    python -m benchmarks.run --compare baseline.json [--threshold 0.2]   # 与基线对比，退化时返回1
+    python -m benchmarks.run --no-gui                                     # 跳过主窗口相关测试
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import statistics
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+
+def parse_size(text):
+    """解析 10k / 100k / 1m 形式的规模"""
+    text = text.strip().lower()
+    multiplier = {"k": 1000, "m": 1000000}.get(text[-1:], 1)
+    return int(float(text.rstrip("km")) * multiplier)
+
+
+def timed(func, repeat=3):
+    """运行 repeat 次，返回耗时统计（毫秒）"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {"median_ms": statistics.median(samples), "min_ms": min(samples), "runs": repeat}
+
+
+def per_step(total_ms_stats, steps):
+    """把整体耗时换算为单步耗时"""
+    return {"median_ms": total_ms_stats["median_ms"] / steps,
+            "min_ms": total_ms_stats["min_ms"] / steps,
+            "runs": total_ms_stats["runs"], "steps": steps}
+
+
+def bench_core(image_root, annotations_file, tmp_dir, repeat):
+    """不依赖界面的核心操作"""
+    from utils.file_utils import (get_image_files, load_annotations, save_annotations,
+                                  validate_image_paths, migrate_annotations_to_new_folder)
+    from utils.dataset_exporter import DatasetExporter
+
+    results = {}
+    results["get_image_files"] = timed(lambda: get_image_files(image_root), repeat)
+    results["load_annotations"] = timed(lambda: load_annotations(annotations_file), repeat)
+
+    data = load_annotations(annotations_file)
+    save_path = os.path.join(tmp_dir, "saved.json")
+    results["save_annotations"] = timed(lambda: save_annotations(save_path, data, image_root), repeat)
+    results["validate_image_paths"] = timed(lambda: validate_image_paths(data), repeat)
+
+    def migrate():
+        copy = dict(data, annotations=dict(data["annotations"]))
+        migrate_annotations_to_new_folder(copy, image_root, image_root)
+    results["migrate_annotations_to_new_folder"] = timed(migrate, repeat)
+
+    export_dir = os.path.join(tmp_dir, "export")
+    exporter = DatasetExporter()
+    results["export_dataset"] = timed(lambda: exporter.export_dataset(data, export_dir, copy_images=False), repeat)
+    shutil.rmtree(export_dir, ignore_errors=True)
+    return results
+
+
+def bench_gui(app, image_root, annotations_file, tmp_dir, repeat, steps=50):
+    """主窗口的常用操作（Qt offscreen）"""
+    from ui.main_window import MainWindow
+    from utils.file_utils import load_annotations
+
+    results = {}
+    window = MainWindow()
+    window.show()
+    while not window.project_loaded:
+        app.processEvents()
+
+    window.annotations_data = load_annotations(annotations_file)
+    window.category_manager.set_categories(window.annotations_data["categories"])
+    results["gui_load_folder"] = timed(lambda: window.load_images_from_folder(image_root), repeat)
+
+    def navigate():
+        for _ in range(steps):
+            window.next_image()
+            app.processEvents()
+        for _ in range(steps):
+            window.previous_image()
+            app.processEvents()
+    results["gui_next_prev"] = per_step(timed(navigate, repeat), steps * 2)
+
+    def label():
+        for i in range(steps):
+            window.select_category_by_index(i % 3)
+            window.next_image()
+            app.processEvents()
+    window.current_image_index = 0
+    results["gui_label_keypress"] = per_step(timed(label, repeat), steps)
+
+    def next_unlabeled():
+        for _ in range(steps):
+            window.goto_next_unlabeled_image()
+            app.processEvents()
+    results["gui_next_unlabeled"] = per_step(timed(next_unlabeled, repeat), steps)
+
+    # 不在关闭时写回标注文件
+    window.project_loaded = False
+    window.thumbnail_grid.cache.shutdown()
+    window.background_executor.shutdown(wait=False, cancel_futures=True)
+    window.deleteLater()
+    app.processEvents()
+    return results
+
+
+def compare(current, baseline, threshold):
+    """对比两次结果，返回退化项列表"""
+    regressions = []
+    print(f"{'规模':>10} {'操作':<36} {'基线(ms)':>12} {'当前(ms)':>12} {'比值':>8}", file=sys.stderr)
+    for size, ops in current["results"].items():
+        for name, stats in ops.items():
+            base = baseline.get("results", {}).get(size, {}).get(name)
+            if not base:
+                continue
+            ratio = stats["median_ms"] / base["median_ms"] if base["median_ms"] > 0 else float("inf")
+            flag = ""
+            if ratio > 1 + threshold:
+                flag = "  <- 退化"
+                regressions.append({"size": size, "operation": name, "baseline_ms": base["median_ms"],
+                                    "current_ms": stats["median_ms"], "ratio": ratio})
+            print(f"{size:>10} {name:<36} {base['median_ms']:>12.2f} {stats['median_ms']:>12.2f} "
+                  f"{ratio:>8.2f}{flag}", file=sys.stderr)
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="端到端性能测试")
+    parser.add_argument("--sizes", default="10k", help="项目规模，逗号分隔，如 10k,100k,1m")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "ica_bench"),
+                        help="合成项目目录（会复用已生成的项目）")
+    parser.add_argument("--repeat", type=int, default=3, help="每项重复次数")
+    parser.add_argument("--no-gui", action="store_true", help="跳过主窗口相关测试")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    parser.add_argument("--compare", help="基线结果JSON，与之对比")
+    parser.add_argument("--threshold", type=float, default=0.2, help="中位数变慢超过该比例视为退化")
+    args = parser.parse_args(argv)
+
+    from benchmarks.synthetic import make_project
+
+    # GUI测试会切换到临时目录，相对路径须先转为绝对路径
+    args.workdir = os.path.abspath(args.workdir)
+    os.makedirs(args.workdir, exist_ok=True)
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+
+    app = None
+    if not args.no_gui:
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        from PyQt6.QtWidgets import QApplication, QMessageBox
+        app = QApplication.instance() or QApplication(sys.argv)
+        # 测试中不弹出模态对话框
+        QMessageBox.question = staticmethod(lambda *a, **k: QMessageBox.StandardButton.No)
+        QMessageBox.information = staticmethod(lambda *a, **k: QMessageBox.StandardButton.Ok)
+
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": {},
+    }
+
+    original_cwd = os.getcwd()
+    for size in sizes:
+        image_root, annotations_file = make_project(args.workdir, size)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            print(f"测试规模 {size}...", file=sys.stderr, flush=True)
+            ops = bench_core(image_root, annotations_file, tmp_dir, args.repeat)
+            if app is not None:
+                # 主窗口在临时目录中运行，不读写真实的 data/annotations.json
+                os.chdir(tmp_dir)
+                try:
+                    ops.update(bench_gui(app, image_root, annotations_file, tmp_dir, args.repeat))
+                finally:
+                    os.chdir(original_cwd)
+            result["results"][str(size)] = ops
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.threshold)
+        if regressions:
+            print(f"发现 {len(regressions)} 项性能退化", file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,110 @@
+"""启动时间测试
+
+在独立子进程中（Qt offscreen 平台）多次冷启动主窗口，记录：
+    import_ms   导入 ui.main_window 的耗时
+    shown_ms    进程启动到窗口显示后首次进入事件循环
+    ready_ms    进程启动到后台加载标注、验证和扫描全部完成
+
+用法:
+    python -m benchmarks.startup [--runs 5] [--annotations data/annotations.json] [--output result.json]
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD_CODE = r"""
+import os, sys, time, json
+t0 = float(os.environ["BENCH_T0"])
+sys.path.insert(0, os.environ["BENCH_REPO"])
+from PyQt6.QtWidgets import QApplication, QMessageBox
+from PyQt6.QtCore import QTimer
+app = QApplication(sys.argv)
+# 测试中不弹出模态对话框（如图片缺失提示），一律按"否"处理
+QMessageBox.question = staticmethod(lambda *args, **kwargs: QMessageBox.StandardButton.No)
+QMessageBox.information = staticmethod(lambda *args, **kwargs: QMessageBox.StandardButton.Ok)
+t_import = time.time()
+from ui.main_window import MainWindow
+t_imported = time.time()
+result = {"import_ms": (t_imported - t_import) * 1000}
+window = MainWindow()
+
+def on_shown():
+    result["shown_ms"] = (time.time() - t0) * 1000
+
+def on_ready():
+    result["ready_ms"] = (time.time() - t0) * 1000
+    app.exit(0)
+
+window.project_ready.connect(on_ready)
+window.show()
+QTimer.singleShot(0, on_shown)
+QTimer.singleShot(60000, lambda: app.exit(1))
+app.exec()
+window.project_loaded = False  # 不在退出时写回标注文件
+print(json.dumps(result))
+"""
+
+
+def run_once(workdir):
+    """冷启动一次，返回各项耗时（毫秒）"""
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    env["BENCH_REPO"] = REPO_ROOT
+    env["BENCH_T0"] = repr(time.time())
+    output = subprocess.run([sys.executable, "-c", CHILD_CODE], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    """汇总多次运行结果"""
+    summary = {}
+    for key in samples[0]:
+        values = [s[key] for s in samples if key in s]
+        summary[key] = {
+            "median": statistics.median(values),
+            "min": min(values),
+            "max": max(values),
+        }
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="启动时间测试")
+    parser.add_argument("--runs", type=int, default=5, help="运行次数")
+    parser.add_argument("--annotations", help="使用的标注文件（默认无标注文件）")
+    parser.add_argument("--output", help="结果JSON输出路径")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # 在临时工作目录中运行，避免修改真实的 data/annotations.json
+        os.makedirs(os.path.join(workdir, "data"))
+        if args.annotations:
+            shutil.copy(args.annotations, os.path.join(workdir, "data", "annotations.json"))
+        samples = [run_once(workdir) for _ in range(args.runs)]
+
+    result = {
+        "benchmark": "startup",
+        "runs": args.runs,
+        "annotations": args.annotations,
+        "python": sys.version.split()[0],
+        "samples": samples,
+        "summary": summarize(samples),
+    }
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""合成测试项目：生成图片目录树和对应的 annotations.json"""
+import os
+import io
+import sys
+import json
+import random
+
+# 每个子目录中的图片数
+FILES_PER_DIR = 1000
+
+
+def _tiny_jpeg():
+    """生成一张很小的JPEG，所有合成图片共用同一份字节"""
+    from PIL import Image
+    buffer = io.BytesIO()
+    Image.new('RGB', (32, 24), (120, 160, 200)).save(buffer, format='JPEG', quality=70)
+    return buffer.getvalue()
+
+
+def make_project(root, num_images, num_categories=10, labeled_ratio=0.7, seed=0):
+    """在 root 下生成 num_images 张图片和标注文件，已存在且数量一致时直接复用
+
+    返回 (image_root, annotations_file)
+    """
+    image_root = os.path.join(root, f"images_{num_images}")
+    annotations_file = os.path.join(root, f"annotations_{num_images}.json")
+    marker = os.path.join(image_root, ".complete")
+
+    if os.path.exists(marker) and os.path.exists(annotations_file):
+        return image_root, annotations_file
+
+    from config import Config
+
+    data = _tiny_jpeg()
+    rng = random.Random(seed)
+    categories = [f"类别{i + 1}" for i in range(num_categories)]
+    annotations = {}
+
+    for i in range(num_images):
+        sub_dir = f"d{i // FILES_PER_DIR:05d}"
+        if i % FILES_PER_DIR == 0:
+            os.makedirs(os.path.join(image_root, sub_dir), exist_ok=True)
+            print(f"生成图片 {i}/{num_images}", file=sys.stderr, flush=True)
+        rel_path = os.path.join(sub_dir, f"img_{i:07d}.jpg")
+        with open(os.path.join(image_root, rel_path), 'wb') as f:
+            f.write(data)
+
+        if rng.random() < labeled_ratio:
+            index = rng.randrange(num_categories)
+            annotations[rel_path] = {
+                'category': categories[index],
+                'category_index': index,
+                'timestamp': "2025-01-01T00:00:00"
+            }
+
+    project = {
+        "format_version": Config.ANNOTATION_FORMAT_VERSION,
+        "categories": categories,
+        "image_root": image_root,
+        "annotations": annotations,
+        "metadata": {
+            "created_time": "2025-01-01T00:00:00",
+            "last_modified": "2025-01-01T00:00:00",
+            "total_images": len(annotations),
+            "annotated_images": len(annotations)
+        }
+    }
+    with open(annotations_file, 'w', encoding='utf-8') as f:
+        json.dump(project, f, ensure_ascii=False, indent=2)
+
+    open(marker, 'w').close()
+    return image_root, annotations_file
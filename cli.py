@@ -0,0 +1,443 @@
+"""命令行入口：无需图形界面即可扫描、统计、验证和导出
+
+用法:
+    python cli.py scan <图片文件夹>
+    python cli.py stats [--annotations data/annotations.json] [--folder <图片文件夹>]
+    python cli.py validate [--annotations data/annotations.json]
+    python cli.py metadata <图片文件夹> [--list]
+    python cli.py verify [--annotations data/annotations.json | --folder <图片文件夹>] [--quick]
+    python cli.py export <输出目录> [--annotations data/annotations.json] [--no-copy] [--skip-corrupt]
+    python cli.py manifest <输出目录> [--annotations data/annotations.json] [--formats csv,jsonl,npz] [--skip-corrupt]
+    python cli.py shard <项目目录> [--annotations data/annotations.json] [--depth 1]
+    python cli.py merge [--annotations data/annotations.json] [--logs data/changes] [--report 冲突报告.json]
+    python cli.py serve [--annotations data/annotations.json] [--folder <图片文件夹>] [--port 8765]
+    python cli.py decoders [--calibrate]
+
+--annotations 也可以是分片项目目录；图片文件夹也可以是 ZIP/TAR 压缩包或 s3://桶/前缀。
+
+结果以JSON输出到标准输出，进度以JSON行输出到标准错误。
+只导入各子命令需要的模块，不会加载PyQt6、OpenCV或PIL（decoders、metadata、verify 除外）。
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import contextlib
+
+
+class ProgressReporter:
+    """按时间间隔节流的进度输出（JSON行，写到stderr）"""
+
+    def __init__(self, stage, enabled=True, interval=0.5):
+        self.stage = stage
+        self.enabled = enabled
+        self.interval = interval
+        self._last = 0.0
+
+    def __call__(self, done, total=None, force=False):
+        if not self.enabled:
+            return
+        now = time.monotonic()
+        if not force and now - self._last < self.interval:
+            return
+        self._last = now
+        record = {"stage": self.stage, "done": done}
+        if total is not None:
+            record["total"] = total
+        print(json.dumps(record, ensure_ascii=False), file=sys.stderr, flush=True)
+
+
+def _print_result(result):
+    print(json.dumps(result, ensure_ascii=False, indent=2))
+
+
+def _load(path):
+    from utils.file_utils import load_annotations
+    # 库函数的提示信息打印到stderr，保持stdout为纯JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        return load_annotations(path)
+
+
+def cmd_scan(args):
+    """扫描文件夹中的图像"""
+    from utils.file_utils import iter_image_files
+
+    progress = ProgressReporter("scan", not args.quiet)
+    image_files = []
+    for image_path in iter_image_files(args.folder):
+        image_files.append(image_path)
+        progress(len(image_files))
+    progress(len(image_files), force=True)
+
+    result = {"folder": args.folder, "total_images": len(image_files)}
+    if args.list:
+        result["files"] = sorted(image_files)
+    _print_result(result)
+    return 0
+
+
+def cmd_stats(args):
+    """统计标注信息"""
+    from utils.file_utils import get_annotation_stats, get_relative_path, get_image_files
+
+    data = _load(args.annotations)
+    annotations = data.get("annotations", {})
+
+    result = {
+        "annotations_file": args.annotations,
+        "exists": os.path.exists(args.annotations),
+        "format_version": data.get("format_version"),
+        "image_root": data.get("image_root", ""),
+        "categories": data.get("categories", []),
+    }
+
+    if args.folder:
+        # 只统计文件夹中实际存在的图片
+        image_files = get_image_files(args.folder)
+        current = {}
+        for image_path in image_files:
+            rel_path = get_relative_path(image_path, args.folder)
+            if rel_path in annotations:
+                current[rel_path] = annotations[rel_path]
+        stats, total = get_annotation_stats(current)
+        result["folder"] = args.folder
+        result["total_images"] = len(image_files)
+        result["unlabeled_images"] = len(image_files) - total
+    else:
+        stats, total = get_annotation_stats(annotations)
+        result["total_images"] = total
+
+    result["annotated_images"] = total
+    result["category_counts"] = stats
+    _print_result(result)
+    return 0
+
+
+def cmd_validate(args):
+    """验证标注中的图片路径"""
+    from utils.file_utils import validate_image_paths
+
+    data = _load(args.annotations)
+    valid_images, missing_images = validate_image_paths(data)
+
+    result = {
+        "annotations_file": args.annotations,
+        "image_root": data.get("image_root", ""),
+        "valid_images": len(valid_images),
+        "missing_images": len(missing_images),
+        "missing": [{"relative_path": rel, "expected_path": abs_path}
+                    for rel, abs_path in missing_images[:args.limit]],
+    }
+    _print_result(result)
+    return 1 if missing_images and args.strict else 0
+
+
+def cmd_metadata(args):
+    """只读文件头，统计图片的尺寸、格式和分辨率分布"""
+    from utils.file_utils import iter_image_files
+    from utils.image_metadata import index_metadata, summarize, oriented_size
+
+    image_files = list(iter_image_files(args.folder))
+    progress = ProgressReporter("metadata", not args.quiet)
+    with contextlib.redirect_stdout(sys.stderr):
+        metadata = index_metadata(image_files, progress_callback=progress)
+    progress(len(image_files), len(image_files), force=True)
+
+    result = {"folder": args.folder, "total_images": len(image_files),
+              "unreadable_images": len(image_files) - len(metadata)}
+    result.update(summarize(metadata.values()))
+    if args.list:
+        result["files"] = [{"path": path, "size": list(oriented_size(metadata[path])),
+                            "mode": metadata[path].mode, "format": metadata[path].format,
+                            "orientation": metadata[path].orientation, "bytes": metadata[path].file_size}
+                           for path in sorted(metadata)]
+    _print_result(result)
+    return 0
+
+
+def _corrupt_images(data, quiet):
+    """导出前检查图片，返回损坏图片的相对路径（缺失的图片由导出自行统计）"""
+    from utils.integrity import MISSING
+    return {rel_path for rel_path, message in _scan_annotated(data, False, quiet).items() if message != MISSING}
+
+
+def _scan_annotated(data, quick, quiet):
+    """检查标注中的图片，返回 {相对路径: 问题描述}"""
+    from utils.file_utils import get_absolute_path
+    from utils.integrity import scan_images, QUICK, FULL
+
+    image_root = data.get("image_root", "")
+    rel_paths = {get_absolute_path(rel_path, image_root): rel_path for rel_path in data.get("annotations", {})}
+    progress = ProgressReporter("verify", not quiet)
+    with contextlib.redirect_stdout(sys.stderr):
+        bad = scan_images(list(rel_paths), QUICK if quick else FULL, progress_callback=progress)
+    progress(len(rel_paths), len(rel_paths), force=True)
+    return {rel_paths[abs_path]: message for abs_path, message in bad.items()}
+
+
+def cmd_verify(args):
+    """检查图片是否损坏、截断或无法解码"""
+    from utils.integrity import scan_images, QUICK, FULL
+
+    if args.folder:
+        from utils.file_utils import iter_image_files
+
+        image_files = list(iter_image_files(args.folder))
+        progress = ProgressReporter("verify", not args.quiet)
+        with contextlib.redirect_stdout(sys.stderr):
+            bad = scan_images(image_files, QUICK if args.quick else FULL, progress_callback=progress)
+        progress(len(image_files), len(image_files), force=True)
+        result = {"folder": args.folder, "total_images": len(image_files)}
+    else:
+        data = _load(args.annotations)
+        bad = _scan_annotated(data, args.quick, args.quiet)
+        result = {"annotations_file": args.annotations, "image_root": data.get("image_root", ""),
+                  "total_images": len(data.get("annotations", {}))}
+
+    result["level"] = "quick" if args.quick else "full"
+    result["bad_images"] = len(bad)
+    result["bad"] = [{"path": path, "error": bad[path]} for path in sorted(bad)[:args.limit]]
+    _print_result(result)
+    return 1 if bad and args.strict else 0
+
+
+def cmd_export(args):
+    """导出数据集"""
+    from utils.dataset_exporter import DatasetExporter
+
+    data = _load(args.annotations)
+    exporter = DatasetExporter()
+    if args.train_ratio is not None:
+        exporter.train_ratio = args.train_ratio
+        exporter.val_ratio = round(1 - args.train_ratio, 6)
+
+    skip_images = _corrupt_images(data, args.quiet) if args.skip_corrupt else None
+    progress = ProgressReporter("export", not args.quiet)
+    with contextlib.redirect_stdout(sys.stderr):
+        success, result = exporter.export_dataset(data, args.output, copy_images=not args.no_copy,
+                                                  progress_callback=progress, skip_images=skip_images)
+
+    if not success:
+        _print_result({"success": False, "error": result})
+        return 1
+
+    if not args.verbose:
+        result.pop("missing_files_list", None)
+        result.pop("skipped_files_list", None)
+    _print_result({"success": True, "output": args.output, "dataset_info": result})
+    return 0
+
+
+def cmd_manifest(args):
+    """导出文件清单（CSV/JSONL/NPZ），不复制图片"""
+    from utils.dataset_exporter import DatasetExporter, MANIFEST_FORMATS
+
+    formats = [fmt.strip() for fmt in args.formats.split(",") if fmt.strip()]
+    unknown = [fmt for fmt in formats if fmt not in MANIFEST_FORMATS]
+    if unknown or not formats:
+        _print_result({"success": False, "error": f"不支持的格式: {', '.join(unknown) or args.formats}"})
+        return 1
+
+    data = _load(args.annotations)
+    exporter = DatasetExporter()
+    if args.train_ratio is not None:
+        exporter.train_ratio = args.train_ratio
+        exporter.val_ratio = round(1 - args.train_ratio, 6)
+
+    skip_images = _corrupt_images(data, args.quiet) if args.skip_corrupt else None
+    progress = ProgressReporter("manifest", not args.quiet)
+    with contextlib.redirect_stdout(sys.stderr):
+        success, result = exporter.export_manifest(data, args.output, formats=formats,
+                                                   check_exists=args.check_exists, progress_callback=progress,
+                                                   skip_images=skip_images)
+
+    if not success:
+        _print_result({"success": False, "error": result})
+        return 1
+    _print_result({"success": True, "output": args.output, "manifest_info": result})
+    return 0
+
+
+def cmd_shard(args):
+    """把单文件标注转换为按子目录分片的项目"""
+    from utils.file_utils import save_annotations
+    from utils.sharded_store import ShardedAnnotations, is_sharded_project
+
+    if is_sharded_project(args.project_dir) and not args.force:
+        _print_result({"success": False, "error": f"{args.project_dir} 已是分片项目（使用 --force 覆盖）"})
+        return 1
+
+    data = _load(args.annotations)
+    store = ShardedAnnotations.create(args.project_dir, depth=args.depth,
+                                      annotations=data.get("annotations", {}),
+                                      categories=data.get("categories", []))
+    data["annotations"] = store
+    with contextlib.redirect_stdout(sys.stderr):
+        success = save_annotations(args.project_dir, data)
+
+    _print_result({"success": success, "project_dir": args.project_dir, "shards": len(store.shards),
+                   "annotations": len(store)})
+    return 0 if success else 1
+
+
+def cmd_merge(args):
+    """把各标注员的变更日志合并到标注文件"""
+    from utils.change_log import ChangeMerger
+    from utils.file_utils import save_annotations
+
+    data = _load(args.annotations)
+    merger = ChangeMerger(args.logs)
+    result = merger.merge_project(data)
+
+    success = True
+    if not args.dry_run and result["applied"]:
+        with contextlib.redirect_stdout(sys.stderr):
+            success = save_annotations(args.annotations, data)
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(result["conflicts"], f, ensure_ascii=False, indent=2)
+
+    _print_result({
+        "success": success,
+        "logs": [os.path.basename(p) for p in merger.log_files()],
+        "changes": result["changes"],
+        "applied": result["applied"],
+        "new_categories": result["new_categories"],
+        "conflicts": len(result["conflicts"]),
+        "dry_run": args.dry_run,
+    })
+    return 0 if success else 1
+
+
+def cmd_serve(args):
+    """运行多人标注协调服务器"""
+    from utils.coordination import CoordinationServer
+
+    with contextlib.redirect_stdout(sys.stderr):
+        server = CoordinationServer(args.annotations, image_root=args.folder, host=args.host,
+                                    port=args.port, log_dir=args.logs)
+    status = server.status()
+    print(json.dumps({"url": server.url, "total_images": status["total_images"],
+                      "pending": status["pending"]}, ensure_ascii=False), file=sys.stderr, flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        with contextlib.redirect_stdout(sys.stderr):
+            server.shutdown()
+    _print_result(server.status())
+    return 0
+
+
+def cmd_decoders(args):
+    """显示（或重新测试）各格式使用的解码后端"""
+    from config import Config
+    from utils.image_decoders import decoder_registry, available_backends, machine_signature
+
+    registry = decoder_registry()
+    timings = None
+    if args.calibrate or not registry.load_profile():
+        progress = ProgressReporter("calibrate", enabled=not args.quiet)
+        with contextlib.redirect_stdout(sys.stderr):
+            _, timings = registry.run_calibration(progress_callback=progress)
+    result = {"backends": available_backends(), "signature": machine_signature(),
+              "table": registry.table, "overrides": Config.DECODER_OVERRIDES}
+    if timings is not None:
+        result["timings_ms"] = timings
+    _print_result(result)
+    return 0
+
+
+def build_parser():
+    from config import Config
+
+    parser = argparse.ArgumentParser(prog="cli.py", description=f"{Config.APP_NAME} 命令行工具")
+    parser.add_argument("-q", "--quiet", action="store_true", help="不输出进度")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    scan_parser = subparsers.add_parser("scan", help="扫描文件夹中的图像")
+    scan_parser.add_argument("folder", help="图片文件夹")
+    scan_parser.add_argument("--list", action="store_true", help="输出完整文件列表")
+    scan_parser.set_defaults(func=cmd_scan)
+
+    stats_parser = subparsers.add_parser("stats", help="统计标注信息")
+    stats_parser.add_argument("--annotations", default=Config.ANNOTATIONS_FILE, help="标注文件")
+    stats_parser.add_argument("--folder", help="只统计该文件夹中的图片")
+    stats_parser.set_defaults(func=cmd_stats)
+
+    validate_parser = subparsers.add_parser("validate", help="验证标注中的图片是否存在")
+    validate_parser.add_argument("--annotations", default=Config.ANNOTATIONS_FILE, help="标注文件")
+    validate_parser.add_argument("--limit", type=int, default=100, help="最多列出的缺失文件数")
+    validate_parser.add_argument("--strict", action="store_true", help="存在缺失文件时返回非零退出码")
+    validate_parser.set_defaults(func=cmd_validate)
+
+    metadata_parser = subparsers.add_parser("metadata", help="统计图片尺寸、格式和分辨率分布（只读文件头）")
+    metadata_parser.add_argument("folder", help="图片文件夹")
+    metadata_parser.add_argument("--list", action="store_true", help="输出每张图片的信息")
+    metadata_parser.set_defaults(func=cmd_metadata)
+
+    verify_parser = subparsers.add_parser("verify", help="检查图片是否损坏、截断或无法解码")
+    verify_parser.add_argument("--annotations", default=Config.ANNOTATIONS_FILE, help="标注文件")
+    verify_parser.add_argument("--folder", help="检查该文件夹中的全部图片（而不是标注中的图片）")
+    verify_parser.add_argument("--quick", action="store_true", help="只检查文件头和结束标记，不完整解码")
+    verify_parser.add_argument("--limit", type=int, default=100, help="最多列出的问题图片数")
+    verify_parser.add_argument("--strict", action="store_true", help="存在问题图片时返回非零退出码")
+    verify_parser.set_defaults(func=cmd_verify)
+
+    export_parser = subparsers.add_parser("export", help="导出数据集")
+    export_parser.add_argument("output", help="输出目录（已存在时会被清空）")
+    export_parser.add_argument("--annotations", default=Config.ANNOTATIONS_FILE, help="标注文件")
+    export_parser.add_argument("--no-copy", action="store_true", help="不复制图像文件")
+    export_parser.add_argument("--train-ratio", type=float, help="训练集比例")
+    export_parser.add_argument("--verbose", action="store_true", help="输出缺失和跳过的文件列表")
+    export_parser.add_argument("--skip-corrupt", action="store_true", help="先检查图片，跳过损坏的图片")
+    export_parser.set_defaults(func=cmd_export)
+
+    manifest_parser = subparsers.add_parser("manifest", help="导出文件清单（不复制图片）")
+    manifest_parser.add_argument("output", help="输出目录")
+    manifest_parser.add_argument("--annotations", default=Config.ANNOTATIONS_FILE, help="标注文件")
+    manifest_parser.add_argument("--formats", default="csv,jsonl,npz", help="逗号分隔的格式: csv, jsonl, npz")
+    manifest_parser.add_argument("--train-ratio", type=float, help="训练集比例")
+    manifest_parser.add_argument("--check-exists", action="store_true", help="跳过不存在的图片（需要逐个检查）")
+    manifest_parser.add_argument("--skip-corrupt", action="store_true", help="先检查图片，跳过损坏的图片")
+    manifest_parser.set_defaults(func=cmd_manifest)
+
+    shard_parser = subparsers.add_parser("shard", help="把标注文件转换为分片项目")
+    shard_parser.add_argument("project_dir", help="分片项目目录")
+    shard_parser.add_argument("--annotations", default=Config.ANNOTATIONS_FILE, help="标注文件")
+    shard_parser.add_argument("--depth", type=int, default=Config.SHARD_DEPTH, help="按前几级子目录分片")
+    shard_parser.add_argument("--force", action="store_true", help="覆盖已有的分片项目")
+    shard_parser.set_defaults(func=cmd_shard)
+
+    merge_parser = subparsers.add_parser("merge", help="合并各标注员的变更日志")
+    merge_parser.add_argument("--annotations", default=Config.ANNOTATIONS_FILE, help="标注文件")
+    merge_parser.add_argument("--logs", default=Config.CHANGE_LOG_DIR, help="变更日志目录")
+    merge_parser.add_argument("--report", help="把冲突报告写入该JSON文件")
+    merge_parser.add_argument("--dry-run", action="store_true", help="只统计，不写回标注文件")
+    merge_parser.set_defaults(func=cmd_merge)
+
+    serve_parser = subparsers.add_parser("serve", help="运行多人标注协调服务器")
+    serve_parser.add_argument("--annotations", default=Config.ANNOTATIONS_FILE, help="标注文件")
+    serve_parser.add_argument("--folder", help="图片根目录（默认使用标注文件中的 image_root）")
+    serve_parser.add_argument("--host", default="127.0.0.1", help="监听地址")
+    serve_parser.add_argument("--port", type=int, default=8765, help="监听端口")
+    serve_parser.add_argument("--logs", default=Config.CHANGE_LOG_DIR, help="变更日志目录")
+    serve_parser.set_defaults(func=cmd_serve)
+
+    decoders_parser = subparsers.add_parser("decoders", help="显示或测试各格式使用的解码后端")
+    decoders_parser.add_argument("--calibrate", action="store_true", help="重新测试本机各后端的解码速度")
+    decoders_parser.set_defaults(func=cmd_decoders)
+
+    return parser
+
+
+def main(argv=None):
+    """命令行主函数"""
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
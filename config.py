@@ -25,6 +25,102 @@ class Config:
     # 文件路径
     ANNOTATIONS_FILE = "data/annotations.json"
 
+    # 压缩包图片源：ZIP/未压缩的TAR 可直接作为图片根目录打开，无需解压。成员索引首次打开时建立并
+    # 保存在 ARCHIVE_INDEX_DIR；SCAN_ARCHIVES 为 True 时扫描文件夹也会列出其中压缩包里的图片
+    ARCHIVE_INDEX_DIR = "data/archive_index"
+    SCAN_ARCHIVES = False
+
+    # 远程对象存储（S3兼容，如 MinIO）：图片根目录写作 s3://桶/前缀。下载的图片缓存在 S3_CACHE_DIR，
+    # 超过上限时删除最久未用的；浏览时在后台预取后面的 S3_PREFETCH 张
+    S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT_URL", "")  # 例如 http://127.0.0.1:9000，为空时使用AWS
+    S3_REGION = os.environ.get("AWS_REGION", "us-east-1")
+    S3_ACCESS_KEY = os.environ.get("AWS_ACCESS_KEY_ID", "")
+    S3_SECRET_KEY = os.environ.get("AWS_SECRET_ACCESS_KEY", "")
+    S3_MAX_CONNECTIONS = 8  # 保持连接的连接池大小
+    S3_PREFETCH = 8
+    S3_CACHE_DIR = "data/remote_cache"
+    S3_CACHE_MB = 2048
+    S3_RANGE_CHUNK_MB = 8  # 大于该大小的对象分段并行下载
+    S3_LISTING_TTL = 60  # 列表结果在该时间（秒）内复用
+
+    # 分片项目：标注按子目录分片保存在 SHARDED_PROJECT_DIR，打开子目录时才加载对应分片，
+    # 保存时只写修改过的分片。可用 python cli.py shard 把现有标注文件转换为分片项目
+    SHARDED_ANNOTATIONS = False
+    SHARDED_PROJECT_DIR = "data/project"
+    SHARD_DEPTH = 1  # 按前几级子目录分片
+
+    # 多人标注：每人的标注操作追加到 CHANGE_LOG_DIR 下自己的变更日志，保存时合并其他人的变更，
+    # 多个实例共用同一标注文件也不会互相覆盖。ANNOTATOR_NAME 为空时使用系统用户名
+    SHARED_PROJECT = False
+    ANNOTATOR_NAME = ""
+    CHANGE_LOG_DIR = "data/changes"
+
+    # 协调服务器（python cli.py serve）：设置后从服务器领取互不重叠的图片批次，标注提交到服务器
+    COORDINATION_URL = ""  # 例如 http://127.0.0.1:8765
+    COORDINATION_BATCH_SIZE = 200
+    COORDINATION_LEASE_SECONDS = 1800  # 领取的批次超时未提交时重新分配
+    COORDINATION_SAVE_INTERVAL = 30  # 服务器写回标注文件的间隔（秒）
+
+    # 标注数据在内存中使用列式存储：按类别ID引用类别，重命名/合并/删除类别无需逐条改写，
+    # 内存占用也显著减少。关闭后使用普通字典
+    COMPACT_ANNOTATIONS = True
+
+    # 大标注文件（不小于 STREAM_LOAD_MIN_MB）在后台流式解析，每读完 STREAM_CHUNK_ROWS 条并入一次，
+    # 加载期间即可浏览和标注已加载的图片
+    STREAM_LOAD_MIN_MB = 64
+    STREAM_CHUNK_ROWS = 5000
+
+    # 界面刷新：标注和切换图片后列表标记、进度和统计合并刷新，两次刷新至少间隔一帧；
+    # 进度和统计信息另有最小刷新间隔（毫秒）
+    UI_FRAME_MS = 16
+    PROGRESS_REFRESH_MS = 100
+    STATISTICS_REFRESH_MS = 500
+
+    # 图片显示：缩放结果缓存后拖拽只需平移；缩放后超过 VIEWER_CACHE_MAX_PIXELS 像素时只缓存可见区域附近。
+    # 拖拽、滚轮、改变窗口大小时快速缩放，停止操作 VIEWER_SETTLE_MS 毫秒后再平滑缩放
+    VIEWER_CACHE_MAX_PIXELS = 16_000_000
+    VIEWER_SETTLE_MS = 150
+
+    # 内存预算：图片显示、缩略图等缓存共用 MEMORY_BUDGET_MB，超出时在各缓存之间统一淘汰；
+    # 每 MEMORY_CHECK_MS 毫秒检查一次，系统可用内存低于 MEMORY_PRESSURE_MB 时把缓存淘汰到一半
+    MEMORY_BUDGET_MB = 1024
+    MEMORY_PRESSURE_MB = 512
+    MEMORY_CHECK_MS = 2000
+
+    # 解码进程：像素数不少于 DECODE_PROCESS_MIN_PIXELS 的PNG/TIFF在独立进程中解码，像素经共享内存交回，
+    # 解码时界面不卡顿，解码库崩溃也不影响主程序。空闲的共享内存段保留复用，最多 DECODE_SEGMENT_POOL_MB
+    DECODE_WORKERS = 2
+    DECODE_PROCESS_MIN_PIXELS = 12_000_000
+    DECODE_PROCESS_FORMATS = ['.png', '.tif', '.tiff']
+    DECODE_SEGMENT_POOL_MB = 256
+
+    # 解码后端：JPEG/PNG/BMP/WEBP 按格式和尺寸使用本机测试最快的后端（PIL、OpenCV、Qt），
+    # 测试结果保存在 DECODER_PROFILE_FILE。DECODER_OVERRIDES 可强制指定，如 {"JPEG": "opencv"}，"*" 表示所有格式
+    DECODER_BACKENDS = ["pil", "opencv", "qt"]
+    DECODER_OVERRIDES = {}
+    DECODER_PROFILE_FILE = "data/decoder_profile.json"
+    DECODER_AUTO_CALIBRATE = True  # 没有测试结果时首次解码在后台测试
+
+    # 图片完整性检查：结果按 (路径, 大小, 修改时间) 缓存，未变化的图片不再重复检查
+    INTEGRITY_CACHE_FILE = "data/integrity_cache.npz"
+    INTEGRITY_WORKERS = 0  # 检查进程数，0 表示CPU核数
+
+    # 缩略图配置
+    THUMBNAIL_SIZE = 128  # 缩略图边长（像素）
+    THUMBNAIL_CACHE_DIR = "data/thumbnails"
+    THUMBNAIL_DISK_CACHE_MB = 512  # 磁盘缓存上限
+    THUMBNAIL_MEMORY_CACHE_MB = 64  # 内存缓存上限
+    THUMBNAIL_WORKERS = 4  # 生成缩略图的线程数
+
+    # 相似度排序配置
+    FEATURE_CACHE_FILE = "data/image_features.npz"
+    FEATURE_WORKERS = 4  # 计算图像特征的线程数
+
+    # 图片信息索引：只读文件头（尺寸、模式、格式、EXIF方向），按 (路径, 大小, 修改时间) 缓存
+    METADATA_INDEX_FILE = "data/image_metadata.npz"
+    METADATA_WORKERS = 8  # 读取文件头的线程数
+    METADATA_HEADER_KB = 64  # 远程/压缩包图片读取文件头的字节数，不够时再读一次16倍
+
     # 导出配置
     TRAIN_RATIO = 0.8  # 训练集比例
     VAL_RATIO = 0.2  # 验证集比例
@@ -43,5 +139,15 @@ class Config:
         '0': 9
     }
 
+    # 类别选择器：类别多于10个时，数字键依次对应最近使用的类别（最多该数量）和最常用的类别
+    CATEGORY_RECENT_SLOTS = 5
+    CATEGORY_SEARCH_LIMIT = 200  # 搜索结果最多显示的类别数
+
+    # 性能监测：开启时 tracemalloc 记录的调用栈深度（0 表示不跟踪内存）
+    PROFILE_TRACEMALLOC_FRAMES = 0
+
+    # 会话录制文件目录
+    SESSION_DIR = "data/sessions"
+
     # 标注文件格式版本
     ANNOTATION_FORMAT_VERSION = "1.1"
\ No newline at end of file
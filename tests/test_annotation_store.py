@@ -0,0 +1,29 @@
+"""列式标注存储测试"""
+import unittest
+from unittest import mock
+
+import utils.annotation_store as annotation_store
+from utils.annotation_store import ColumnarAnnotations
+
+
+class FindRowsTest(unittest.TestCase):
+    def test_hash_collisions_match_dict_lookup(self):
+        # 按长度计算的"哈希"让同长度的路径全部冲突
+        with mock.patch.object(annotation_store, "hash", len, create=True):
+            store = ColumnarAnnotations()
+            for i in range(100):
+                store[f"a/{i:03d}.jpg"] = {"category": "cat" if i % 2 else None}
+            store._merge_overlay()
+            store["b/new.jpg"] = {"category": "dog"}  # 仍在未合并的新增路径中
+            del store["a/003.jpg"]
+
+            paths = ["a/001.jpg", "a/002.jpg", "a/003.jpg", "x/999.jpg", "b/new.jpg", "zz"]
+            rows = store.find_rows(paths).tolist()
+            self.assertEqual(rows, [-1 if p not in store else store._find(p) for p in paths])
+            self.assertEqual(rows[:2], [1, 2])
+            self.assertEqual(store.labeled_mask(paths).tolist(), [True, False, False, False, True, False])
+            self.assertEqual(list(store.categories_of(paths)), [store.get(p, {}).get("category") for p in paths])
+
+
+if __name__ == "__main__":
+    unittest.main()
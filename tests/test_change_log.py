@@ -0,0 +1,100 @@
+"""变更日志合并测试：类别操作在重新合并（重新启动）后仍然有效"""
+import shutil
+import tempfile
+import unittest
+
+from utils.annotation_store import ColumnarAnnotations
+from utils.change_log import ChangeLog, ChangeMerger, MERGED_LOGS_KEY
+from utils.file_utils import rename_category_in_annotations, delete_categories_from_annotations
+
+T1 = "2026-01-01T00:00:01"
+T2 = "2026-01-01T00:00:02"
+T3 = "2026-01-01T00:00:03"
+
+
+class CategoryOpsTest(unittest.TestCase):
+    def setUp(self):
+        self.log_dir = tempfile.mkdtemp()
+        self.alice = ChangeLog(self.log_dir, "alice")
+
+    def tearDown(self):
+        shutil.rmtree(self.log_dir, ignore_errors=True)
+
+    def project(self, annotations=None):
+        return {"categories": ["cat", "dog"], "annotations": annotations if annotations is not None else {}}
+
+    def labeled_project(self):
+        """alice 在本机把两张图片标为 cat 并合并"""
+        data = self.project()
+        merger = ChangeMerger(self.log_dir)
+        self.alice.record_many(["a.jpg", "b.jpg"], "cat", 0, T1)
+        merger.merge_project(data)
+        return data, merger
+
+    def categories_of(self, data):
+        return {path: record.get("category") for path, record in data["annotations"].items()}
+
+    def test_rename_survives_fresh_merge(self):
+        data, merger = self.labeled_project()
+        rename_category_in_annotations(data["annotations"], "cat", "feline")
+        data["categories"] = ["feline", "dog"]
+        merger.note_local(self.alice.record_category_op("rename", ["cat"], "feline", T2))
+        merger.merge_project(data)
+
+        # 标注文件没有记录合并位置（或记录之前的日志），新的实例从头重放
+        data.pop(MERGED_LOGS_KEY)
+        result = ChangeMerger(self.log_dir).merge_project(data)
+        self.assertEqual(self.categories_of(data), {"a.jpg": "feline", "b.jpg": "feline"})
+        self.assertEqual(data["categories"], ["feline", "dog"])
+        self.assertEqual((result["applied"], result["new_categories"], result["conflicts"]), (0, [], []))
+
+    def test_delete_survives_fresh_merge(self):
+        data, merger = self.labeled_project()
+        delete_categories_from_annotations(data["annotations"], ["cat"])
+        data["categories"] = ["dog"]
+        merger.note_local(self.alice.record_category_op("delete", ["cat"], None, T2))
+
+        data.pop(MERGED_LOGS_KEY)
+        result = ChangeMerger(self.log_dir).merge_project(data)
+        self.assertEqual(self.categories_of(data), {})
+        self.assertEqual(data["categories"], ["dog"])
+        self.assertEqual(result["applied"], 0)
+
+    def test_saved_offsets_skip_merged_changes(self):
+        data, _ = self.labeled_project()
+        self.assertEqual(ChangeMerger(self.log_dir).merge_project(data)["changes"], 0)
+        self.alice.record_many(["c.jpg"], "dog", 1, T2)
+        self.assertEqual(ChangeMerger(self.log_dir).merge_project(data)["changes"], 1)
+
+    def test_other_annotators_ops_are_applied(self):
+        for annotations in ({}, ColumnarAnnotations()):
+            with self.subTest(store=type(annotations).__name__):
+                shutil.rmtree(self.log_dir, ignore_errors=True)
+                # bob 的数据中还是改名前的类别，其中一张在改名之后又标为新建的 cat
+                data = self.project(annotations)
+                bob = ChangeLog(self.log_dir, "bob")
+                bob.record_many(["a.jpg", "b.jpg"], "cat", 0, T1)
+                merger = ChangeMerger(self.log_dir)
+                merger.merge_project(data)
+
+                self.alice.record_category_op("rename", ["cat"], "feline", T2)
+                bob.record_many(["c.jpg"], "cat", 0, T1)  # 改名前给出、晚到的标注
+                bob.record_many(["d.jpg"], "dog", 1, T2)
+                self.alice.record_category_op("delete", ["dog"], None, T3)
+                result = merger.merge_project(data)
+
+                self.assertEqual(self.categories_of(data),
+                                 {"a.jpg": "feline", "b.jpg": "feline", "c.jpg": "feline"})
+                self.assertEqual(data["categories"], ["feline"])
+                self.assertEqual(result["conflicts"], [])
+
+                # 改名之后新建的同名类别不受旧的改名影响
+                data["categories"].append("cat")
+                bob.record_many(["e.jpg"], "cat", 1, "2026-01-01T00:00:04")
+                merger.merge_project(data)
+                self.assertEqual(data["annotations"]["e.jpg"]["category"], "cat")
+                self.assertEqual(data["categories"], ["feline", "cat"])
+
+
+if __name__ == "__main__":
+    unittest.main()
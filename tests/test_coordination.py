@@ -0,0 +1,123 @@
+"""协调服务器测试：在 127.0.0.1 的随机端口上启动服务器，用客户端和原始HTTP请求访问"""
+import os
+import json
+import shutil
+import tempfile
+import threading
+import unittest
+from urllib import request as urlrequest
+from urllib.error import HTTPError
+
+from PIL import Image
+
+from utils.coordination import CoordinationServer, CoordinationClient
+from utils.file_utils import load_annotations
+
+TIMESTAMP = "2026-01-01T00:00:00"
+
+
+class CoordinationServerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.image_root = os.path.join(self.tmp_dir, "images")
+        os.makedirs(self.image_root)
+        for i in range(6):
+            Image.new("RGB", (4, 4)).save(os.path.join(self.image_root, f"{i}.png"))
+        self.annotations_path = os.path.join(self.tmp_dir, "annotations.json")
+        self.server = CoordinationServer(self.annotations_path, image_root=self.image_root, port=0,
+                                         log_dir=os.path.join(self.tmp_dir, "changes"), save_interval=3600)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.thread.join(5)
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def post(self, path, payload):
+        """发送原始请求，返回 (状态码, 响应)"""
+        req = urlrequest.Request(self.server.url + path, data=json.dumps(payload).encode("utf-8"),
+                                 headers={"Content-Type": "application/json"})
+        try:
+            with urlrequest.urlopen(req, timeout=5) as response:
+                return response.status, json.loads(response.read())
+        except HTTPError as e:
+            return e.code, json.loads(e.read())
+
+    def test_claims_are_disjoint(self):
+        alice = CoordinationClient(self.server.url, "alice")
+        bob = CoordinationClient(self.server.url, "bob")
+        first = alice.claim(4)["paths"]
+        second = bob.claim(4)["paths"]
+        self.assertEqual(len(first), 4)
+        self.assertEqual(len(second), 2)
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(bob.claim(4)["paths"], [])
+
+    def test_submit_applies_changes_and_saves(self):
+        client = CoordinationClient(self.server.url, "alice")
+        paths = client.claim(2)["paths"]
+        client.record_many(paths, "cat", None, TIMESTAMP)
+        result = client.flush()
+        self.assertEqual((result["accepted"], result["applied"]), (2, 2))
+        self.assertIn("cat", result["categories"])
+        self.assertEqual(client.unsent, [])
+
+        status = client.status()
+        self.assertEqual(status["annotated_images"], 2)
+        self.assertEqual(status["leased"], {})
+        self.assertTrue(self.server.save())
+        saved = load_annotations(self.annotations_path)
+        self.assertEqual({p: saved["annotations"][p]["category"] for p in paths}, {p: "cat" for p in paths})
+
+    def test_release_requeues_images(self):
+        alice = CoordinationClient(self.server.url, "alice")
+        paths = alice.claim(6)["paths"]
+        self.assertEqual(alice.release(paths[:2])["released"], 2)
+        # 其他标注员不能归还不属于自己的图片
+        self.assertEqual(CoordinationClient(self.server.url, "bob").release(paths[2:])["released"], 0)
+        self.assertEqual(CoordinationClient(self.server.url, "bob").claim(6)["paths"], paths[:2])
+
+    def test_conflicting_submissions_are_reported(self):
+        alice = CoordinationClient(self.server.url, "alice")
+        bob = CoordinationClient(self.server.url, "bob")
+        path = alice.claim(1)["paths"][0]
+        alice.record_many([path], "cat", None, "2026-01-01T00:00:00")
+        bob.record_many([path], "dog", None, "2026-01-01T00:00:01")
+        alice.flush()
+        result = bob.flush()
+        self.assertEqual(result["applied"], 1)
+        self.assertEqual(len(result["conflicts"]), 1)
+        self.assertEqual(self.server.data["annotations"][path]["category"], "dog")
+
+    def test_malformed_requests_get_400(self):
+        bad_requests = [
+            ("/claim", ["not", "an", "object"]),
+            ("/claim", {"size": 1}),
+            ("/claim", {"annotator": "a", "size": "2"}),
+            ("/submit", {"annotator": "a", "changes": "bad"}),
+            ("/submit", {"annotator": "a", "changes": ["bad"]}),
+            ("/submit", {"annotator": "a", "changes": [{"category": "x", "timestamp": TIMESTAMP}]}),
+            ("/submit", {"annotator": "a", "changes": [{"path": "0.png", "timestamp": TIMESTAMP}]}),
+            ("/submit", {"annotator": "a", "changes": [{"path": "0.png", "category": "x", "timestamp": 1}]}),
+            ("/submit", {"annotator": "a", "changes": [{"path": "0.png", "category": "x",
+                                                        "category_index": "0", "timestamp": TIMESTAMP}]}),
+            ("/release", {"annotator": "a", "paths": [1]}),
+        ]
+        for path, payload in bad_requests:
+            with self.subTest(path=path, payload=payload):
+                code, result = self.post(path, payload)
+                self.assertEqual(code, 400)
+                self.assertIn("error", result)
+
+        # 错误的请求不写入变更日志，服务器仍可正常使用
+        code, result = self.post("/submit", {"annotator": "a", "changes": [
+            {"path": "0.png", "category": "x", "category_index": None, "timestamp": TIMESTAMP}]})
+        self.assertEqual((code, result["accepted"], result["applied"]), (200, 1, 1))
+
+    def test_unknown_endpoint_gets_404(self):
+        self.assertEqual(self.post("/nothing", {"annotator": "a"})[0], 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
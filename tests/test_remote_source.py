@@ -0,0 +1,189 @@
+"""S3图片源测试：在 127.0.0.1 的随机端口上运行一个内存中的S3兼容替身服务器"""
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from email.utils import formatdate
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs, unquote
+from xml.sax.saxutils import escape
+
+from config import Config
+from utils.remote_source import S3Client, S3Source, DiskCache
+
+BUCKET = "bucket"
+MODIFIED = 1767225600  # 2026-01-01T00:00:00Z
+
+
+class _StubS3Handler(BaseHTTPRequestHandler):
+    """路径式寻址的最小S3：ListObjectsV2（分页）、HEAD、GET（支持 Range）"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_HEAD(self):
+        self.do_GET(head=True)
+
+    def do_GET(self, head=False):
+        server = self.server
+        url = urlsplit(self.path)
+        bucket, _, key = unquote(url.path).lstrip("/").partition("/")
+        with server.lock:
+            server.requests.append((self.command, key, {k.lower(): v for k, v in self.headers.items()}))
+        if bucket != BUCKET:
+            return self._send(404, b"<Error><Code>NoSuchBucket</Code></Error>", head)
+        if not key:
+            return self._list({k: v[0] for k, v in parse_qs(url.query).items()})
+        data = server.objects.get(key)
+        if data is None:
+            return self._send(404, b"<Error><Code>NoSuchKey</Code></Error>", head)
+        headers = {"Last-Modified": formatdate(MODIFIED, usegmt=True)}
+        byte_range = self.headers.get("Range")
+        if byte_range:
+            start, end = byte_range.split("=", 1)[1].split("-")
+            start, end = int(start), int(end) if end else len(data) - 1
+            return self._send(206, data[start:end + 1], head, headers)
+        self._send(200, data, head, headers)
+
+    def _list(self, query):
+        keys = sorted(k for k in self.server.objects if k.startswith(query.get("prefix", "")))
+        token = query.get("continuation-token", "")
+        keys = [k for k in keys if k > token]
+        page = keys[:int(query.get("max-keys", 1000))]
+        truncated = len(page) < len(keys)
+        xml = ['<?xml version="1.0"?><ListBucketResult xmlns="http://s3.amazonaws.com/doc/2006-03-01/">']
+        for key in page:
+            xml.append(f"<Contents><Key>{escape(key)}</Key><Size>{len(self.server.objects[key])}</Size>"
+                       f"<LastModified>2026-01-01T00:00:00.000Z</LastModified></Contents>")
+        xml.append(f"<IsTruncated>{'true' if truncated else 'false'}</IsTruncated>")
+        if truncated:
+            xml.append(f"<NextContinuationToken>{escape(page[-1])}</NextContinuationToken>")
+        xml.append("</ListBucketResult>")
+        self._send(200, "".join(xml).encode("utf-8"))
+
+    def _send(self, code, body, head=False, headers=None):
+        self.send_response(code)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if not head:
+            self.wfile.write(body)
+
+
+class S3SourceTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _StubS3Handler)
+        self.server.daemon_threads = True
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.objects = {f"images/{i:02d}.jpg": bytes([i]) * (100 + i) for i in range(5)}
+        self.server.objects["images/notes.txt"] = b"not an image"
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+        self.tmp_dir = tempfile.mkdtemp()
+        self.endpoint = "http://127.0.0.1:%d" % self.server.server_address[1]
+        self.client = S3Client(endpoint_url=self.endpoint, access_key="", secret_key="")
+        self.source = self.make_source()
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+
+    def make_source(self, limit=1 << 20):
+        return S3Source(self.client, DiskCache(os.path.join(self.tmp_dir, "cache"), limit))
+
+    def requests(self, method=None):
+        with self.server.lock:
+            return [r for r in self.server.requests if method is None or r[0] == method]
+
+    def clear_requests(self):
+        with self.server.lock:
+            self.server.requests.clear()
+
+    def test_paged_listing(self):
+        keys = [key for key, _, _ in self.client.list_objects(BUCKET, "images/", page_size=2)]
+        self.assertEqual(keys, sorted(self.server.objects))
+        self.assertEqual(len(self.requests("GET")), 3)
+
+        paths = sorted(self.source.iter_images(f"s3://{BUCKET}/images"))
+        self.assertEqual(paths, [f"s3://{BUCKET}/images/{i:02d}.jpg" for i in range(5)])
+        # 列表结果中已有大小和修改时间，stat/exists 不再逐个请求
+        self.clear_requests()
+        self.assertEqual(self.source.stat(paths[3]), (103, MODIFIED * 10 ** 9))
+        self.assertTrue(self.source.exists(paths[3]))
+        self.assertEqual(self.requests(), [])
+
+    def test_signed_requests(self):
+        client = S3Client(endpoint_url=self.endpoint, access_key="key", secret_key="secret")
+        self.assertEqual(client.get_object(BUCKET, "images/00.jpg"), self.server.objects["images/00.jpg"])
+        self.assertTrue(self.requests()[-1][2].get("authorization", "").startswith("AWS4-HMAC-SHA256 "))
+
+    def test_ranged_get(self):
+        data = self.server.objects["images/04.jpg"] = bytes(range(256)) * 40
+        self.assertEqual(self.client.get_object(BUCKET, "images/04.jpg", 10, 19), data[10:20])
+        self.assertEqual(self.source.read_range(f"s3://{BUCKET}/images/04.jpg", 100, 50), data[100:150])
+        self.assertEqual(self.requests("GET")[-1][2].get("range"), "bytes=100-149")
+
+    def test_large_object_downloaded_in_ranges(self):
+        data = self.server.objects["images/big.jpg"] = os.urandom(10_000)
+        chunk_mb = Config.S3_RANGE_CHUNK_MB
+        Config.S3_RANGE_CHUNK_MB = 3000 / (1024 * 1024)
+        try:
+            self.assertEqual(self.source.read(f"s3://{BUCKET}/images/big.jpg"), data)
+        finally:
+            Config.S3_RANGE_CHUNK_MB = chunk_mb
+        ranges = sorted(r[2]["range"] for r in self.requests("GET"))
+        self.assertEqual(ranges, ["bytes=0-2999", "bytes=3000-5999", "bytes=6000-8999", "bytes=9000-9999"])
+
+    def test_disk_cache(self):
+        path = f"s3://{BUCKET}/images/01.jpg"
+        self.assertEqual(self.source.read(path), self.server.objects["images/01.jpg"])
+        self.assertEqual(len(self.requests("GET")), 1)
+        self.assertEqual(self.source.read(path), self.server.objects["images/01.jpg"])
+        self.assertEqual(len(self.requests("GET")), 1)
+
+        # 新的实例（重启后）直接使用磁盘上的缓存
+        self.clear_requests()
+        self.assertEqual(self.make_source().read(path), self.server.objects["images/01.jpg"])
+        self.assertEqual(self.requests("GET"), [])
+
+        # 对象被修改（大小变化）后缓存失效
+        self.server.objects["images/01.jpg"] = b"changed"
+        self.assertEqual(self.make_source().read(path), b"changed")
+
+    def test_disk_cache_evicts_least_recently_used(self):
+        source = self.make_source(limit=250)
+        paths = [f"s3://{BUCKET}/images/{i:02d}.jpg" for i in range(3)]
+        source.read(paths[0])
+        source.read(paths[1])
+        source.read(paths[0])  # 最近使用，保留
+        source.read(paths[2])
+        self.assertLessEqual(source.cache.usage(), 250)
+        self.assertIn(source._cache_key(paths[0]), source.cache)
+        self.assertNotIn(source._cache_key(paths[1]), source.cache)
+
+    def test_read_head_bypasses_cache(self):
+        path = f"s3://{BUCKET}/images/03.jpg"
+        self.assertEqual(self.source.read_head(path, 10), self.server.objects["images/03.jpg"][:10])
+        self.assertEqual(self.requests("GET")[-1][2].get("range"), "bytes=0-9")
+        self.assertEqual(self.source.cache.usage(), 0)
+
+    def test_missing_objects(self):
+        path = f"s3://{BUCKET}/images/missing.jpg"
+        with self.assertRaises(FileNotFoundError):
+            self.source.stat(path)
+        with self.assertRaises(FileNotFoundError):
+            self.source.read(path)
+        self.assertFalse(self.source.exists(path))
+        with self.assertRaises(FileNotFoundError):
+            self.client.get_object("no-such-bucket", "x.jpg")
+
+
+if __name__ == "__main__":
+    unittest.main()
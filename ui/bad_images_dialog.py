@@ -0,0 +1,54 @@
+import os
+
+from PyQt6.QtWidgets import QDialog, QVBoxLayout, QLineEdit, QListWidget, QListWidgetItem, QLabel
+from PyQt6.QtCore import pyqtSignal, Qt
+
+
+class BadImagesDialog(QDialog):
+    """完整性检查发现的问题图片列表，可按文件名或问题描述筛选，双击跳转到该图片"""
+
+    image_activated = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("问题图片")
+        self.resize(640, 420)
+        self.bad_images = {}
+
+        layout = QVBoxLayout(self)
+        self.summary_label = QLabel()
+        layout.addWidget(self.summary_label)
+
+        self.filter_input = QLineEdit()
+        self.filter_input.setPlaceholderText("筛选文件名或问题...")
+        self.filter_input.textChanged.connect(self.apply_filter)
+        layout.addWidget(self.filter_input)
+
+        self.list_widget = QListWidget()
+        self.list_widget.setUniformItemSizes(True)
+        self.list_widget.itemDoubleClicked.connect(self.on_item_activated)
+        layout.addWidget(self.list_widget)
+
+    def set_bad_images(self, bad_images, total):
+        """设置检查结果 {图片路径: 问题描述}"""
+        self.bad_images = bad_images
+        self.summary_label.setText(f"共检查 {total} 张图片，发现 {len(bad_images)} 张有问题（双击跳转）")
+        self.list_widget.clear()
+        for image_path in sorted(bad_images):
+            item = QListWidgetItem(f"{os.path.basename(image_path)}  —  {bad_images[image_path]}")
+            item.setToolTip(image_path)
+            item.setData(Qt.ItemDataRole.UserRole, image_path)
+            self.list_widget.addItem(item)
+        self.apply_filter(self.filter_input.text())
+
+    def apply_filter(self, text):
+        """只显示路径或问题描述包含筛选文字的条目"""
+        text = text.strip().lower()
+        for row in range(self.list_widget.count()):
+            item = self.list_widget.item(row)
+            image_path = item.data(Qt.ItemDataRole.UserRole)
+            matched = not text or text in image_path.lower() or text in self.bad_images[image_path].lower()
+            item.setHidden(not matched)
+
+    def on_item_activated(self, item):
+        self.image_activated.emit(item.data(Qt.ItemDataRole.UserRole))
@@ -2,18 +2,21 @@ from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, QPushButton,
                              QLineEdit, QListWidget, QLabel, QMessageBox, 
                              QInputDialog, QGroupBox)
 from PyQt6.QtCore import pyqtSignal, Qt
-from ui.styles import get_category_button_style
+from ui.category_picker import CategoryPicker
 
 class CategoryManager(QWidget):
     """类别管理器"""
     
     category_selected = pyqtSignal(int, str)  # 发送选中的类别索引和名称
+    category_renamed = pyqtSignal(str, str)  # 旧名称, 新名称
+    category_merged = pyqtSignal(str, str)  # 被合并的类别, 目标类别
+    categories_deleted = pyqtSignal(list)  # 被删除的类别（清空时一次发出全部，只刷新一次）
     
     def __init__(self):
         super().__init__()
         self.categories = []
         self.selected_category = -1
-        self.category_buttons = []
+        self.editing_enabled = True
         self.init_ui()
     
     def init_ui(self):
@@ -49,12 +52,17 @@ class CategoryManager(QWidget):
         btn_layout = QVBoxLayout()
         edit_btn = QPushButton("编辑")
         edit_btn.clicked.connect(self.edit_category)
+        merge_btn = QPushButton("合并")
+        merge_btn.clicked.connect(self.merge_category)
         delete_btn = QPushButton("删除")
         delete_btn.clicked.connect(self.delete_category)
         clear_btn = QPushButton("清空")
         clear_btn.clicked.connect(self.clear_categories)
         
+        # 编辑类别表的按钮（标注数据未加载完时禁用）
+        self.edit_buttons = [edit_btn, merge_btn, delete_btn, clear_btn]
         btn_layout.addWidget(edit_btn)
+        btn_layout.addWidget(merge_btn)
         btn_layout.addWidget(delete_btn)
         btn_layout.addWidget(clear_btn)
         btn_layout.addStretch()
@@ -67,8 +75,11 @@ class CategoryManager(QWidget):
         
         # 快速选择组
         selection_group = QGroupBox("快速选择 (快捷键: 1-9,0)")
-        self.selection_layout = QVBoxLayout()
-        selection_group.setLayout(self.selection_layout)
+        selection_layout = QVBoxLayout()
+        self.picker = CategoryPicker()
+        self.picker.category_chosen.connect(self.select_category)
+        selection_layout.addWidget(self.picker)
+        selection_group.setLayout(selection_layout)
         layout.addWidget(selection_group)
         
         # 当前选择
@@ -86,14 +97,14 @@ class CategoryManager(QWidget):
             self.categories.append(category_name)
             self.category_list.addItem(category_name)
             self.category_input.clear()
-            self.update_category_buttons()
+            self.refresh_picker()
         elif category_name in self.categories:
             QMessageBox.warning(self, "警告", "类别名称已存在！")
     
     def edit_category(self):
         """编辑类别"""
         current_item = self.category_list.currentItem()
-        if current_item:
+        if current_item and self.editing_enabled:
             current_index = self.category_list.currentRow()
             old_name = current_item.text()
             
@@ -101,93 +112,122 @@ class CategoryManager(QWidget):
                 self, "编辑类别", "新的类别名称:", text=old_name
             )
             
-            if ok and new_name.strip() and new_name.strip() != old_name:
-                if new_name.strip() not in self.categories:
-                    self.categories[current_index] = new_name.strip()
-                    current_item.setText(new_name.strip())
-                    self.update_category_buttons()
+            new_name = new_name.strip()
+            if ok and new_name and new_name != old_name:
+                if new_name not in self.categories:
+                    self.categories[current_index] = new_name
+                    current_item.setText(new_name)
+                    self.picker.rename_usage(old_name, new_name)
+                    self.refresh_picker()
+                    self.update_selected_label()
+                    self.category_renamed.emit(old_name, new_name)
                 else:
-                    QMessageBox.warning(self, "警告", "类别名称已存在！")
+                    reply = QMessageBox.question(
+                        self, "类别已存在",
+                        f"类别 '{new_name}' 已存在，是否把 '{old_name}' 合并到 '{new_name}'？",
+                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+                    )
+                    if reply == QMessageBox.StandardButton.Yes:
+                        self.merge_into(current_index, new_name)
+
+    def merge_category(self):
+        """把当前类别合并到另一个类别"""
+        current_item = self.category_list.currentItem()
+        if not current_item or len(self.categories) < 2:
+            return
+        current_index = self.category_list.currentRow()
+        targets = [c for i, c in enumerate(self.categories) if i != current_index]
+        target, ok = QInputDialog.getItem(
+            self, "合并类别", f"把 '{current_item.text()}' 的标注合并到:", targets, 0, False
+        )
+        if ok and target:
+            self.merge_into(current_index, target)
+
+    def merge_into(self, index, target_name):
+        """移除第 index 个类别，其标注并入 target_name"""
+        source_name = self.categories[index]
+        self.picker.rename_usage(source_name, target_name)
+        self.remove_category_at(index)
+        self.category_merged.emit(source_name, target_name)
+
+    def remove_category_at(self, index):
+        """从列表中移除类别并修正当前选择"""
+        self.categories.pop(index)
+        self.category_list.takeItem(index)
+
+        if self.selected_category == index:
+            self.selected_category = -1
+        elif self.selected_category > index:
+            self.selected_category -= 1
+
+        self.refresh_picker()
+        self.update_selected_label()
     
     def delete_category(self):
-        """删除类别"""
+        """删除类别（该类别的标注一并清除）"""
         current_item = self.category_list.currentItem()
         if current_item:
             reply = QMessageBox.question(
-                self, "确认删除", f"确定要删除类别 '{current_item.text()}' 吗？",
+                self, "确认删除",
+                f"确定要删除类别 '{current_item.text()}' 吗？\n该类别下的图片将变为未标注。",
                 QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
             )
             
             if reply == QMessageBox.StandardButton.Yes:
-                current_index = self.category_list.currentRow()
-                self.categories.pop(current_index)
-                self.category_list.takeItem(current_index)
-                
-                # 重置选择
-                if self.selected_category >= len(self.categories):
-                    self.selected_category = -1
-                
-                self.update_category_buttons()
-                self.update_selected_label()
+                name = current_item.text()
+                self.picker.forget_usage(name)
+                self.remove_category_at(self.category_list.currentRow())
+                self.categories_deleted.emit([name])
     
     def clear_categories(self):
         """清空所有类别"""
         reply = QMessageBox.question(
-            self, "确认清空", "确定要清空所有类别吗？",
+            self, "确认清空", "确定要清空所有类别吗？\n所有图片将变为未标注。",
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
         
         if reply == QMessageBox.StandardButton.Yes:
+            removed = self.categories.copy()
             self.categories.clear()
             self.category_list.clear()
             self.selected_category = -1
-            self.update_category_buttons()
+            self.refresh_picker()
             self.update_selected_label()
+            if removed:
+                self.categories_deleted.emit(removed)
     
-    def update_category_buttons(self):
-        """更新类别按钮"""
-        # 清除旧按钮
-        for button in self.category_buttons:
-            button.deleteLater()
-        self.category_buttons.clear()
-        
-        # 创建新按钮
-        rows = []
-        current_row = QHBoxLayout()
-        
-        for i, category in enumerate(self.categories):
-            button = QPushButton(f"{i+1}. {category}")
-            button.clicked.connect(lambda checked, idx=i: self.select_category(idx))
-            button.setStyleSheet(get_category_button_style(i == self.selected_category))
-            
-            self.category_buttons.append(button)
-            current_row.addWidget(button)
-            
-            # 每行最多3个按钮
-            if (i + 1) % 3 == 0 or i == len(self.categories) - 1:
-                rows.append(current_row)
-                current_row = QHBoxLayout()
-        
-        # 添加到布局
-        for row in rows:
-            self.selection_layout.addLayout(row)
+    def set_editing_enabled(self, enabled):
+        """允许/禁止编辑、合并、删除和清空类别"""
+        self.editing_enabled = enabled
+        for button in self.edit_buttons:
+            button.setEnabled(enabled)
+
+    def refresh_picker(self):
+        """类别列表变化后更新选择器（重建搜索索引，列表为虚拟化视图）"""
+        self.picker.set_categories(self.categories)
+        self.picker.show_category(self.selected_category)
     
     def select_category(self, index):
-        """选择类别"""
+        """选择类别（用户操作），发出 category_selected"""
         if 0 <= index < len(self.categories):
-            old_selected = self.selected_category
-            self.selected_category = index
-            
-            # 更新按钮样式
-            if old_selected >= 0 and old_selected < len(self.category_buttons):
-                self.category_buttons[old_selected].setStyleSheet(get_category_button_style(False))
-            
-            if index < len(self.category_buttons):
-                self.category_buttons[index].setStyleSheet(get_category_button_style(True))
-            
-            self.update_selected_label()
+            self.show_category(index)
+            self.picker.note_used(self.categories[index])
             self.category_selected.emit(index, self.categories[index])
     
+    def show_category(self, index):
+        """只更新当前选择的显示，不发出信号；index 为 -1 时清除选择"""
+        self.selected_category = index if 0 <= index < len(self.categories) else -1
+        self.picker.show_category(self.selected_category)
+        self.update_selected_label()
+    
+    def category_for_shortcut(self, slot):
+        """数字键快捷位对应的类别序号，没有时返回-1"""
+        return self.picker.category_for_slot(slot)
+    
+    def set_usage_counts(self, counts):
+        """用已有标注中各类别的数量初始化常用类别"""
+        self.picker.set_usage_counts(counts)
+    
     def update_selected_label(self):
         """更新选择标签"""
         if self.selected_category >= 0:
@@ -203,7 +243,7 @@ class CategoryManager(QWidget):
         for category in self.categories:
             self.category_list.addItem(category)
         self.selected_category = -1
-        self.update_category_buttons()
+        self.refresh_picker()
         self.update_selected_label()
     
     def get_categories(self):
@@ -0,0 +1,248 @@
+import heapq
+from collections import deque
+from itertools import chain
+from PyQt6.QtWidgets import QWidget, QVBoxLayout, QLineEdit, QListView, QAbstractItemView
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QEvent, pyqtSignal
+
+from config import Config
+from utils.category_search import CategorySearchIndex
+
+# 数字键顺序（与 Config.SHORTCUTS 一致：1..9, 0）
+SHORTCUT_KEYS = sorted(Config.SHORTCUTS, key=Config.SHORTCUTS.get)
+
+
+class CategoryListModel(QAbstractListModel):
+    """类别列表模型：rows 为 None 时显示全部类别，否则只显示搜索结果"""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.categories = []
+        self.rows = None
+        self._row_of = {}
+        self.shortcut_labels = {}  # 类别序号 -> 快捷键
+
+    def set_categories(self, categories):
+        self.beginResetModel()
+        self.categories = list(categories)
+        self.rows = None
+        self._row_of = {}
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        self.beginResetModel()
+        self.rows = rows
+        self._row_of = {} if rows is None else {index: row for row, index in enumerate(rows)}
+        self.endResetModel()
+
+    def set_shortcut_labels(self, labels):
+        """更新快捷键标记，只刷新变化的行"""
+        changed = set(labels.items()) ^ set(self.shortcut_labels.items())
+        self.shortcut_labels = labels
+        for index in {index for index, _ in changed}:
+            row = self.row_of(index)
+            if row is not None:
+                model_index = self.index(row)
+                self.dataChanged.emit(model_index, model_index)
+
+    def category_index(self, row):
+        return row if self.rows is None else self.rows[row]
+
+    def row_of(self, category_index):
+        """类别序号在当前列表中的行，不在列表中返回None"""
+        if self.rows is None:
+            return category_index if 0 <= category_index < len(self.categories) else None
+        return self._row_of.get(category_index)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.categories) if self.rows is None else len(self.rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        category_index = self.category_index(index.row())
+        name = self.categories[category_index]
+        if role == Qt.ItemDataRole.DisplayRole:
+            key = self.shortcut_labels.get(category_index)
+            prefix = f"[{key}] " if key else ""
+            return f"{prefix}{category_index + 1}. {name}"
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return name
+        return None
+
+
+class CategoryPicker(QWidget):
+    """可搜索的类别选择器
+
+    列表为虚拟化视图，类别数量不影响界面重建；搜索使用n-gram索引。
+    数字键对应的快捷位：类别不超过10个时按顺序对应，否则依次为最近使用和最常用的类别。
+    """
+
+    category_chosen = pyqtSignal(int)  # 选中的类别序号
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.categories = []
+        self.index = CategorySearchIndex()
+        self.recent = deque(maxlen=Config.CATEGORY_RECENT_SLOTS)
+        self.frequency = {}  # 类别名称 -> 使用次数
+        self.slots = []  # 快捷位 -> 类别序号
+        self.slot_names = []  # 快捷位 -> 类别名称，分配后保持不变
+        self.last_used = {}  # 类别名称 -> 最近一次使用的序号
+        self._use_count = 0
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.search_edit = QLineEdit()
+        self.search_edit.setPlaceholderText("搜索类别... (Ctrl+F，↑↓选择，回车确认)")
+        self.search_edit.setClearButtonEnabled(True)
+        self.search_edit.textChanged.connect(self.apply_filter)
+        self.search_edit.installEventFilter(self)
+        layout.addWidget(self.search_edit)
+
+        self.model = CategoryListModel(self)
+        self.view = QListView()
+        self.view.setModel(self.model)
+        self.view.setUniformItemSizes(True)
+        self.view.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.view.clicked.connect(lambda index: self.choose_row(index.row()))
+        self.view.activated.connect(lambda index: self.choose_row(index.row()))
+        layout.addWidget(self.view)
+
+        self.setLayout(layout)
+
+    def set_categories(self, categories):
+        """设置类别列表并重建搜索索引"""
+        self.categories = list(categories)
+        self.index.set_names(self.categories)
+        self.model.set_categories(self.categories)
+        names = set(self.categories)
+        self.recent = deque((n for n in self.recent if n in names), maxlen=self.recent.maxlen)
+        self.apply_filter(self.search_edit.text())
+        self.update_slots()
+
+    def apply_filter(self, text):
+        """按搜索文本过滤列表"""
+        if not text.strip():
+            self.model.set_rows(None)
+        else:
+            rows = self.index.search(text, limit=Config.CATEGORY_SEARCH_LIMIT,
+                                     boost=lambda i: self.frequency.get(self.categories[i], 0))
+            self.model.set_rows(rows)
+            if rows:
+                self.view.setCurrentIndex(self.model.index(0))
+
+    def choose_row(self, row):
+        if 0 <= row < self.model.rowCount():
+            self.category_chosen.emit(self.model.category_index(row))
+
+    def show_category(self, category_index):
+        """在列表中高亮类别（不发出信号）"""
+        row = self.model.row_of(category_index) if category_index >= 0 else None
+        if row is None:
+            self.view.clearSelection()
+            return
+        model_index = self.model.index(row)
+        self.view.setCurrentIndex(model_index)
+        self.view.scrollTo(model_index)
+
+    def focus_search(self):
+        self.search_edit.setFocus()
+        self.search_edit.selectAll()
+
+    def eventFilter(self, obj, event):
+        if obj is self.search_edit and event.type() == QEvent.Type.KeyPress:
+            key = event.key()
+            if key in (Qt.Key.Key_Up, Qt.Key.Key_Down):
+                row = self.view.currentIndex().row()
+                row = row + (1 if key == Qt.Key.Key_Down else -1)
+                if 0 <= row < self.model.rowCount():
+                    self.view.setCurrentIndex(self.model.index(row))
+                return True
+            if key in (Qt.Key.Key_Return, Qt.Key.Key_Enter):
+                row = self.view.currentIndex().row()
+                self.choose_row(row if row >= 0 else 0)
+                self.search_edit.clear()
+                self.search_edit.clearFocus()
+                return True
+            if key == Qt.Key.Key_Escape:
+                self.search_edit.clear()
+                self.search_edit.clearFocus()
+                return True
+        return super().eventFilter(obj, event)
+
+    # ---- 最近/常用类别与数字键 ----
+
+    def set_usage_counts(self, counts):
+        """用已有标注的各类别数量初始化常用类别"""
+        names = set(self.categories)
+        self.frequency = {name: count for name, count in counts.items() if name in names}
+        self.slot_names = []
+        self.update_slots()
+
+    def note_used(self, name):
+        """记录一次使用"""
+        self.frequency[name] = self.frequency.get(name, 0) + 1
+        if name in self.recent:
+            self.recent.remove(name)
+        self.recent.appendleft(name)
+        self._use_count += 1
+        self.last_used[name] = self._use_count
+        if name in self.slot_names or name not in self.categories:
+            return
+        # 没有快捷位的类别只替换最久未使用的一个位置，其余数字键对应的类别不变
+        victim = min(range(len(self.slot_names)), key=lambda slot: (
+            self.last_used.get(self.slot_names[slot], 0), self.frequency.get(self.slot_names[slot], 0)))
+        self.slot_names[victim] = name
+        self.apply_slots()
+
+    def rename_usage(self, old_name, new_name):
+        """类别重命名/合并后迁移使用记录"""
+        count = self.frequency.pop(old_name, 0)
+        if count:
+            self.frequency[new_name] = self.frequency.get(new_name, 0) + count
+        recent = [new_name if n == old_name else n for n in self.recent]
+        self.recent = deque(dict.fromkeys(recent), maxlen=self.recent.maxlen)
+        last_used = self.last_used.pop(old_name, 0)
+        if last_used:
+            self.last_used[new_name] = max(self.last_used.get(new_name, 0), last_used)
+        slot_names = [new_name if n == old_name else n for n in self.slot_names]
+        # 合并到已有快捷位的类别时空出一个位置，在 update_slots 中补齐
+        self.slot_names = [n if n not in slot_names[:i] else None for i, n in enumerate(slot_names)]
+
+    def forget_usage(self, name):
+        self.frequency.pop(name, None)
+        if name in self.recent:
+            self.recent.remove(name)
+        self.last_used.pop(name, None)
+
+    def update_slots(self):
+        """重新计算数字键对应的类别：已分配且仍存在的快捷位保持不变，只为空位补充类别"""
+        if len(self.categories) <= len(SHORTCUT_KEYS):
+            self.slot_names = list(self.categories)
+        else:
+            names = set(self.categories)
+            slot_names = [n if n in names else None for n in self.slot_names[:len(SHORTCUT_KEYS)]]
+            slot_names += [None] * (len(SHORTCUT_KEYS) - len(slot_names))
+            assigned = set(slot_names)
+            # 空位依次用最近使用、最常用、列表顺序的类别补齐
+            frequent = (name for _, name in heapq.nlargest(len(SHORTCUT_KEYS) * 2, (
+                (count, name) for name, count in self.frequency.items() if name in names)))
+            candidates = (n for n in chain(self.recent, frequent, self.categories) if n not in assigned)
+            for slot, name in enumerate(slot_names):
+                if name is None:
+                    slot_names[slot] = next(candidates)
+                    assigned.add(slot_names[slot])
+            self.slot_names = slot_names
+        self.apply_slots()
+
+    def apply_slots(self):
+        positions = {name: i for i, name in enumerate(self.categories)}
+        self.slots = [positions[name] for name in self.slot_names]
+        self.model.set_shortcut_labels({index: SHORTCUT_KEYS[slot] for slot, index in enumerate(self.slots)})
+
+    def category_for_slot(self, slot):
+        """快捷位对应的类别序号，没有时返回-1"""
+        return self.slots[slot] if 0 <= slot < len(self.slots) else -1
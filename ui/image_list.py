@@ -0,0 +1,179 @@
+from PyQt6.QtWidgets import QListView, QAbstractItemView
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QItemSelection, QItemSelectionModel, pyqtSignal
+
+
+class ImageListModel(QAbstractListModel):
+    """图像列表模型：只保存要显示的图片位置，文字在绘制可见行时才生成
+
+    rows 为 None 时显示全部图片，否则为升序的图片位置数组（筛选结果）。
+    numpy 在用到时才导入，不拖慢主窗口启动。
+    """
+
+    REFRESH_ALL_ROWS = 256
+
+    def __init__(self, text_for, tooltip_for=None, parent=None):
+        super().__init__(parent)
+        self.text_for = text_for
+        self.tooltip_for = tooltip_for
+        self._count = 0
+        self._rows = None
+
+    def set_count(self, count):
+        """图片总数变化（重新扫描或排序）时调用，同时清除筛选"""
+        self.beginResetModel()
+        self._count = count
+        self._rows = None
+        self.endResetModel()
+
+    def set_rows(self, rows):
+        import numpy as np
+
+        self.beginResetModel()
+        self._rows = None if rows is None else np.asarray(rows, dtype=np.int64)
+        self.endResetModel()
+
+    @property
+    def rows(self):
+        return self._rows
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return self._count if self._rows is None else len(self._rows)
+
+    def image_index(self, row):
+        """行号 -> 图片位置"""
+        return row if self._rows is None else int(self._rows[row])
+
+    def row_of(self, image_index):
+        """图片位置 -> 行号，不在当前筛选结果中时为-1"""
+        if self._rows is None:
+            return image_index if 0 <= image_index < self._count else -1
+        import numpy as np
+
+        row = int(np.searchsorted(self._rows, image_index))
+        return row if row < len(self._rows) and self._rows[row] == image_index else -1
+
+    def rows_of(self, image_indices):
+        """批量换算行号（升序、去重），不在筛选结果中的图片忽略"""
+        import numpy as np
+
+        indices = np.fromiter(image_indices, dtype=np.int64)
+        if self._rows is None:
+            return np.unique(indices[(indices >= 0) & (indices < self._count)])
+        rows = np.minimum(np.searchsorted(self._rows, indices), max(0, len(self._rows) - 1))
+        if not len(self._rows):
+            return rows[:0]
+        return np.unique(rows[self._rows[rows] == indices])
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < self.rowCount():
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.text_for(self.image_index(index.row()))
+        if role == Qt.ItemDataRole.ToolTipRole and self.tooltip_for is not None:
+            return self.tooltip_for(self.image_index(index.row()))
+        return None
+
+    def refresh(self, image_indices=None):
+        """图片的显示文字变化（为空时刷新全部行）；视图只重绘可见行"""
+        count = self.rowCount()
+        if not count:
+            return
+        if image_indices is not None and len(image_indices) > self.REFRESH_ALL_ROWS:
+            image_indices = None  # 逐行通知比整体重绘（只画可见行）更慢
+        if image_indices is None:
+            self.dataChanged.emit(self.index(0), self.index(count - 1), [Qt.ItemDataRole.DisplayRole])
+            return
+        for row in sorted(r for r in map(self.row_of, image_indices) if r >= 0):
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+
+
+class ImageListView(QListView):
+    """图像列表视图，行与图片位置的换算由模型完成，对外的接口都使用图片位置"""
+
+    current_image_changed = pyqtSignal(int)
+
+    def __init__(self, text_for, tooltip_for=None, parent=None):
+        super().__init__(parent)
+        self.list_model = ImageListModel(text_for, tooltip_for, self)
+        self.setModel(self.list_model)
+        self.setUniformItemSizes(True)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+        self._syncing = False
+        self.selectionModel().currentRowChanged.connect(self._on_current_row_changed)
+
+    def _on_current_row_changed(self, current, previous):
+        if current.isValid() and not self._syncing:
+            self.current_image_changed.emit(self.list_model.image_index(current.row()))
+
+    def set_count(self, count):
+        self.list_model.set_count(count)
+
+    def set_filter(self, rows):
+        """只显示 rows 中的图片（None 为全部），保持当前图片"""
+        current = self.current_image()
+        self.list_model.set_rows(rows)
+        if current >= 0:
+            self.set_current_image(current, notify=False)
+
+    def visible_image_indices(self):
+        """当前显示的图片位置（升序）"""
+        rows = self.list_model.rows
+        return range(self.list_model.rowCount()) if rows is None else rows.tolist()
+
+    def current_image(self):
+        index = self.currentIndex()
+        return self.list_model.image_index(index.row()) if index.isValid() else -1
+
+    def set_current_image(self, image_index, flags=QItemSelectionModel.SelectionFlag.ClearAndSelect,
+                          notify=True):
+        """设为当前图片，不在筛选结果中时返回 False；notify=False 时不发出 current_image_changed"""
+        row = self.list_model.row_of(image_index)
+        if row < 0:
+            return False
+        index = self.list_model.index(row)
+        self._syncing = not notify
+        try:
+            self.selectionModel().setCurrentIndex(index, flags)
+        finally:
+            self._syncing = False
+        self.scrollTo(index)
+        return True
+
+    def neighbor_image(self, image_index, step):
+        """筛选结果中 image_index 之后（step=1）或之前（step=-1）的图片位置，没有时为-1
+
+        image_index 本身不在筛选结果中时也按位置找最近的一张
+        """
+        rows = self.list_model.rows
+        if rows is None:
+            target = image_index + step
+            return target if 0 <= target < self.list_model.rowCount() else -1
+        import numpy as np
+
+        if step > 0:
+            row = int(np.searchsorted(rows, image_index, side="right"))
+            return int(rows[row]) if row < len(rows) else -1
+        row = int(np.searchsorted(rows, image_index, side="left")) - 1
+        return int(rows[row]) if row >= 0 else -1
+
+    def selected_image_indices(self):
+        """选中的图片位置（升序）"""
+        return sorted(self.list_model.image_index(index.row())
+                      for index in self.selectionModel().selectedIndexes())
+
+    def select_images(self, image_indices, command=QItemSelectionModel.SelectionFlag.ClearAndSelect):
+        """按连续行区间一次性设置选择（不在筛选结果中的图片忽略）"""
+        import numpy as np
+
+        rows = self.list_model.rows_of(image_indices)
+        selection = QItemSelection()
+        if len(rows):
+            breaks = np.flatnonzero(np.diff(rows) != 1)
+            starts = np.concatenate([[rows[0]], rows[breaks + 1]])
+            ends = np.concatenate([rows[breaks], [rows[-1]]])
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                selection.select(self.list_model.index(start), self.list_model.index(end))
+        self.selectionModel().select(selection, command)
@@ -1,14 +1,29 @@
+import os
+import math
+import time
+
 from PyQt6.QtWidgets import QLabel, QScrollArea, QVBoxLayout, QWidget, QSizePolicy
-from PyQt6.QtCore import Qt, pyqtSignal, QPoint
+from PyQt6.QtCore import Qt, pyqtSignal, QPoint, QRect, QTimer
 from PyQt6.QtGui import QPixmap, QPainter, QPen, QImage, QColor
-from PIL import Image
-import cv2
-import numpy as np
+
+from config import Config
+from utils.instrumentation import timed_span, profiler
+from utils.memory_budget import memory_budget
+
+
+def pixmap_bytes(pixmap):
+    """QPixmap 占用的内存字节数"""
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
 
 
 class ImageDisplayLabel(QLabel):
     """改进的图像显示标签，支持缩放、拖拽和鼠标位置追踪"""
     mouse_image_pos_changed = pyqtSignal(int, int)
+    # 在解码进程中加载的图片完成后发出 (路径, 是否成功)
+    image_loaded = pyqtSignal(str, bool)
+    _decoded = pyqtSignal(str, object)
+    # 内存预算的淘汰可能发生在工作线程中，QPixmap 只能在界面线程释放
+    _tile_evict_requested = pyqtSignal(object)
 
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -25,78 +40,197 @@ class ImageDisplayLabel(QLabel):
         self._offset_at_start = QPoint(0, 0)
         self.setCursor(Qt.CursorShape.ArrowCursor)
         self._fit_to_widget = True
+        # 缩放结果缓存：(缩放后尺寸, 是否平滑缩放, 左上角, QPixmap)
+        self._tile = None
+        self._interacting = False
+        self._settle_timer = QTimer(self)
+        self._settle_timer.setSingleShot(True)
+        self._settle_timer.timeout.connect(self._on_settled)
+        # 当前图片始终保留，只计入内存统计；缩放缓存可被淘汰，重新生成代价高于缩略图
+        self._image_budget = memory_budget.register("当前图片")
+        self._tile_budget = memory_budget.register("图片缩放缓存", self._tile_evict_requested.emit, weight=2.0)
+        self._tile_evict_requested.connect(self._evict_tile)
+        self._pending_path = None  # 正在解码进程中解码的图片
+        self._decoded.connect(self._on_decoded)
+        self.destroyed.connect(self._image_budget.close)
+        self.destroyed.connect(self._tile_budget.close)
 
     def set_image(self, image_array):
         """设置RGB图片为QPixmap并自适应到label大小"""
         height, width, channel = image_array.shape
         bytes_per_line = 3 * width
         q_image = QImage(image_array.data, width, height, bytes_per_line, QImage.Format.Format_RGB888)
+        self.setText("")
         self._base_pixmap = QPixmap.fromImage(q_image)
+        self._image_budget.charge("image", pixmap_bytes(self._base_pixmap))
+        self._set_tile(None)
         self._zoom = 1.0
         self._offset = QPoint(0, 0)
         self._fit_to_widget = True
         self.update_display()
 
+    @timed_span("decode")
     def set_image_from_path(self, image_path):
-        """从文件路径加载图像"""
-        try:
-            # 使用PIL加载图像以支持更多格式
-            pil_image = Image.open(image_path)
+        """从文件路径（或压缩包成员路径）加载图像"""
+        # 延迟导入，加快启动
+        from utils.image_decoders import decode_image
 
-            # 转换为RGB（如果需要）
-            if pil_image.mode != 'RGB':
-                pil_image = pil_image.convert('RGB')
-
-            # 转换为numpy数组
-            image_array = np.array(pil_image)
+        try:
+            # 按格式和尺寸选择本机最快的解码后端（PIL/OpenCV/Qt），输出均为RGB数组
+            image_array = decode_image(image_path)
             self.set_image(image_array)
             return True
 
         except Exception as e:
             print(f"加载图像失败: {e}")
-            self.clear()
+            self._base_pixmap = None
+            self._image_budget.clear()
+            self._set_tile(None)
             self.setText(f"加载图像失败: {str(e)}")
             return False
 
+    def load_image(self, image_path):
+        """加载图像；较大的PNG/TIFF交给解码进程，返回 None 表示正在解码，完成后发出 image_loaded"""
+        from utils.decode_service import decode_service
+
+        service = decode_service()
+        nbytes = service.process_bytes(image_path)
+        if not nbytes:
+            self._pending_path = None
+            return self.set_image_from_path(image_path)
+
+        # 解码期间不显示上一张图片，避免误以为在标注它
+        self._pending_path = image_path
+        self._base_pixmap = None
+        self._image_budget.clear()
+        self._set_tile(None)
+        self.setText(f"正在解码 {os.path.basename(image_path)} ...")
+        start = time.perf_counter()
+        future = service.submit(image_path, nbytes)
+        future.add_done_callback(lambda f: self._decoded.emit(image_path, (f, start)))
+        return None
+
+    def _on_decoded(self, image_path, result):
+        future, start = result
+        try:
+            decoded = future.result()
+        except Exception as e:
+            if image_path == self._pending_path:
+                self._pending_path = None
+                print(f"加载图像失败: {e}")
+                self.setText(f"加载图像失败: {str(e)}")
+                self.image_loaded.emit(image_path, False)
+            return
+        try:
+            if image_path != self._pending_path:
+                return  # 已切换到其他图片
+            self._pending_path = None
+            self.set_image(decoded.array)
+        finally:
+            decoded.release()
+        profiler.record("decode_process", (time.perf_counter() - start) * 1000, start=start)
+        self.image_loaded.emit(image_path, True)
+
     def update_display(self):
+        """请求重绘（实际绘制在 paintEvent 中进行）"""
+        self.update()
+
+    def _begin_interaction(self):
+        """拖拽、滚轮、改变大小期间使用快速缩放，停止操作一段时间后再平滑缩放"""
+        self._interacting = True
+        self._settle_timer.start(Config.VIEWER_SETTLE_MS)
+
+    def _on_settled(self):
+        self._interacting = False
+        self.update()
+
+    def _display_geometry(self):
+        """当前缩放比例、缩放后的图片尺寸以及图片左上角在控件中的位置"""
+        widget_w, widget_h = self.width(), self.height()
+        zoom = self._get_fit_zoom() if self._fit_to_widget else self._zoom
+        scaled_w = int(self._base_pixmap.width() * zoom)
+        scaled_h = int(self._base_pixmap.height() * zoom)
+        x = (widget_w - scaled_w) // 2
+        y = (widget_h - scaled_h) // 2
+        if not self._fit_to_widget:
+            x += self._offset.x()
+            y += self._offset.y()
+        return zoom, scaled_w, scaled_h, x, y
+
+    @timed_span("render_view")
+    def _render_tile(self, zoom, scaled_size, visible, smooth):
+        """把图片中覆盖 visible（缩放后坐标）的部分缩放好，返回 (左上角, QPixmap)
+
+        缩放后的整张图不超过 Config.VIEWER_CACHE_MAX_PIXELS 时缩放整张图；否则只缩放可见区域
+        四周各扩展半个控件大小的部分，拖拽时在这个范围内只需平移
+        """
+        scaled_w, scaled_h = scaled_size
+        if scaled_w * scaled_h > Config.VIEWER_CACHE_MAX_PIXELS:
+            margin_w, margin_h = self.width() // 2, self.height() // 2
+            region = visible.adjusted(-margin_w, -margin_h, margin_w, margin_h)
+            region = region.intersected(QRect(0, 0, scaled_w, scaled_h))
+        else:
+            region = QRect(0, 0, scaled_w, scaled_h)
+
+        # 换算到原图上取整后的区域
+        pixmap_w, pixmap_h = self._base_pixmap.width(), self._base_pixmap.height()
+        left = max(0, math.floor(region.left() / zoom))
+        top = max(0, math.floor(region.top() / zoom))
+        right = min(pixmap_w, math.ceil((region.right() + 1) / zoom))
+        bottom = min(pixmap_h, math.ceil((region.bottom() + 1) / zoom))
+        origin = QPoint(round(left * zoom), round(top * zoom))
+        target_w = max(1, min(scaled_w, round(right * zoom)) - origin.x())
+        target_h = max(1, min(scaled_h, round(bottom * zoom)) - origin.y())
+
+        source = self._base_pixmap
+        if (left, top, right, bottom) != (0, 0, pixmap_w, pixmap_h):
+            source = source.copy(left, top, right - left, bottom - top)
+        mode = Qt.TransformationMode.SmoothTransformation if smooth else Qt.TransformationMode.FastTransformation
+        pixmap = source.scaled(target_w, target_h, Qt.AspectRatioMode.IgnoreAspectRatio, mode)
+        return origin, pixmap
+
+    def _set_tile(self, tile):
+        self._tile = tile
+        if tile is None:
+            self._tile_budget.clear()
+        else:
+            self._tile_budget.charge("tile", pixmap_bytes(tile[3]))
+
+    def _evict_tile(self, key):
+        """内存预算不足时丢弃缩放缓存，下次绘制时重新生成"""
+        if key not in self._tile_budget.entries:  # 排队期间可能已生成新的缓存
+            self._tile = None
+
+    def paintEvent(self, event):
+        # 背景、边框和提示文字
+        super().paintEvent(event)
         if self._base_pixmap is None:
-            self.clear()
             return
-        if self._fit_to_widget:
-            # Fit to widget (width)
-            widget_w, widget_h = self.width(), self.height()
-            pixmap = self._base_pixmap.scaled(widget_w, widget_h, Qt.AspectRatioMode.KeepAspectRatio,
-                                              Qt.TransformationMode.SmoothTransformation)
-            self.setPixmap(pixmap)
-        else:
-            # Custom zoom and offset
-            pixmap = self._base_pixmap
-            scaled_w = int(pixmap.width() * self._zoom)
-            scaled_h = int(pixmap.height() * self._zoom)
-            if scaled_w < 10 or scaled_h < 10:
-                return
-            scaled_pixmap = pixmap.scaled(scaled_w, scaled_h, Qt.AspectRatioMode.KeepAspectRatio,
-                                          Qt.TransformationMode.SmoothTransformation)
-            # 画布
-            widget_w, widget_h = self.width(), self.height()
-            canvas = QPixmap(widget_w, widget_h)
-            canvas.fill(QColor.fromRgb(240, 240, 240))
-            # 计算偏移
-            x = (widget_w - scaled_w) // 2 + self._offset.x()
-            y = (widget_h - scaled_h) // 2 + self._offset.y()
-            painter = None
-            try:
-                painter = QPainter(canvas)
-                painter.drawPixmap(x, y, scaled_pixmap)
-            finally:
-                if painter: painter.end()
-            self.setPixmap(canvas)
+        zoom, scaled_w, scaled_h, x, y = self._display_geometry()
+        if scaled_w < 1 or scaled_h < 1:
+            return
+
+        # 可见部分（缩放后坐标）；缓存的缩放结果覆盖它时直接平移绘制
+        visible = QRect(-x, -y, self.width(), self.height()).intersected(QRect(0, 0, scaled_w, scaled_h))
+        if visible.isEmpty():
+            return
+        smooth = not self._interacting
+        tile = self._tile
+        if (tile is None or tile[0] != (scaled_w, scaled_h) or (smooth and not tile[1])
+                or not QRect(tile[2], tile[3].size()).contains(visible)):
+            origin, pixmap = self._render_tile(zoom, (scaled_w, scaled_h), visible, smooth)
+            tile = ((scaled_w, scaled_h), smooth, origin, pixmap)
+            self._set_tile(tile)
+
+        painter = QPainter(self)
+        try:
+            painter.drawPixmap(x + tile[2].x(), y + tile[2].y(), tile[3])
+        finally:
+            painter.end()
 
     def resizeEvent(self, event):
-        if self._fit_to_widget:
-            self.update_display()
-        else:
-            self.update_display()
+        # 连续改变大小时先快速缩放，停止后再平滑缩放
+        self._begin_interaction()
         super().resizeEvent(event)
 
     def wheelEvent(self, event):
@@ -104,6 +238,7 @@ class ImageDisplayLabel(QLabel):
             return
         angle = event.angleDelta().y()
         factor = 1.2 if angle > 0 else 1 / 1.2
+        self._begin_interaction()
         self.zoom_at(event.position().toPoint(), factor)
 
     def zoom_at(self, mouse_pos, factor):
@@ -155,6 +290,7 @@ class ImageDisplayLabel(QLabel):
         if self._dragging:
             delta = event.position().toPoint() - self._drag_start_pos
             self._offset = self._offset_at_start + delta
+            self._begin_interaction()
             self.update_display()
         # 计算鼠标在图片中的坐标
         img_x, img_y = self._get_image_xy(event.position().toPoint())
@@ -236,6 +372,10 @@ class ImageDisplayLabel(QLabel):
             return 0, 0
         return self._base_pixmap.width(), self._base_pixmap.height()
 
+    def is_decoding(self):
+        """当前图片是否仍在解码进程中解码"""
+        return self._pending_path is not None
+
     def get_current_zoom(self):
         """获取当前缩放比例"""
         if self._fit_to_widget:
@@ -266,8 +406,8 @@ class ImageViewer(QWidget):
         self.mouse_pos_text = ""
 
     def load_image(self, image_path):
-        """加载并显示图像"""
-        return self.image_display.set_image_from_path(image_path)
+        """加载并显示图像；返回 None 表示正在解码进程中解码，完成后 image_display 发出 image_loaded"""
+        return self.image_display.load_image(image_path)
 
     def set_image_array(self, image_array):
         """设置图像数组"""
@@ -293,6 +433,9 @@ class ImageViewer(QWidget):
         """获取图像尺寸"""
         return self.image_display.get_image_size()
 
+    def is_decoding(self):
+        return self.image_display.is_decoding()
+
     def get_current_zoom(self):
         """获取当前缩放比例"""
         return self.image_display.get_current_zoom()
@@ -1,80 +1,373 @@
 from PyQt6.QtWidgets import (QMainWindow, QWidget, QHBoxLayout, QVBoxLayout,
                              QSplitter, QToolBar, QStatusBar, QPushButton,
-                             QLabel, QListWidget, QProgressBar, QFileDialog,
-                             QMessageBox, QInputDialog, QGroupBox, QTextEdit)
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal
+                             QLabel, QProgressBar, QFileDialog, QComboBox, QLineEdit,
+                             QMessageBox, QInputDialog, QGroupBox, QTextEdit,
+                             QStackedWidget)
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QItemSelection, QItemSelectionModel
 from PyQt6.QtGui import QAction, QKeySequence, QShortcut, QIcon
 import os
 import json
+import time
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 
 from ui.image_viewer import ImageViewer
+from ui.thumbnail_grid import ThumbnailGridView
+from ui.image_list import ImageListView
 from ui.category_manager import CategoryManager
 from ui.styles import get_main_style
+from ui.refresh_scheduler import RefreshScheduler
 from utils.file_utils import (get_image_files, load_annotations, save_annotations,
                               get_annotation_stats, get_relative_path, get_absolute_path,
-                              validate_image_paths, migrate_annotations_to_new_folder)
+                              validate_image_paths, migrate_annotations_to_new_folder,
+                              apply_category_to_images, labeled_flags, image_categories,
+                              new_annotations_data, default_annotations_data,
+                              rename_category_in_annotations, merge_categories_in_annotations,
+                              delete_categories_from_annotations, sync_category_indices, insert_new_annotations)
 from utils.dataset_exporter import DatasetExporter
+from utils.annotation_stream import iter_annotation_file, should_stream, StreamFormatError
+from utils.image_source import image_exists, prefetch_images, REMOTE_PREFIX
+from utils.instrumentation import profiler, timed_span
+from utils.memory_budget import memory_budget
+from utils.decode_service import shutdown_decode_service
+from utils.image_list_index import ImageListIndex
 from config import Config
 
 
 class MainWindow(QMainWindow):
     """主窗口"""
 
+    # 后台相似度排序的进度与结果（从工作线程发出）
+    similarity_progress = pyqtSignal(int, int)
+    similarity_order_ready = pyqtSignal(int, object)
+    # 后台完整性检查的进度与结果: (已检查, 总数)、(问题图片, 总数)
+    integrity_progress = pyqtSignal(int, int)
+    integrity_ready = pyqtSignal(object, int)
+    # 后台读取的图片信息: (批次, {图片路径: ImageMetadata})
+    metadata_ready = pyqtSignal(int, object)
+
+    # 后台加载项目的状态与结果（从工作线程发出）
+    background_status = pyqtSignal(str)
+    project_data_loaded = pyqtSignal(object)
+    project_ready = pyqtSignal()
+    # 流式加载大标注文件的各阶段: (类型, 内容, 进度)
+    annotations_streamed = pyqtSignal(str, object, float)
+
     def __init__(self):
         super().__init__()
         self.image_files = []
+        self.image_rel_paths = []  # 与image_files一一对应的标注键
         self.current_image_index = -1
-        self.annotations_data = load_annotations(Config.ANNOTATIONS_FILE)
+        # 标注文件在窗口显示后于后台加载，加载完成前使用默认空数据且不写回磁盘
+        # （普通字典即可，不必为占位数据创建列式存储而在启动时导入numpy）
+        self.annotations_data = default_annotations_data()
+        self.project_loaded = False
+        # 流式加载期间（或加载出错后）标注数据不完整，不写回磁盘
+        self.annotations_streaming = False
+        self.stream_cancelled = False
+        self.stream_positions = (None, {})  # (image_rel_paths, 相对路径 -> 列表位置)
         self.current_folder = ""
+        self.session_recorder = None
+
+        # 多人标注：变更日志（共享项目）或协调服务器客户端，记录本机的标注操作
+        self.change_log = None
+        self.change_merger = None
+        self.coordination = None
+        if Config.COORDINATION_URL:
+            from utils.coordination import CoordinationClient
+            self.coordination = CoordinationClient(Config.COORDINATION_URL)
+        elif Config.SHARED_PROJECT:
+            from utils.change_log import ChangeLog, ChangeMerger
+            self.change_log = ChangeLog(Config.CHANGE_LOG_DIR)
+            self.change_merger = ChangeMerger(Config.CHANGE_LOG_DIR)
         self.auto_save_timer = QTimer()
         self.auto_save_timer.timeout.connect(self.auto_save)
         self.auto_save_timer.start(30000)  # 每30秒自动保存
 
+        # 相似度排序在后台单线程中进行
+        self.feature_cache = None
+        self.background_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="background")
+        self.similarity_generation = 0
+        self.similarity_progress.connect(self.on_similarity_progress)
+        self.similarity_order_ready.connect(self.on_similarity_order_ready)
+        # 完整性检查发现的问题图片 {图片路径: 问题描述}，导出时可以跳过
+        self.bad_images = {}
+        self.bad_images_dialog = None
+        self.integrity_running = False
+        self.integrity_progress.connect(self.on_integrity_progress)
+        self.integrity_ready.connect(self.on_integrity_ready)
+        # 打开文件夹后在后台只读文件头，得到尺寸、格式和EXIF方向
+        self.metadata_index = None
+        self.image_metadata = {}
+        self.metadata_summary_text = ""
+        self.metadata_generation = 0
+        self.metadata_ready.connect(self.on_metadata_ready)
+        self.background_status.connect(self.on_background_status)
+        self.project_data_loaded.connect(self.on_project_data_loaded)
+        self.annotations_streamed.connect(self.on_annotations_streamed)
+
         self.init_ui()
         self.setup_shortcuts()
+        # 启动时焦点放在图像列表上，否则会落到筛选下拉框，方向键和字母键先被它处理
+        self.image_list.setFocus()
+
+        # 标注、切换图片时只标记需要刷新的面板，由调度器合并后刷新；统计信息刷新得更少
+        self.pending_markers = set()  # 待刷新列表标记的图片，None 表示整个列表
+        self.list_index = ImageListIndex()  # 列表筛选用的类别位置和文件名搜索索引
+        self.refresh = RefreshScheduler(self, Config.UI_FRAME_MS)
+        self.refresh.register("list_markers", self.flush_list_markers)
+        self.refresh.register("progress", self.update_progress, Config.PROGRESS_REFRESH_MS)
+        self.refresh.register("statistics", self.update_statistics, Config.STATISTICS_REFRESH_MS)
         self.update_ui_state()
 
-        # 如果有保存的图片根路径，尝试验证
-        if self.annotations_data.get("image_root"):
-            self.validate_saved_annotations()
+        # 窗口显示后再加载标注、验证图片和扫描文件夹
+        QTimer.singleShot(0, self.start_project_loading)
+
+    def annotations_path(self):
+        """标注文件（或分片项目目录）路径"""
+        return Config.SHARDED_PROJECT_DIR if Config.SHARDED_ANNOTATIONS else Config.ANNOTATIONS_FILE
+
+    def empty_annotations_data(self):
+        """按配置创建空的标注数据"""
+        return new_annotations_data(compact=Config.COMPACT_ANNOTATIONS,
+                                    sharded_dir=Config.SHARDED_PROJECT_DIR if Config.SHARDED_ANNOTATIONS else None)
+
+    def folder_in_project(self, folder):
+        """文件夹是否位于当前标注数据的图片根目录之内（含根目录本身）"""
+        image_root = self.annotations_data.get("image_root", "")
+        if not image_root:
+            return False
+        try:
+            root = os.path.abspath(image_root)
+            return os.path.commonpath([os.path.abspath(folder), root]) == root
+        except ValueError:
+            return False
+
+    def start_project_loading(self):
+        """在后台加载标注文件并验证图片路径"""
+        self.status_label.setText("正在加载标注数据...")
+
+        stream = not Config.SHARDED_ANNOTATIONS and should_stream(self.annotations_path())
+
+        def task():
+            if stream:
+                try:
+                    self.stream_project_data()
+                    return
+                except StreamFormatError as e:
+                    print(f"无法流式加载，改为整体读取: {e}")
+
+            result = {}
+            try:
+                data = load_annotations(self.annotations_path(), compact=Config.COMPACT_ANNOTATIONS,
+                                        sharded=Config.SHARDED_ANNOTATIONS)
+                result["data"] = data
+
+                # 如果有保存的图片根路径，验证图片并预先扫描文件夹
+                image_root = data.get("image_root", "")
+                if image_root and image_exists(image_root) and Config.SHARDED_ANNOTATIONS:
+                    # 分片项目不逐条验证（需要加载全部分片），只扫描上次打开的目录
+                    folder = data.get("current_folder") or image_root
+                    if not image_exists(folder):
+                        folder = image_root
+                    self.background_status.emit("正在扫描图片文件夹...")
+                    result["validation"] = ([], [])
+                    result["folder"] = folder
+                    result["image_files"] = get_image_files(folder)
+                elif image_root and image_exists(image_root):
+                    self.background_status.emit(f"正在验证 {len(data.get('annotations', {}))} 条标注...")
+                    valid_images, missing_images = validate_image_paths(data)
+                    result["validation"] = (valid_images, missing_images)
+                    if not missing_images:
+                        self.background_status.emit("正在扫描图片文件夹...")
+                        result["image_files"] = get_image_files(image_root)
+            except Exception as e:
+                print(f"加载项目失败: {e}")
+                result["error"] = str(e)
+            self.project_data_loaded.emit(result)
+
+        self.background_executor.submit(task)
+
+    def stream_project_data(self):
+        """（后台线程）流式解析标注文件，分块发给界面线程并入标注数据
+
+        先发出类别等顶层字段，界面随即可用；扫描图片文件夹后发出图片列表；之后每块标注在本线程
+        编码为列式存储再发出，界面线程只做整块合并。缺失图片按扫描结果统计，加载完成后再提示。
+        """
+        image_root = None
+        known = None
+        total = missing = 0
+        try:
+            for kind, payload, progress in iter_annotation_file(self.annotations_path()):
+                if self.stream_cancelled:
+                    return
+                if kind == "header":
+                    self.annotations_streamed.emit("header", payload, progress)
+                    image_root = payload.get("image_root", "")
+                    if image_root and image_exists(image_root):
+                        self.background_status.emit("正在扫描图片文件夹...")
+                        image_files = get_image_files(image_root)
+                        known = {get_relative_path(p, image_root) for p in image_files}
+                        self.annotations_streamed.emit("images", image_files, progress)
+                elif kind == "annotations":
+                    rel_paths = [rel_path for rel_path, _ in payload]
+                    total += len(rel_paths)
+                    if known is not None:
+                        missing += sum(1 for rel_path in rel_paths if rel_path not in known)
+                    if Config.COMPACT_ANNOTATIONS:
+                        from utils.annotation_store import ColumnarAnnotations  # 延迟导入numpy，加快启动
+                        payload = ColumnarAnnotations.from_dict(dict(payload))
+                    self.annotations_streamed.emit("annotations", (payload, rel_paths), progress)
+                else:
+                    self.annotations_streamed.emit("trailer", (payload, total, missing if known else 0), progress)
+        except StreamFormatError:
+            raise
+        except Exception as e:
+            print(f"流式加载标注文件失败: {e}")
+            self.annotations_streamed.emit("error", str(e), 0.0)
+
+    def on_annotations_streamed(self, kind, payload, progress):
+        """流式加载的各阶段（界面线程）"""
+        if kind == "header":
+            data = self.empty_annotations_data()
+            data.update({key: value for key, value in payload.items() if key != "annotations"})
+            self.annotations_data = data
+            self.category_manager.set_categories(data.get('categories', []))
+            self.category_manager.set_editing_enabled(False)
+            self.annotations_streaming = True
+            self.project_loaded = True
+        elif kind == "images":
+            image_root = self.annotations_data.get("image_root", "")
+            self.current_folder = image_root
+            self.load_images_from_folder(image_root, payload)
+        elif kind == "annotations":
+            chunk, rel_paths = payload
+            insert_new_annotations(self.annotations_data['annotations'], chunk)
+            self.refresh_streamed_images(rel_paths)
+        elif kind == "trailer":
+            fields, total, missing = payload
+            self.annotations_data.update(fields)
+            self.finish_streaming()
+            if missing:
+                self.confirm_missing_images(missing, total)
+            self.project_ready.emit()
+            return
+        else:
+            self.status_label.setText(f"加载标注文件出错，已停止保存以免覆盖原文件: {payload}")
+            QMessageBox.critical(self, "错误", f"加载标注文件失败: {payload}\n\n"
+                                             f"已加载的部分可以浏览，但不会写回标注文件。")
+            return
+        self.status_label.setText(f"正在加载标注数据... {progress:.0%}（可浏览和标注已加载的图片）")
+
+    def refresh_streamed_images(self, rel_paths):
+        """刷新新并入标注的图片的列表标记和进度"""
+        if not self.image_rel_paths:
+            return
+        rel_path_list, positions = self.stream_positions
+        if rel_path_list is not self.image_rel_paths:
+            positions = {rel_path: i for i, rel_path in enumerate(self.image_rel_paths)}
+            self.stream_positions = (self.image_rel_paths, positions)
+        indices = [positions[rel_path] for rel_path in rel_paths if rel_path in positions]
+        self.mark_list_markers(indices)
+        self.refresh.mark("progress")
+        if self.current_image_index in indices:
+            self.update_current_annotation_display()
+
+    def finish_streaming(self):
+        """流式加载完成：恢复类别编辑和保存，刷新统计"""
+        self.annotations_streaming = False
+        self.stream_positions = (None, {})
+        self.category_manager.set_editing_enabled(True)
+        stats, _ = get_annotation_stats(self.annotations_data.get('annotations', {}))
+        self.category_manager.set_usage_counts(stats)
+        if self.image_files:
+            self.update_progress()
+            self.update_statistics()
+            self.update_current_annotation_display()
+        self.status_label.setText(f"已加载 {len(self.annotations_data.get('annotations', {}))} 条标注")
+
+    def ensure_annotations_complete(self):
+        """标注数据仍在流式加载时提示用户稍候（需要完整标注数据的操作）"""
+        if not self.ensure_project_loaded():
+            return False
+        if self.annotations_streaming:
+            QMessageBox.information(self, "信息", "标注数据仍在加载，请稍候再进行此操作。")
+            return False
+        return True
+
+    def on_background_status(self, text):
+        """后台任务状态"""
+        self.status_label.setText(text)
+
+    def on_project_data_loaded(self, result):
+        """后台加载完成，在界面线程中应用结果"""
+        # 加载失败时换成按配置创建的空数据
+        self.annotations_data = result["data"] if "data" in result else self.empty_annotations_data()
+        self.category_manager.set_categories(self.annotations_data.get('categories', []))
+        stats, _ = get_annotation_stats(self.annotations_data.get('annotations', {}))
+        self.category_manager.set_usage_counts(stats)
+        self.project_loaded = True
+        self.status_label.setText("就绪")
+
+        if "validation" in result:
+            valid_images, missing_images = result["validation"]
+            self.handle_validation_result(valid_images, missing_images, result.get("image_files"),
+                                          result.get("folder"))
+
+        self.project_ready.emit()
+
+    def ensure_project_loaded(self):
+        """后台加载未完成时提示用户稍候"""
+        if not self.project_loaded:
+            QMessageBox.information(self, "信息", "正在加载标注数据，请稍候...")
+        return self.project_loaded
 
     def validate_saved_annotations(self):
         """验证保存的标注数据"""
         image_root = self.annotations_data.get("image_root", "")
-        if not image_root or not os.path.exists(image_root):
+        if not image_root or not image_exists(image_root):
             return
 
         valid_images, missing_images = validate_image_paths(self.annotations_data)
+        self.handle_validation_result(valid_images, missing_images)
+
+    def handle_validation_result(self, valid_images, missing_images, image_files=None, folder=None):
+        """根据验证结果提示用户或直接加载图片"""
+        image_root = self.annotations_data.get("image_root", "")
 
         if missing_images:
-            missing_count = len(missing_images)
-            total_count = len(valid_images) + missing_count
+            self.confirm_missing_images(len(missing_images), len(valid_images) + len(missing_images))
+        else:
+            # 所有图片都存在，自动加载
+            self.load_images_from_folder(folder or image_root, image_files)
 
-            msg = f"发现 {missing_count}/{total_count} 张图片文件缺失。\n\n"
-            msg += f"上次使用的图片根目录: {image_root}\n\n"
-            msg += "选择操作:\n"
-            msg += "• 是: 重新选择图片文件夹\n"
-            msg += "• 否: 继续使用当前标注数据（缺失的图片将被忽略）\n"
-            msg += "• 取消: 清空标注数据重新开始"
+    def confirm_missing_images(self, missing_count, total_count):
+        """提示有图片缺失，按用户选择重新定位文件夹、继续使用或清空标注"""
+        image_root = self.annotations_data.get("image_root", "")
+        msg = f"发现 {missing_count}/{total_count} 张图片文件缺失。\n\n"
+        msg += f"上次使用的图片根目录: {image_root}\n\n"
+        msg += "选择操作:\n"
+        msg += "• 是: 重新选择图片文件夹\n"
+        msg += "• 否: 继续使用当前标注数据（缺失的图片将被忽略）\n"
+        msg += "• 取消: 清空标注数据重新开始"
 
-            reply = QMessageBox.question(
-                self, "图片文件验证", msg,
-                QMessageBox.StandardButton.Yes |
-                QMessageBox.StandardButton.No |
-                QMessageBox.StandardButton.Cancel
-            )
+        reply = QMessageBox.question(
+            self, "图片文件验证", msg,
+            QMessageBox.StandardButton.Yes |
+            QMessageBox.StandardButton.No |
+            QMessageBox.StandardButton.Cancel
+        )
 
-            if reply == QMessageBox.StandardButton.Yes:
-                self.relocate_image_folder()
-            elif reply == QMessageBox.StandardButton.Cancel:
-                self.annotations_data = load_annotations("")  # 加载默认空数据
-        else:
-            # 所有图片都存在，自动加载
-            self.load_images_from_folder(image_root)
+        if reply == QMessageBox.StandardButton.Yes:
+            self.relocate_image_folder()
+        elif reply == QMessageBox.StandardButton.Cancel:
+            self.annotations_data = self.empty_annotations_data()  # 加载默认空数据
 
     def relocate_image_folder(self):
         """重新定位图片文件夹"""
+        if not self.ensure_annotations_complete():
+            return
+
         new_folder = QFileDialog.getExistingDirectory(self, "选择新的图片文件夹位置")
         if new_folder:
             old_root = self.annotations_data.get("image_root", "")
@@ -147,6 +440,16 @@ class MainWindow(QMainWindow):
         open_action.triggered.connect(self.open_folder)
         toolbar.addAction(open_action)
 
+        open_archive_action = QAction("🗜️ 打开压缩包", self)
+        open_archive_action.setToolTip("直接浏览ZIP/TAR压缩包中的图片，无需解压")
+        open_archive_action.triggered.connect(self.open_archive)
+        toolbar.addAction(open_archive_action)
+
+        open_remote_action = QAction("☁️ 打开远程存储", self)
+        open_remote_action.setToolTip("浏览S3兼容对象存储中的图片（s3://桶/前缀）")
+        open_remote_action.triggered.connect(self.open_remote)
+        toolbar.addAction(open_remote_action)
+
         # 重新定位文件夹
         relocate_action = QAction("📂 重新定位文件夹", self)
         relocate_action.triggered.connect(self.relocate_image_folder)
@@ -203,6 +506,26 @@ class MainWindow(QMainWindow):
         reset_action.triggered.connect(self.image_viewer.reset_zoom)
         toolbar.addAction(reset_action)
 
+        # 网格视图切换
+        self.grid_action = QAction("🔲 网格视图", self)
+        self.grid_action.setCheckable(True)
+        self.grid_action.setShortcut(QKeySequence("Ctrl+G"))
+        self.grid_action.toggled.connect(self.set_grid_mode)
+        toolbar.addAction(self.grid_action)
+
+        # 相似度排序
+        self.similarity_action = QAction("🧩 相似排序", self)
+        self.similarity_action.setCheckable(True)
+        self.similarity_action.setToolTip("按图像相似度排列标注顺序，相似图片相邻出现")
+        self.similarity_action.toggled.connect(self.set_similarity_order)
+        toolbar.addAction(self.similarity_action)
+
+        # 图片完整性检查
+        integrity_action = QAction("🩺 检查图片", self)
+        integrity_action.setToolTip("在后台检查图片是否损坏、截断或无法解码")
+        integrity_action.triggered.connect(self.start_integrity_scan)
+        toolbar.addAction(integrity_action)
+
         toolbar.addSeparator()
 
         # 保存和导出
@@ -215,6 +538,13 @@ class MainWindow(QMainWindow):
         export_action.triggered.connect(self.export_dataset)
         toolbar.addAction(export_action)
 
+        if self.coordination:
+            toolbar.addSeparator()
+            claim_action = QAction("📥 领取批次", self)
+            claim_action.setToolTip(f"从协调服务器领取 {Config.COORDINATION_BATCH_SIZE} 张未标注图片")
+            claim_action.triggered.connect(self.claim_batch)
+            toolbar.addAction(claim_action)
+
     def create_left_panel(self):
         """创建左侧面板"""
         left_widget = QWidget()
@@ -241,16 +571,62 @@ class MainWindow(QMainWindow):
         quick_nav_layout.addWidget(self.goto_next_btn)
         image_layout.addLayout(quick_nav_layout)
 
-        self.image_list = QListWidget()
-        self.image_list.currentRowChanged.connect(self.on_image_selected)
+        # 筛选：按标注状态或类别，再按文件名搜索；上一张/下一张只在筛选结果中移动
+        filter_layout = QHBoxLayout()
+        self.list_filter_combo = QComboBox()
+        self.list_filter_combo.addItems(["全部", "未标注", "已标注"])
+        self.list_filter_combo.setToolTip("只显示未标注、已标注或某个类别的图片")
+        self.list_filter_combo.currentIndexChanged.connect(lambda _: self.apply_list_filter())
+        self.list_search_input = QLineEdit()
+        self.list_search_input.setPlaceholderText("搜索文件名...")
+        self.list_search_input.setClearButtonEnabled(True)
+        self.list_search_input.textChanged.connect(lambda _: self.apply_list_filter())
+        filter_layout.addWidget(self.list_filter_combo)
+        filter_layout.addWidget(self.list_search_input)
+        image_layout.addLayout(filter_layout)
+
+        self.image_list = ImageListView(self.list_item_text_at, lambda i: self.image_files[i])
+        self.image_list.current_image_changed.connect(self.on_image_selected)
         image_layout.addWidget(self.image_list)
 
+        self.list_count_label = QLabel("")
+        self.list_count_label.setStyleSheet("color: #666;")
+        image_layout.addWidget(self.list_count_label)
+
+        # 多选与批量标注
+        selection_layout = QHBoxLayout()
+
+        select_all_btn = QPushButton("全选")
+        select_all_btn.setToolTip("选择全部图片 (Ctrl+A)")
+        select_all_btn.clicked.connect(self.select_all_images)
+
+        invert_btn = QPushButton("反选")
+        invert_btn.setToolTip("反转当前选择 (Ctrl+I)")
+        invert_btn.clicked.connect(self.invert_image_selection)
+
+        filter_btn = QPushButton("条件选择")
+        filter_btn.setToolTip("按标注状态、类别或文件名选择图片")
+        filter_btn.clicked.connect(self.select_images_by_filter)
+
+        self.bulk_label_btn = QPushButton("批量标注")
+        self.bulk_label_btn.setToolTip("为选中的所有图片设置同一类别 (Ctrl+B)")
+        self.bulk_label_btn.clicked.connect(self.label_selected_images)
+
+        selection_layout.addWidget(select_all_btn)
+        selection_layout.addWidget(invert_btn)
+        selection_layout.addWidget(filter_btn)
+        selection_layout.addWidget(self.bulk_label_btn)
+        image_layout.addLayout(selection_layout)
+
         image_group.setLayout(image_layout)
         left_layout.addWidget(image_group)
 
         # 类别管理器
         self.category_manager = CategoryManager()
         self.category_manager.category_selected.connect(self.on_category_selected)
+        self.category_manager.category_renamed.connect(self.on_category_renamed)
+        self.category_manager.category_merged.connect(self.on_category_merged)
+        self.category_manager.categories_deleted.connect(self.on_categories_deleted)
 
         # 加载保存的类别
         if 'categories' in self.annotations_data:
@@ -271,9 +647,21 @@ class MainWindow(QMainWindow):
         self.image_info_label.setStyleSheet("font-size: 16px; font-weight: bold; color: #666;")
         middle_layout.addWidget(self.image_info_label)
 
+        # 单张查看与缩略图网格共用中间区域
+        self.view_stack = QStackedWidget()
+
         # 使用新的图像查看器
         self.image_viewer = ImageViewer()
-        middle_layout.addWidget(self.image_viewer)
+        self.image_viewer.image_display.image_loaded.connect(self.on_image_loaded)
+        self.view_stack.addWidget(self.image_viewer)
+
+        # 缩略图网格
+        self.thumbnail_grid = ThumbnailGridView()
+        self.thumbnail_grid.image_selected.connect(self.on_image_selected)
+        self.thumbnail_grid.image_activated.connect(self.on_grid_image_activated)
+        self.view_stack.addWidget(self.thumbnail_grid)
+
+        middle_layout.addWidget(self.view_stack)
 
         # 导航按钮
         nav_layout = QHBoxLayout()
@@ -382,11 +770,35 @@ class MainWindow(QMainWindow):
         self.root_path_label = QLabel("")
         self.status_bar.addWidget(self.root_path_label)
 
+        # 性能监测（开启后显示按键到重绘完成的延迟）
+        self.perf_label = QLabel("")
+        self.perf_label.setVisible(False)
+        self.status_bar.addWidget(self.perf_label)
+        self.perf_timer = QTimer(self)
+        self.perf_timer.timeout.connect(self.update_perf_overlay)
+
+        # 图片缓存内存占用（定时检查系统内存压力）
+        self.memory_label = QLabel("")
+        self.status_bar.addPermanentWidget(self.memory_label)
+        self.memory_timer = QTimer(self)
+        self.memory_timer.timeout.connect(self.update_memory_status)
+        self.memory_timer.start(Config.MEMORY_CHECK_MS)
+
         # 快捷键提示
         shortcut_label = QLabel(
             "快捷键: A/D(导航) | Ctrl+U(首个未标注) | Shift+U(下个未标注) | 1-9,0(选择类别) | Ctrl+S(保存)")
         self.status_bar.addPermanentWidget(shortcut_label)
 
+    def update_memory_status(self):
+        """系统内存不足时淘汰缓存，并显示各缓存的内存占用"""
+        freed = memory_budget.check_pressure()
+        if freed:
+            self.status_label.setText(f"系统内存不足，已释放 {freed / 1024 / 1024:.0f} MB 图片缓存")
+        mb = 1024 * 1024
+        self.memory_label.setText(f"缓存: {memory_budget.total() / mb:.0f} / {memory_budget.limit / mb:.0f} MB")
+        self.memory_label.setToolTip("\n".join(
+            f"{name}: {nbytes / mb:.1f} MB" for name, nbytes in memory_budget.usage().items()))
+
     def update_root_path_display(self):
         """更新根路径显示"""
         image_root = self.annotations_data.get("image_root", "")
@@ -398,180 +810,273 @@ class MainWindow(QMainWindow):
     def setup_shortcuts(self):
         """设置快捷键"""
         # 导航快捷键
-        QShortcut(Qt.Key.Key_A, self, self.previous_image)
-        QShortcut(Qt.Key.Key_D, self, self.next_image)
-        QShortcut(Qt.Key.Key_Left, self, self.previous_image)
-        QShortcut(Qt.Key.Key_Right, self, self.next_image)
+        QShortcut(Qt.Key.Key_A, self, self.track_latency(self.previous_image))
+        QShortcut(Qt.Key.Key_D, self, self.track_latency(self.next_image))
+        QShortcut(Qt.Key.Key_Left, self, self.track_latency(self.previous_image))
+        QShortcut(Qt.Key.Key_Right, self, self.track_latency(self.next_image))
 
         # 快速定位快捷键
         QShortcut(QKeySequence("Ctrl+U"), self, self.goto_first_unlabeled_image)
         QShortcut(QKeySequence("Shift+U"), self, self.goto_next_unlabeled_image)
         QShortcut(QKeySequence("Shift+Ctrl+U"), self, self.goto_prev_unlabeled_image)
 
-        # 类别选择快捷键
-        for key, index in Config.SHORTCUTS.items():
+        # 多选与批量标注快捷键
+        QShortcut(QKeySequence("Ctrl+A"), self, self.select_all_images)
+        QShortcut(QKeySequence("Ctrl+I"), self, self.invert_image_selection)
+        QShortcut(QKeySequence("Ctrl+B"), self, self.label_selected_images)
+
+        # 性能监测
+        QShortcut(QKeySequence("Ctrl+Shift+P"), self, self.toggle_profiling)
+        QShortcut(QKeySequence("Ctrl+Shift+E"), self, self.export_performance_trace)
+
+        # 会话录制
+        QShortcut(QKeySequence("Ctrl+Shift+R"), self, self.toggle_session_recording)
+
+        # 类别选择快捷键（类别较多时对应最近/常用类别）
+        for key, slot in Config.SHORTCUTS.items():
             if key.isdigit():
                 qt_key = getattr(Qt.Key, f'Key_{key}')
-                QShortcut(qt_key, self, lambda idx=index: self.select_category_by_index(idx))
+                QShortcut(qt_key, self, self.track_latency(lambda s=slot: self.select_category_by_shortcut(s)))
+        QShortcut(QKeySequence("Ctrl+F"), self, self.category_manager.picker.focus_search)
+
+    def track_latency(self, handler):
+        """包装快捷键处理函数，统计开启时记录按键到界面重绘完成的延迟"""
+        def wrapper():
+            if not profiler.enabled:
+                handler()
+                return
+            start = time.perf_counter()
+            with profiler.span("key_handler"):
+                handler()
+            # 零延时定时器在已投递的重绘事件处理完之后才触发
+            QTimer.singleShot(0, lambda: profiler.record(
+                "key_to_paint", (time.perf_counter() - start) * 1000, start=start))
+        return wrapper
+
+    def toggle_profiling(self):
+        """开启/关闭性能监测和状态栏延迟显示"""
+        enabled = not profiler.enabled
+        profiler.enable(enabled, tracemalloc_frames=Config.PROFILE_TRACEMALLOC_FRAMES if enabled else 0)
+        self.perf_label.setVisible(enabled)
+        if enabled:
+            profiler.reset()
+            self.perf_timer.start(500)
+            self.status_label.setText("性能监测已开启 (Ctrl+Shift+P 关闭，Ctrl+Shift+E 导出跟踪)")
+        else:
+            self.perf_timer.stop()
+            self.status_label.setText("性能监测已关闭")
+
+    def update_perf_overlay(self):
+        """刷新状态栏中的延迟显示"""
+        stats = profiler.stats().get("key_to_paint")
+        if not stats:
+            self.perf_label.setText("延迟: 暂无数据")
+            return
+        last = profiler.last("key_to_paint") or 0.0
+        self.perf_label.setText(
+            f"延迟 最近 {last:.1f}ms | p50 {stats['p50']:.1f} | p95 {stats['p95']:.1f} | "
+            f"p99 {stats['p99']:.1f} ms (n={stats['count']})"
+        )
+
+    def toggle_session_recording(self):
+        """开始/停止录制输入事件，用于离线重放"""
+        from ui.session_recorder import SessionRecorder
+
+        if self.session_recorder is None:
+            self.session_recorder = SessionRecorder(self)
+        if self.session_recorder.recording:
+            file_path = self.session_recorder.stop()
+            self.status_label.setText(f"会话已保存: {file_path}")
+        else:
+            self.session_recorder.start()
+            self.status_label.setText("正在录制会话... (Ctrl+Shift+R 停止)")
+
+    def export_performance_trace(self):
+        """导出 Chrome trace-event 格式的性能跟踪"""
+        if not profiler.enabled:
+            QMessageBox.information(self, "信息", "请先开启性能监测 (Ctrl+Shift+P)。")
+            return
+        file_path, _ = QFileDialog.getSaveFileName(self, "导出性能跟踪", "trace.json", "JSON (*.json)")
+        if file_path:
+            count = profiler.export_chrome_trace(file_path)
+            self.status_label.setText(f"已导出 {count} 个跟踪事件到 {file_path}")
 
     def get_unlabeled_images(self):
         """获取未标注的图片索引列表"""
         if not self.image_files:
             return []
 
-        image_root = self.annotations_data.get("image_root", "")
         annotations = self.annotations_data.get('annotations', {})
-
-        unlabeled_indices = []
-        for i, image_path in enumerate(self.image_files):
-            rel_path = get_relative_path(image_path, image_root) if image_root else image_path
-            if rel_path not in annotations or not annotations[rel_path].get('category'):
-                unlabeled_indices.append(i)
-
-        return unlabeled_indices
-
-    def goto_first_unlabeled_image(self):
-        """跳转到第一张未标注的图片"""
-        unlabeled_indices = self.get_unlabeled_images()
-
-        if not unlabeled_indices:
-            QMessageBox.information(self, "信息", "所有图片都已标注完成！🎉")
+        flags = labeled_flags(annotations, self.image_rel_paths)
+        return [i for i, labeled in enumerate(flags) if not labeled]
+
+    def get_image_key(self, index):
+        """获取图片在标注数据中的键（相对路径）"""
+        return self.image_rel_paths[index]
+
+    def is_image_labeled(self, index):
+        """图片是否已标注"""
+        annotation = self.annotations_data.get('annotations', {}).get(self.image_rel_paths[index])
+        return bool(annotation and annotation.get('category'))
+
+    def find_unlabeled_image(self, step):
+        """当前列表（筛选结果）中当前图片之后（step=1）、之前（step=-1）或第一张（step=0）未标注的图片，
+        到一端时从另一端绕回；没有时为-1
+        """
+        if self.refresh.is_dirty("list_markers"):
+            self.refresh.flush("list_markers")  # 刚标注的图片先更新到索引中
+        return self.list_index.next_unlabeled(self.current_image_index, step,
+                                              within=self.image_list.list_model.rows)
+
+    def goto_unlabeled_image(self, step, description):
+        """跳转到当前列表中的未标注图片"""
+        target = self.find_unlabeled_image(step)
+
+        if target < 0:
+            if self.image_list.list_model.rows is None:
+                QMessageBox.information(self, "信息", "所有图片都已标注完成！🎉")
+            else:
+                QMessageBox.information(self, "信息", "当前列表中的图片都已标注完成！")
+            return
+        if step and target == self.current_image_index:
+            QMessageBox.information(self, "信息", "这是唯一一张未标注的图片！")
             return
 
-        first_unlabeled = unlabeled_indices[0]
-        self.current_image_index = first_unlabeled
+        self.current_image_index = target
         self.load_current_image()
         self.update_ui_state()
 
-        self.status_label.setText(f"已跳转到第一张未标注图片 ({first_unlabeled + 1}/{len(self.image_files)})")
+        self.status_label.setText(f"已跳转到{description}未标注图片 ({target + 1}/{len(self.image_files)})")
+
+    def goto_first_unlabeled_image(self):
+        """跳转到第一张未标注的图片"""
+        self.goto_unlabeled_image(0, "第一张")
 
     def goto_next_unlabeled_image(self):
-        """跳转到下一张未标注的图片"""
-        unlabeled_indices = self.get_unlabeled_images()
+        """跳转到下一张未标注的图片（到末尾后从头开始）"""
+        self.goto_unlabeled_image(1, "下一张")
 
-        if not unlabeled_indices:
-            QMessageBox.information(self, "信息", "所有图片都已标注完成！🎉")
-            return
+    def goto_prev_unlabeled_image(self):
+        """跳转到上一张未标注的图片（到开头后从末尾开始）"""
+        self.goto_unlabeled_image(-1, "上一张")
 
-        # 查找当前位置之后的未标注图片
-        next_unlabeled = None
-        for index in unlabeled_indices:
-            if index > self.current_image_index:
-                next_unlabeled = index
-                break
+    @timed_span("highlight_unlabeled_in_list")
+    def highlight_unlabeled_in_list(self):
+        """在图片列表中高亮显示未标注的图片"""
+        if not self.image_files:
+            return
 
-        # 如果没找到，从头开始
-        if next_unlabeled is None:
-            next_unlabeled = unlabeled_indices[0]
-            if next_unlabeled == self.current_image_index:
-                QMessageBox.information(self, "信息", "这是唯一一张未标注的图片！")
-                return
+        # 列表文字在绘制时按索引生成，这里只需更新索引并通知视图重绘可见行
+        self.list_index.set_categories(image_categories(self.annotations_data.get('annotations', {}),
+                                                        self.image_rel_paths))
+        self.image_list.list_model.refresh()
 
-        self.current_image_index = next_unlabeled
-        self.load_current_image()
-        self.update_ui_state()
+    def update_list_markers(self, indices):
+        """只刷新指定图片在列表中的标注标记"""
+        annotations = self.annotations_data.get('annotations', {})
+        self.list_index.set_categories(image_categories(annotations, [self.image_rel_paths[i] for i in indices]),
+                                       indices)
+        self.image_list.list_model.refresh(indices)
+
+    def list_item_text_at(self, index):
+        return self.list_item_text(index, self.list_index.is_labeled(index))
+
+    def list_item_text(self, index, labeled):
+        """列表项文字：标注标记、文件名，已读取图片信息时附上尺寸和格式"""
+        image_path = self.image_files[index]
+        text = f"{'✅' if labeled else '⚠️'} {os.path.basename(image_path)}"
+        metadata = self.image_metadata.get(image_path)
+        if metadata is not None:
+            from utils.image_metadata import oriented_size  # 有图片信息时索引模块已加载
+            width, height = oriented_size(metadata)
+            text += f"  ({width}×{height} {metadata.format})"
+        return text
 
-        self.status_label.setText(f"已跳转到下一张未标注图片 ({next_unlabeled + 1}/{len(self.image_files)})")
+    def open_folder(self):
+        """打开文件夹"""
+        if not self.ensure_annotations_complete():
+            return
 
-    def goto_prev_unlabeled_image(self):
-        """跳转到上一张未标注的图片"""
-        unlabeled_indices = self.get_unlabeled_images()
+        folder = QFileDialog.getExistingDirectory(self, "选择包含图像的文件夹")
+        if folder:
+            self.open_image_root(folder)
 
-        if not unlabeled_indices:
-            QMessageBox.information(self, "信息", "所有图片都已标注完成！🎉")
+    def open_archive(self):
+        """打开ZIP/TAR压缩包（不解压，图片按需从压缩包中读取）"""
+        if not self.ensure_annotations_complete():
             return
 
-        # 查找当前位置之前的未标注图片
-        prev_unlabeled = None
-        for index in reversed(unlabeled_indices):
-            if index < self.current_image_index:
-                prev_unlabeled = index
-                break
+        archive, _ = QFileDialog.getOpenFileName(self, "选择包含图像的压缩包", "",
+                                                 "压缩包 (*.zip *.tar)")
+        if archive:
+            self.open_image_root(archive)
 
-        # 如果没找到，从最后开始
-        if prev_unlabeled is None:
-            prev_unlabeled = unlabeled_indices[-1]
-            if prev_unlabeled == self.current_image_index:
-                QMessageBox.information(self, "信息", "这是唯一一张未标注的图片！")
-                return
+    def open_remote(self):
+        """打开S3兼容对象存储中的图片（按需下载并缓存到本地）"""
+        if not self.ensure_annotations_complete():
+            return
 
-        self.current_image_index = prev_unlabeled
-        self.load_current_image()
-        self.update_ui_state()
+        url, ok = QInputDialog.getText(self, "打开远程存储", "图片位置（s3://桶/前缀）:", text=REMOTE_PREFIX)
+        url = url.strip().rstrip("/")
+        if not ok or url == REMOTE_PREFIX.rstrip("/"):
+            return
+        if not url.startswith(REMOTE_PREFIX):
+            QMessageBox.warning(self, "警告", f"远程路径需以 {REMOTE_PREFIX} 开头")
+            return
+        self.open_image_root(url)
 
-        self.status_label.setText(f"已跳转到上一张未标注图片 ({prev_unlabeled + 1}/{len(self.image_files)})")
+    def open_image_root(self, folder):
+        """打开图片根目录（文件夹或压缩包），必要时询问是否迁移现有标注"""
+        self.current_folder = folder
 
-    def highlight_unlabeled_in_list(self):
-        """在图片列表中高亮显示未标注的图片"""
-        if not self.image_files:
-            return
+        # 检查是否需要迁移现有标注
+        if self.annotations_data.get("annotations"):
+            old_root = self.annotations_data.get("image_root", "")
+            sharded = hasattr(self.annotations_data["annotations"], "release")
+            if old_root and old_root != folder and not (sharded and self.folder_in_project(folder)):
+                reply = QMessageBox.question(
+                    self, "标注数据迁移",
+                    f"检测到现有标注数据。\n\n"
+                    f"旧根目录: {old_root}\n"
+                    f"新根目录: {folder}\n\n"
+                    f"是否要迁移标注数据到新目录？\n\n"
+                    f"是: 迁移现有标注数据\n"
+                    f"否: 清空标注数据重新开始",
+                    QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+                )
 
-        unlabeled_indices = set(self.get_unlabeled_images())
+                if reply == QMessageBox.StandardButton.No:
+                    self.annotations_data = self.empty_annotations_data()  # 加载默认空数据
 
-        for i in range(self.image_list.count()):
-            item = self.image_list.item(i)
-            if i in unlabeled_indices:
-                # 在文件名前添加标记
-                if not item.text().startswith("⚠️"):
-                    filename = os.path.basename(self.image_files[i])
-                    item.setText(f"⚠️ {filename}")
-            else:
-                # 移除警告标记
-                if item.text().startswith("⚠️"):
-                    filename = os.path.basename(self.image_files[i])
-                    item.setText(f"✅ {filename}")
-                elif not item.text().startswith("✅"):
-                    filename = os.path.basename(self.image_files[i])
-                    item.setText(f"✅ {filename}")
+        self.load_images_from_folder(folder)
 
-    def open_folder(self):
-        """打开文件夹"""
-        folder = QFileDialog.getExistingDirectory(self, "选择包含图像的文件夹")
-        if folder:
-            self.current_folder = folder
-
-            # 检查是否需要迁移现有标注
-            if self.annotations_data.get("annotations"):
-                old_root = self.annotations_data.get("image_root", "")
-                if old_root and old_root != folder:
-                    reply = QMessageBox.question(
-                        self, "标注数据迁移",
-                        f"检测到现有标注数据。\n\n"
-                        f"旧根目录: {old_root}\n"
-                        f"新根目录: {folder}\n\n"
-                        f"是否要迁移标注数据到新目录？\n\n"
-                        f"是: 迁移现有标注数据\n"
-                        f"否: 清空标注数据重新开始",
-                        QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-                    )
-
-                    if reply == QMessageBox.StandardButton.No:
-                        self.annotations_data = load_annotations("")  # 加载默认空数据
-
-            self.load_images_from_folder(folder)
-
-    def load_images_from_folder(self, folder):
-        """从文件夹加载图像"""
+    def load_images_from_folder(self, folder, image_files=None):
+        """从文件夹加载图像，image_files 为已扫描好的文件列表时跳过扫描"""
         self.status_label.setText("正在加载图像...")
 
-        self.image_files = get_image_files(folder)
+        self.image_files = image_files if image_files is not None else get_image_files(folder)
+        self.image_rel_paths = []
 
         if not self.image_files:
             QMessageBox.information(self, "信息", "所选文件夹中没有找到支持的图像文件。")
             self.status_label.setText("就绪")
             return
 
-        # 更新标注数据的根路径
-        self.annotations_data["image_root"] = folder
+        # 更新标注数据的根路径；分片项目打开根目录下的子目录时保持根路径，只加载涉及的分片
+        annotations = self.annotations_data.get("annotations")
+        sharded = hasattr(annotations, "release")
+        base = folder
+        if sharded and self.folder_in_project(folder):
+            base = self.annotations_data["image_root"]
+            self.annotations_data["current_folder"] = folder
+        else:
+            self.annotations_data["image_root"] = folder
+        self.image_rel_paths = [get_relative_path(image_path, base) for image_path in self.image_files]
+        if sharded:
+            annotations.release(annotations.shard_keys_for(self.image_rel_paths))
 
         # 更新图像列表
-        self.image_list.clear()
-        for image_path in self.image_files:
-            filename = os.path.basename(image_path)
-            self.image_list.addItem(filename)
-
-        # 高亮显示未标注的图片
-        self.highlight_unlabeled_in_list()
+        self.populate_image_list()
 
         self.current_image_index = 0
         self.load_current_image()
@@ -581,126 +1086,554 @@ class MainWindow(QMainWindow):
 
         self.status_label.setText(f"已加载 {len(self.image_files)} 张图像")
 
-    def load_current_image(self):
-        """加载当前图像"""
+        self.start_metadata_index()
+        if self.similarity_action.isChecked():
+            self.start_similarity_order()
+
+    def populate_image_list(self):
+        """按当前顺序重建图像列表和网格"""
+        # 文件名搜索索引在扫描（或重新排序）后建立一次
+        self.list_index.set_images([os.path.basename(image_path) for image_path in self.image_files])
+        self.pending_markers = set()
+        self.image_list.set_count(len(self.image_files))
+        self.thumbnail_grid.set_image_files(self.image_files)
+
+        # 高亮显示未标注的图片，并按当前条件重新筛选
+        self.highlight_unlabeled_in_list()
+        self.update_list_filter_options()
+        self.apply_list_filter()
+
+    def set_image_order(self, image_files):
+        """按新顺序排列当前图像，保持当前图像不变"""
+        current_path = None
         if 0 <= self.current_image_index < len(self.image_files):
-            image_path = self.image_files[self.current_image_index]
+            current_path = self.image_files[self.current_image_index]
 
-            # 高亮当前图像
-            self.image_list.setCurrentRow(self.current_image_index)
+        key_of = dict(zip(self.image_files, self.image_rel_paths))
+        self.image_files = list(image_files)
+        self.image_rel_paths = [key_of[image_path] for image_path in self.image_files]
+        self.populate_image_list()
 
-            # 加载图像
-            if self.image_viewer.load_image(image_path):
-                filename = os.path.basename(image_path)
-                self.current_image_label.setText(f"文件名: {filename}")
+        self.current_image_index = self.image_files.index(current_path) if current_path else 0
+        self.load_current_image()
+        self.update_ui_state()
 
-                # 显示相对路径
-                image_root = self.annotations_data.get("image_root", "")
-                if image_root:
-                    rel_path = get_relative_path(image_path, image_root)
-                    self.current_path_label.setText(f"相对路径: {rel_path}")
-                else:
-                    self.current_path_label.setText(f"绝对路径: {image_path}")
+    def set_similarity_order(self, enabled):
+        """切换相似度排序/文件名排序"""
+        if not self.image_files:
+            return
+        if enabled:
+            self.start_similarity_order()
+        else:
+            self.similarity_generation += 1  # 丢弃未完成的排序结果
+            self.set_image_order(sorted(self.image_files))
+            self.status_label.setText("已恢复按文件名排序")
+
+    def start_similarity_order(self):
+        """在后台计算特征并排序"""
+        self.similarity_generation += 1
+        generation = self.similarity_generation
+        image_files = list(self.image_files)
+
+        def task():
+            # 延迟导入numpy/PIL，加快启动
+            from utils.image_features import FeatureCache, order_images_by_similarity
+
+            try:
+                if self.feature_cache is None:
+                    self.feature_cache = FeatureCache()
+                ordered = order_images_by_similarity(image_files, self.feature_cache,
+                                                     progress_callback=self.similarity_progress.emit)
+            except Exception as e:
+                print(f"相似度排序失败: {e}")
+                ordered = None
+            self.similarity_order_ready.emit(generation, ordered)
+
+        self.status_label.setText("正在计算图像特征...")
+        self.background_executor.submit(task)
+
+    def on_similarity_progress(self, done, total):
+        """相似度排序进度"""
+        if self.similarity_action.isChecked():
+            self.status_label.setText(f"正在计算图像特征... {done}/{total}")
+
+    def on_similarity_order_ready(self, generation, ordered):
+        """相似度排序完成"""
+        if generation != self.similarity_generation or not self.similarity_action.isChecked():
+            return
+        if ordered is None or set(ordered) != set(self.image_files):
+            self.status_label.setText("相似度排序失败")
+            return
+        self.set_image_order(ordered)
+        self.status_label.setText(f"已按相似度排列 {len(ordered)} 张图像")
+
+    def start_metadata_index(self):
+        """在后台读取当前图片的文件头信息（打开新文件夹时丢弃未完成的结果）"""
+        self.metadata_generation += 1
+        generation = self.metadata_generation
+        self.image_metadata = {}
+        self.metadata_summary_text = ""
+        image_files = list(self.image_files)
+
+        def task():
+            from utils.image_metadata import MetadataIndex, index_metadata
+
+            def progress(done, total):
+                if done < total:
+                    self.background_status.emit(f"正在读取图片信息... {done}/{total}")
+
+            try:
+                if self.metadata_index is None:
+                    self.metadata_index = MetadataIndex()
+                metadata = index_metadata(
+                    image_files, self.metadata_index, progress_callback=progress,
+                    cancelled=lambda: generation != self.metadata_generation or self.stream_cancelled)
+            except Exception as e:
+                print(f"读取图片信息失败: {e}")
+                metadata = None
+            self.metadata_ready.emit(generation, metadata)
+
+        self.background_executor.submit(task)
+
+    def on_metadata_ready(self, generation, metadata):
+        """图片信息读取完成：更新列表、统计信息和当前图片的尺寸"""
+        if generation != self.metadata_generation or metadata is None:
+            return
+        self.image_metadata = metadata
+        self.metadata_summary_text = self.format_metadata_summary()
+        self.mark_list_markers(None)
+        self.refresh.mark("statistics")
+        self.status_label.setText(f"已读取 {len(metadata)} 张图像的尺寸和格式")
+        if (0 <= self.current_image_index < len(self.image_files)
+                and self.image_viewer.is_decoding()):
+            self.show_image_info(self.image_files[self.current_image_index], decoding=True)
+
+    def format_metadata_summary(self):
+        """统计信息面板中的分辨率分布与格式统计"""
+        from utils.image_metadata import summarize
+
+        summary = summarize(self.image_metadata.values())
+        if not summary["images"]:
+            return ""
+        text = "分辨率分布:\n"
+        width = max(summary["resolutions"].values())
+        for name, count in summary["resolutions"].items():
+            if count:
+                bar = "█" * max(1, round(count / width * 12))
+                text += f"  {name:>8}: {bar} {count} ({count / summary['images'] * 100:.1f}%)\n"
+        formats = sorted(summary["formats"].items(), key=lambda item: -item[1])
+        text += "格式: " + ", ".join(f"{name or '未知'} {count}" for name, count in formats) + "\n"
+        if summary["rotated"]:
+            text += f"带EXIF旋转: {summary['rotated']} 张\n"
+        text += (f"最大尺寸: {summary['max_width']}×{summary['max_height']}，"
+                 f"总大小: {summary['total_bytes'] / 1024 ** 2:.1f} MB\n")
+        return text
+
+    def start_integrity_scan(self):
+        """选择检查方式后在后台检查当前列表中的图片"""
+        if self.integrity_running:
+            self.show_bad_images()
+            return
+        if not self.image_files:
+            QMessageBox.warning(self, "警告", "请先打开图片文件夹！")
+            return
 
-                # 获取图像尺寸信息
-                width, height = self.image_viewer.get_image_size()
+        options = ["快速检查（文件头和结束标记）", "完整检查（解码全部像素，较慢）"]
+        choice, ok = QInputDialog.getItem(self, "检查图片", "检查方式:", options, 0, False)
+        if not ok:
+            return
 
-                # 更新图像信息
-                self.image_info_label.setText(
-                    f"图像 {self.current_image_index + 1} / {len(self.image_files)} | "
-                    f"尺寸: {width} x {height} 像素"
-                )
+        from utils.integrity import QUICK, FULL
+        level = QUICK if choice == options[0] else FULL
+        image_files = list(self.image_files)
+
+        def task():
+            from utils.integrity import scan_images
+
+            try:
+                bad = scan_images(image_files, level, progress_callback=self.integrity_progress.emit,
+                                  cancelled=lambda: self.stream_cancelled)
+            except Exception as e:
+                print(f"图片完整性检查失败: {e}")
+                bad = None
+            self.integrity_ready.emit(bad, len(image_files))
+
+        self.integrity_running = True
+        self.status_label.setText("正在检查图片...")
+        self.background_executor.submit(task)
+
+    def on_integrity_progress(self, done, total):
+        """完整性检查进度"""
+        self.status_label.setText(f"正在检查图片... {done}/{total}")
+
+    def on_integrity_ready(self, bad, total):
+        """完整性检查完成"""
+        self.integrity_running = False
+        if bad is None:
+            self.status_label.setText("图片完整性检查失败")
+            return
+        self.bad_images = bad
+        self.status_label.setText(f"检查完成：{total} 张图片中 {len(bad)} 张有问题")
+        if bad:
+            self.show_bad_images()
+        else:
+            QMessageBox.information(self, "检查图片", f"已检查 {total} 张图片，未发现问题。")
+
+    def show_bad_images(self):
+        """显示问题图片列表（非模态）"""
+        from ui.bad_images_dialog import BadImagesDialog
+
+        if self.bad_images_dialog is None:
+            self.bad_images_dialog = BadImagesDialog(self)
+            self.bad_images_dialog.image_activated.connect(self.goto_image_path)
+        self.bad_images_dialog.set_bad_images(self.bad_images, len(self.image_files))
+        self.bad_images_dialog.show()
+        self.bad_images_dialog.raise_()
+
+    def goto_image_path(self, image_path):
+        """跳转到指定图片（不在当前列表中时忽略）"""
+        try:
+            index = self.image_files.index(image_path)
+        except ValueError:
+            self.status_label.setText(f"图片不在当前列表中: {os.path.basename(image_path)}")
+            return
+        self.on_image_selected(index)
 
-                # 显示当前标注
-                self.update_current_annotation_display()
+    def corrupt_image_keys(self):
+        """完整性检查发现的损坏图片在标注数据中的键（缺失的图片由导出自行统计）"""
+        from utils.integrity import MISSING
 
-                # 更新进度
-                self.update_progress()
+        return {rel_path for image_path, rel_path in zip(self.image_files, self.image_rel_paths)
+                if self.bad_images.get(image_path, MISSING) != MISSING}
 
-    def update_current_annotation_display(self):
-        """更新当前标注显示"""
+    @timed_span("load_current_image")
+    def load_current_image(self):
+        """加载当前图像"""
         if 0 <= self.current_image_index < len(self.image_files):
             image_path = self.image_files[self.current_image_index]
-            image_root = self.annotations_data.get("image_root", "")
 
+            # 远程图片在后台预取后面几张
+            next_index = self.current_image_index + 1
+            prefetch_images(self.image_files[next_index:next_index + Config.S3_PREFETCH])
+
+            # 高亮当前图像（已是当前行时不改动，避免清掉多选）
+            if self.image_list.current_image() != self.current_image_index:
+                self.image_list.set_current_image(self.current_image_index, notify=False)
+            if self.view_stack.currentWidget() is self.thumbnail_grid:
+                self.thumbnail_grid.set_current_index(self.current_image_index)
+
+            # 加载图像（较大的PNG/TIFF在解码进程中解码，完成后 on_image_loaded 补上尺寸）
+            loaded = self.image_viewer.load_image(image_path)
+            if loaded is None:
+                self.show_image_info(image_path, decoding=True)
+            elif loaded:
+                self.show_image_info(image_path)
+
+    def show_image_info(self, image_path, decoding=False):
+        """显示当前图像的文件名、路径、尺寸和标注"""
+        filename = os.path.basename(image_path)
+        self.current_image_label.setText(f"文件名: {filename}")
+
+        # 显示相对路径
+        image_root = self.annotations_data.get("image_root", "")
+        if image_root:
+            rel_path = self.get_image_key(self.current_image_index)
+            self.current_path_label.setText(f"相对路径: {rel_path}")
+        else:
+            self.current_path_label.setText(f"绝对路径: {image_path}")
+
+        # 获取图像尺寸信息（解码完成前使用文件头中的尺寸）
+        width, height = self.image_viewer.get_image_size()
+        size_text = "正在解码..." if decoding else f"{width} x {height} 像素"
+        metadata = self.image_metadata.get(image_path)
+        if decoding and metadata is not None:
+            size_text = "{} x {} 像素（正在解码...）".format(*oriented_size(metadata))
+
+        # 更新图像信息
+        self.image_info_label.setText(
+            f"图像 {self.current_image_index + 1} / {len(self.image_files)} | "
+            f"尺寸: {size_text}"
+        )
+
+        # 显示当前标注
+        self.update_current_annotation_display()
+
+        # 更新进度
+        self.refresh.mark("progress")
+
+    def on_image_loaded(self, image_path, success):
+        """解码进程中的图片解码完成"""
+        if (success and 0 <= self.current_image_index < len(self.image_files)
+                and self.image_files[self.current_image_index] == image_path):
+            self.show_image_info(image_path)
+
+    def update_current_annotation_display(self):
+        """更新当前标注显示"""
+        if 0 <= self.current_image_index < len(self.image_files):
             # 获取相对路径作为键
-            rel_path = get_relative_path(image_path, image_root) if image_root else image_path
+            rel_path = self.get_image_key(self.current_image_index)
             annotation = self.annotations_data.get('annotations', {}).get(rel_path, {})
 
             category = annotation.get('category', '未标注')
-            self.current_category_label.setText(f"类别: {category}")
+            self.update_current_category_label(category)
 
-            # 根据标注状态设置样式
-            if category == '未标注':
-                self.current_category_label.setStyleSheet("font-weight: bold; color: #f44336;")
-            else:
-                self.current_category_label.setStyleSheet("font-weight: bold; color: #4CAF50;")
-
-            # 更新类别管理器选择
+            # 更新类别管理器中的选择显示（不触发重新标注）
             categories = self.category_manager.get_categories()
-            if category in categories:
-                index = categories.index(category)
-                self.category_manager.select_category(index)
-            else:
-                self.category_manager.selected_category = -1
-                self.category_manager.update_selected_label()
-                # 更新按钮样式
-                for button in self.category_manager.category_buttons:
-                    from ui.styles import get_category_button_style
-                    button.setStyleSheet(get_category_button_style(False))
+            self.category_manager.show_category(categories.index(category) if category in categories else -1)
+
+    def update_current_category_label(self, category):
+        """显示当前图片的类别，并根据标注状态设置样式"""
+        self.current_category_label.setText(f"类别: {category}")
+        if category == '未标注':
+            self.current_category_label.setStyleSheet("font-weight: bold; color: #f44336;")
+        else:
+            self.current_category_label.setStyleSheet("font-weight: bold; color: #4CAF50;")
 
+    def on_category_renamed(self, old_name, new_name):
+        """类别重命名：标注中只修改类别表"""
+        count = rename_category_in_annotations(self.annotations_data.setdefault('annotations', {}),
+                                               old_name, new_name)
+        self.record_category_change("rename", [old_name], new_name)
+        self.after_category_change(f"类别 '{old_name}' 已重命名为 '{new_name}'，涉及 {count} 张图片",
+                                   reindex=False)
+
+    def on_category_merged(self, source_name, target_name):
+        """类别合并：源类别的标注批量并入目标类别"""
+        count = merge_categories_in_annotations(self.annotations_data.setdefault('annotations', {}),
+                                                [source_name], target_name)
+        self.record_category_change("merge", [source_name], target_name)
+        self.after_category_change(f"已把 '{source_name}' 合并到 '{target_name}'，涉及 {count} 张图片")
+
+    def on_categories_deleted(self, names):
+        """类别删除或清空：这些类别的标注批量清除，界面只刷新一次"""
+        count = delete_categories_from_annotations(self.annotations_data.setdefault('annotations', {}), names)
+        self.record_category_change("delete", names)
+        target = f"类别 '{names[0]}'" if len(names) == 1 else f"全部 {len(names)} 个类别"
+        self.after_category_change(f"已删除{target}，{count} 张图片变为未标注")
+
+    def after_category_change(self, message, reindex=True):
+        """类别表变化后同步标注序号并刷新界面"""
+        categories = self.category_manager.get_categories()
+        self.annotations_data['categories'] = categories
+        if reindex:
+            sync_category_indices(self.annotations_data['annotations'], categories)
+
+        if self.image_files:
+            self.mark_list_markers()
+            self.refresh.mark("progress", "statistics")
+            if 0 <= self.current_image_index < len(self.image_files):
+                annotation = self.annotations_data['annotations'].get(self.get_image_key(self.current_image_index), {})
+                self.update_current_category_label(annotation.get('category', '未标注'))
+        self.status_label.setText(message)
+
+    @timed_span("on_category_selected")
     def on_category_selected(self, category_index, category_name):
         """类别选择事件"""
         if 0 <= self.current_image_index < len(self.image_files):
-            image_path = self.image_files[self.current_image_index]
-            image_root = self.annotations_data.get("image_root", "")
-
-            # 使用相对路径作为键
-            rel_path = get_relative_path(image_path, image_root) if image_root else image_path
-
-            # 更新标注数据
-            if 'annotations' not in self.annotations_data:
-                self.annotations_data['annotations'] = {}
-
-            self.annotations_data['annotations'][rel_path] = {
-                'category': category_name,
-                'category_index': category_index,
-                'timestamp': self.get_current_timestamp()
-            }
+            self.apply_category_to_indices([self.current_image_index], category_index, category_name)
 
             # 更新显示
             self.current_category_label.setText(f"类别: {category_name}")
             self.current_category_label.setStyleSheet("font-weight: bold; color: #4CAF50;")
 
-            # 更新图片列表中的标记
-            self.highlight_unlabeled_in_list()
+            self.status_label.setText(f"已标注: {category_name}")
 
-            # 更新统计
-            self.update_statistics()
-            self.update_progress()
+    def apply_category_to_indices(self, indices, category_index, category_name):
+        """批量写入标注，并只做一次界面刷新"""
+        if 'annotations' not in self.annotations_data:
+            self.annotations_data['annotations'] = {}
 
-            self.status_label.setText(f"已标注: {category_name}")
+        rel_paths = [self.image_rel_paths[i] for i in indices]
+        timestamp = self.get_current_timestamp()
+        count = apply_category_to_images(
+            self.annotations_data['annotations'], rel_paths, category_name, category_index, timestamp
+        )
+        self.record_changes(rel_paths, category_name, category_index, timestamp)
+
+        # 列表标记、进度和统计由调度器合并刷新，连续快速标注时不逐次重绘
+        self.mark_list_markers(None if count > len(self.image_files) // 2 else indices)
+        self.refresh.mark("progress", "statistics")
+        return count
+
+    def get_selection_view(self):
+        """当前用于多选的视图（列表或网格）"""
+        if self.view_stack.currentWidget() is self.thumbnail_grid:
+            return self.thumbnail_grid
+        return self.image_list
+
+    def get_selected_image_indices(self):
+        """获取选中的图片索引（升序）"""
+        view = self.get_selection_view()
+        if view is self.image_list:
+            return view.selected_image_indices()
+        return sorted(index.row() for index in view.selectionModel().selectedIndexes())
+
+    def set_image_selection(self, indices, command=QItemSelectionModel.SelectionFlag.ClearAndSelect):
+        """按连续区间一次性设置选择（列表筛选时只选择显示中的图片）"""
+        view = self.get_selection_view()
+        if view is self.image_list:
+            view.select_images(indices, command)
+            return
+        model = view.model()
+        selection = QItemSelection()
+        start = prev = None
+        for i in sorted(indices):
+            if start is None:
+                start = prev = i
+            elif i == prev + 1:
+                prev = i
+            else:
+                selection.select(model.index(start, 0), model.index(prev, 0))
+                start = prev = i
+        if start is not None:
+            selection.select(model.index(start, 0), model.index(prev, 0))
+        view.selectionModel().select(selection, command)
+
+    def select_all_images(self):
+        """全选"""
+        if self.image_files:
+            self.get_selection_view().selectAll()
+
+    def invert_image_selection(self):
+        """反选"""
+        if self.image_files:
+            indices = range(len(self.image_files))
+            if self.get_selection_view() is self.image_list:
+                indices = self.image_list.visible_image_indices()
+            self.set_image_selection(indices, QItemSelectionModel.SelectionFlag.Toggle)
+
+    def select_images_by_filter(self):
+        """按条件选择图片"""
+        if not self.image_files:
+            return
+
+        categories = self.category_manager.get_categories()
+        metadata_options = self.metadata_filter_options()
+        options = ["未标注", "已标注"] + [f"类别: {c}" for c in categories] + metadata_options + ["文件名包含..."]
+        choice, ok = QInputDialog.getItem(self, "条件选择", "选择条件:", options, 0, False)
+        if not ok:
+            return
+
+        annotations = self.annotations_data.get('annotations', {})
+        if choice in metadata_options:
+            indices = self.indices_by_metadata(choice)
+            if indices is None:
+                return
+        elif choice == "未标注":
+            indices = self.get_unlabeled_images()
+        elif choice == "已标注":
+            unlabeled = set(self.get_unlabeled_images())
+            indices = [i for i in range(len(self.image_files)) if i not in unlabeled]
+        elif choice == "文件名包含...":
+            text, ok = QInputDialog.getText(self, "条件选择", "文件名包含:")
+            if not ok or not text:
+                return
+            text = text.lower()
+            indices = [i for i, path in enumerate(self.image_files) if text in os.path.basename(path).lower()]
+        else:
+            category = choice[len("类别: "):]
+            if hasattr(annotations, 'paths_with_category'):
+                matched = set(annotations.paths_with_category(category))
+                indices = [i for i, rel_path in enumerate(self.image_rel_paths) if rel_path in matched]
+            else:
+                indices = [i for i, rel_path in enumerate(self.image_rel_paths)
+                           if annotations.get(rel_path, {}).get('category') == category]
+
+        self.set_image_selection(indices)
+        self.status_label.setText(f"已选择 {len(indices)} 张图片")
+
+    def metadata_filter_options(self):
+        """按图片信息选择的条件（已读取图片信息时）"""
+        if not self.image_metadata:
+            return []
+        from utils.image_metadata import RESOLUTION_BUCKETS, resolution_bucket
+
+        values = self.image_metadata.values()
+        formats = sorted({metadata.format for metadata in values})
+        buckets = {resolution_bucket(metadata) for metadata in values}
+        return ([f"格式: {name}" for name in formats]
+                + [f"分辨率: {name}" for name, _ in RESOLUTION_BUCKETS if name in buckets]
+                + ["短边小于..."])
+
+    def indices_by_metadata(self, choice):
+        """按格式、分辨率档位或短边长度选择图片，取消时返回None"""
+        from utils.image_metadata import resolution_bucket
+
+        if choice == "短边小于...":
+            limit, ok = QInputDialog.getInt(self, "条件选择", "短边小于（像素）:", 224, 1, 100000)
+            if not ok:
+                return None
+            match = lambda metadata: min(metadata.width, metadata.height) < limit
+        elif choice.startswith("格式: "):
+            match = lambda metadata: metadata.format == choice[len("格式: "):]
+        else:
+            match = lambda metadata: resolution_bucket(metadata) == choice[len("分辨率: "):]
+
+        metadata_of = self.image_metadata.get
+        return [i for i, image_path in enumerate(self.image_files)
+                if metadata_of(image_path) is not None and match(metadata_of(image_path))]
+
+    def label_selected_images(self):
+        """批量标注选中的图片"""
+        indices = self.get_selected_image_indices()
+        if not indices:
+            QMessageBox.information(self, "信息", "请先在图片列表或网格中选择图片。")
+            return
+
+        categories = self.category_manager.get_categories()
+        if not categories:
+            QMessageBox.warning(self, "警告", "请先添加类别！")
+            return
+
+        current, _ = self.category_manager.get_selected_category()
+        category_name, ok = QInputDialog.getItem(
+            self, "批量标注", f"为选中的 {len(indices)} 张图片设置类别:",
+            categories, max(current, 0), False
+        )
+        if not ok:
+            return
+
+        count = self.apply_category_to_indices(indices, categories.index(category_name), category_name)
+        if self.current_image_index in indices:
+            self.update_current_annotation_display()
+
+        self.status_label.setText(f"已批量标注 {count} 张图片: {category_name}")
 
     def get_current_timestamp(self):
         """获取当前时间戳"""
         import datetime
         return datetime.datetime.now().isoformat()
 
+    def set_grid_mode(self, enabled):
+        """切换单张查看/缩略图网格"""
+        if enabled:
+            self.view_stack.setCurrentWidget(self.thumbnail_grid)
+            self.thumbnail_grid.set_current_index(self.current_image_index)
+        else:
+            self.view_stack.setCurrentWidget(self.image_viewer)
+
+    def on_grid_image_activated(self, index):
+        """双击网格中的图像时回到单张查看"""
+        self.on_image_selected(index)
+        self.grid_action.setChecked(False)
+
     def update_mouse_status(self, text):
         """更新鼠标状态显示"""
         self.mouse_pos_label.setText(text)
 
     def previous_image(self):
-        """上一张图像"""
-        if self.current_image_index > 0:
-            self.current_image_index -= 1
+        """上一张图像（列表筛选时为筛选结果中的上一张）"""
+        index = self.image_list.neighbor_image(self.current_image_index, -1)
+        if index >= 0:
+            self.current_image_index = index
             self.load_current_image()
             self.update_ui_state()
 
     def next_image(self):
-        """下一张图像"""
-        if self.current_image_index < len(self.image_files) - 1:
-            self.current_image_index += 1
+        """下一张图像（列表筛选时为筛选结果中的下一张）"""
+        index = self.image_list.neighbor_image(self.current_image_index, 1)
+        if index >= 0:
+            self.current_image_index = index
             self.load_current_image()
             self.update_ui_state()
 
@@ -711,6 +1644,12 @@ class MainWindow(QMainWindow):
             self.load_current_image()
             self.update_ui_state()
 
+    def select_category_by_shortcut(self, slot):
+        """通过数字键选择类别"""
+        index = self.category_manager.category_for_shortcut(slot)
+        if index >= 0:
+            self.category_manager.select_category(index)
+
     def select_category_by_index(self, index):
         """通过索引选择类别"""
         categories = self.category_manager.get_categories()
@@ -718,34 +1657,87 @@ class MainWindow(QMainWindow):
             self.category_manager.select_category(index)
 
     def update_ui_state(self):
-        """更新界面状态"""
+        """更新界面状态（快速定位按钮需要统计未标注数量，随进度一起刷新）"""
         has_images = len(self.image_files) > 0
-        unlabeled_count = len(self.get_unlabeled_images())
 
-        self.prev_btn.setEnabled(has_images and self.current_image_index > 0)
-        self.next_btn.setEnabled(has_images and self.current_image_index < len(self.image_files) - 1)
-
-        # 更新快速定位按钮状态
-        self.goto_first_btn.setEnabled(has_images and unlabeled_count > 0)
-        self.goto_next_btn.setEnabled(has_images and unlabeled_count > 0)
+        self.prev_btn.setEnabled(has_images and self.image_list.neighbor_image(self.current_image_index, -1) >= 0)
+        self.next_btn.setEnabled(has_images and self.image_list.neighbor_image(self.current_image_index, 1) >= 0)
+        self.refresh.mark("progress")
+
+    def update_goto_buttons(self, unlabeled_count):
+        """更新快速定位按钮状态"""
+        self.goto_first_btn.setEnabled(unlabeled_count > 0)
+        self.goto_next_btn.setEnabled(unlabeled_count > 0)
+
+    def mark_list_markers(self, indices=None):
+        """标记需要刷新列表标记的图片，indices 为 None 时重新高亮整个列表"""
+        if indices is None:
+            self.pending_markers = None
+        elif self.pending_markers is not None:
+            self.pending_markers.update(indices)
+        self.refresh.mark("list_markers")
+
+    def flush_list_markers(self):
+        pending, self.pending_markers = self.pending_markers, set()
+        if pending is None:
+            self.highlight_unlabeled_in_list()
+        else:
+            self.update_list_markers(sorted(pending))
+        self.update_list_filter_options()
+
+    def update_list_filter_options(self):
+        """筛选下拉框中的类别与类别列表保持一致"""
+        options = ["全部", "未标注", "已标注"] + [f"类别: {c}" for c in self.category_manager.get_categories()]
+        combo = self.list_filter_combo
+        if [combo.itemText(i) for i in range(combo.count())] == options:
+            return
+        current = combo.currentText()
+        combo.blockSignals(True)
+        combo.clear()
+        combo.addItems(options)
+        combo.setCurrentIndex(max(0, options.index(current) if current in options else 0))
+        combo.blockSignals(False)
+        if combo.currentText() != current:
+            self.apply_list_filter()
+
+    @timed_span("apply_list_filter")
+    def apply_list_filter(self):
+        """按筛选条件和搜索文字更新列表
+
+        标注后不自动重新筛选，避免正在查看的图片从列表中消失；切换条件或修改搜索文字时重新计算。
+        """
+        choice = self.list_filter_combo.currentText()
+        text = self.list_search_input.text().strip()
+        rows = None
+        if choice == "未标注":
+            rows = self.list_index.unlabeled_positions()
+        elif choice == "已标注":
+            rows = self.list_index.labeled_positions()
+        elif choice.startswith("类别: "):
+            rows = self.list_index.category_positions(choice[len("类别: "):])
+        if text:
+            rows = self.list_index.search(text, within=rows)
+
+        self.image_list.set_filter(rows)
+        total = len(self.image_files)
+        shown = total if rows is None else len(rows)
+        self.list_count_label.setText(f"显示 {shown} / {total} 张" if rows is not None else f"共 {total} 张")
+        self.update_ui_state()
 
+    @timed_span("update_progress")
     def update_progress(self):
         """更新进度"""
         if not self.image_files:
             self.progress_bar.setValue(0)
             self.progress_label.setText("0 / 0 (0.0%)")
             self.unlabeled_count_label.setText("未标注: 0 张")
+            self.update_goto_buttons(0)
             return
 
-        image_root = self.annotations_data.get("image_root", "")
         annotations = self.annotations_data.get('annotations', {})
 
         # 计算当前文件夹的标注数量
-        annotated_count = 0
-        for image_path in self.image_files:
-            rel_path = get_relative_path(image_path, image_root) if image_root else image_path
-            if rel_path in annotations and annotations[rel_path].get('category'):
-                annotated_count += 1
+        annotated_count = sum(labeled_flags(annotations, self.image_rel_paths))
 
         total_count = len(self.image_files)
         unlabeled_count = total_count - annotated_count
@@ -755,27 +1747,19 @@ class MainWindow(QMainWindow):
         self.progress_bar.setValue(annotated_count)
         self.progress_label.setText(f"{annotated_count} / {total_count} ({progress_percent:.1f}%)")
         self.unlabeled_count_label.setText(f"未标注: {unlabeled_count} 张")
+        self.update_goto_buttons(unlabeled_count)
 
-        # 更新按钮状态
-        self.update_ui_state()
-
+    @timed_span("update_statistics")
     def update_statistics(self):
         """更新统计信息"""
         if not self.image_files:
             self.stats_text.clear()
             return
 
-        image_root = self.annotations_data.get("image_root", "")
         annotations = self.annotations_data.get('annotations', {})
 
-        # 过滤出当前文件夹的标注
-        current_annotations = {}
-        for image_path in self.image_files:
-            rel_path = get_relative_path(image_path, image_root) if image_root else image_path
-            if rel_path in annotations:
-                current_annotations[rel_path] = annotations[rel_path]
-
-        stats, total = get_annotation_stats(current_annotations)
+        # 只统计当前文件夹的标注
+        stats, total = get_annotation_stats(annotations, self.image_rel_paths)
         unlabeled_count = len(self.image_files) - total
 
         stats_text = f"当前文件夹: {os.path.basename(self.current_folder) if self.current_folder else '未设置'}\n"
@@ -795,34 +1779,127 @@ class MainWindow(QMainWindow):
                     percentage = (count / len(self.image_files)) * 100
                     stats_text += f"  {category}: {count} ({percentage:.1f}%)\n"
 
+        stats_text += self.metadata_summary_text
+
+        if hasattr(annotations, "release"):
+            # 分片项目：全项目统计来自摘要索引，不加载其他分片
+            project_stats, _ = annotations.category_counts()
+            labeled = sum(n for c, n in project_stats.items() if c != '未标注')
+            stats_text += (f"\n整个项目: {labeled} 张已标注，{len(annotations.shards)} 个分片"
+                           f"（已加载 {annotations.loaded_shard_count} 个）\n")
+
         # 显示标注格式版本
         format_version = self.annotations_data.get("format_version", "未知")
         stats_text += f"\n标注格式版本: {format_version}"
 
         self.stats_text.setText(stats_text)
 
-        # 更新图片列表高亮
-        self.highlight_unlabeled_in_list()
+    def record_changes(self, rel_paths, category_name, category_index, timestamp):
+        """把标注操作写入变更日志或提交队列（多人标注时）"""
+        sink = self.coordination or self.change_log
+        if sink is None:
+            return
+        try:
+            sink.record_many(rel_paths, category_name, category_index, timestamp)
+        except OSError as e:
+            print(f"写入变更日志失败: {e}")
+
+    def record_category_change(self, op, names, target=None):
+        """共享项目中把类别的重命名、合并或删除写入变更日志，其他标注员合并时按顺序应用"""
+        if self.change_log is None:
+            return
+        try:
+            change = self.change_log.record_category_op(op, names, target)
+        except OSError as e:
+            print(f"写入变更日志失败: {e}")
+            return
+        self.change_merger.note_local(change)
+
+    def sync_shared_changes(self):
+        """保存前合并其他标注员的变更，或把本机的变更提交到协调服务器"""
+        categories = self.category_manager.get_categories()
+        self.annotations_data['categories'] = list(categories)
+        result = None
+        try:
+            if self.change_merger:
+                # 合并到的日志位置记在标注数据中，随标注文件保存
+                result = self.change_merger.merge_project(self.annotations_data)
+            elif self.coordination:
+                result = self.coordination.flush()
+        except Exception as e:
+            self.status_label.setText(f"同步标注失败: {e}")
+            return
+        if not result:
+            return
+
+        if self.change_merger:
+            # 其他标注员的类别操作和新类别已更新到 annotations_data['categories']
+            merged = self.annotations_data['categories']
+        else:
+            merged = categories + [c for c in result.get("categories", []) if c not in categories]
+        if merged != categories:
+            self.category_manager.set_categories(merged)
+            self.annotations_data['categories'] = self.category_manager.get_categories()
+        if self.change_merger and result["applied"]:
+            self.mark_list_markers()
+            self.refresh.mark("progress", "statistics")
+            self.update_current_annotation_display()
+        if result["conflicts"]:
+            self.status_label.setText(f"合并标注时发现 {len(result['conflicts'])} 处冲突（已按最新的标注处理）")
+
+    def claim_batch(self):
+        """从协调服务器领取一批未标注图片"""
+        if not self.ensure_annotations_complete():
+            return
+        try:
+            self.coordination.flush()
+            unfinished = [p for p, done in zip(self.coordination.claimed,
+                                               labeled_flags(self.annotations_data['annotations'],
+                                                             self.coordination.claimed)) if not done]
+            if unfinished:
+                self.coordination.release(unfinished)
+            result = self.coordination.claim(Config.COORDINATION_BATCH_SIZE)
+        except Exception as e:
+            QMessageBox.warning(self, "协调服务器", f"领取批次失败: {e}")
+            return
+
+        if not result["paths"]:
+            QMessageBox.information(self, "协调服务器", "没有待标注的图片了。")
+            return
+        if result["categories"] != self.category_manager.get_categories():
+            self.category_manager.set_categories(result["categories"])
+            self.annotations_data['categories'] = self.category_manager.get_categories()
+        image_root = result["image_root"]
+        self.current_folder = image_root
+        self.load_images_from_folder(image_root, [get_absolute_path(p, image_root) for p in result["paths"]])
 
     def save_annotations(self):
         """保存标注"""
+        if not self.ensure_annotations_complete():
+            return
+
+        self.sync_shared_changes()
         # 更新类别列表
         self.annotations_data['categories'] = self.category_manager.get_categories()
 
-        if save_annotations(Config.ANNOTATIONS_FILE, self.annotations_data, self.current_folder):
+        if save_annotations(self.annotations_path(), self.annotations_data, self.annotations_data.get("image_root")):
             self.status_label.setText("标注已保存")
             QMessageBox.information(self, "成功", "标注文件已保存！")
         else:
             QMessageBox.critical(self, "错误", "保存标注文件失败！")
 
+    @timed_span("autosave")
     def auto_save(self):
         """自动保存"""
-        if self.annotations_data.get('annotations'):
+        if self.project_loaded and not self.annotations_streaming and self.annotations_data.get('annotations'):
+            self.sync_shared_changes()
             self.annotations_data['categories'] = self.category_manager.get_categories()
-            save_annotations(Config.ANNOTATIONS_FILE, self.annotations_data, self.current_folder)
+            save_annotations(self.annotations_path(), self.annotations_data, self.annotations_data.get("image_root"))
 
     def export_dataset(self):
         """导出数据集"""
+        if not self.ensure_annotations_complete():
+            return
         if not self.annotations_data.get('annotations'):
             QMessageBox.warning(self, "警告", "没有标注数据可导出！")
             return
@@ -832,19 +1909,29 @@ class MainWindow(QMainWindow):
         if not output_dir:
             return
 
-        # 询问是否复制图像文件
-        reply = QMessageBox.question(
-            self, "导出选项", "是否复制图像文件到导出目录？\n\n"
-                              "是: 复制图像文件（推荐，便于训练）\n"
-                              "否: 仅创建目录结构和索引文件",
-            QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
-        )
+        # 选择导出方式
+        options = ["复制图像文件（推荐，便于训练）", "仅创建目录结构和索引文件", "仅导出文件清单（CSV/JSONL/NPZ）"]
+        choice, ok = QInputDialog.getItem(self, "导出选项", "导出方式:", options, 0, False)
+        if not ok:
+            return
 
-        copy_images = reply == QMessageBox.StandardButton.Yes
+        # 完整性检查发现损坏的图片时询问是否跳过
+        skip_images = self.corrupt_image_keys()
+        if skip_images:
+            reply = QMessageBox.question(
+                self, "导出选项", f"图片检查发现 {len(skip_images)} 张损坏的图片，导出时跳过这些图片吗？",
+                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
+            )
+            if reply != QMessageBox.StandardButton.Yes:
+                skip_images = None
 
         # 导出数据集
         exporter = DatasetExporter()
-        success, result = exporter.export_dataset(self.annotations_data, output_dir, copy_images)
+        if choice == options[2]:
+            success, result = exporter.export_manifest(self.annotations_data, output_dir, skip_images=skip_images)
+        else:
+            success, result = exporter.export_dataset(self.annotations_data, output_dir, choice == options[0],
+                                                      skip_images=skip_images, metadata=self.image_metadata)
 
         if success:
             # 显示导出结果
@@ -857,6 +1944,10 @@ class MainWindow(QMainWindow):
 
             if result.get('missing_files', 0) > 0:
                 info_text += f"缺失文件: {result['missing_files']} 张\n"
+            if result.get('skipped_files', 0) > 0:
+                info_text += f"跳过损坏图片: {result['skipped_files']} 张\n"
+            if 'image_bytes' in result:
+                info_text += f"图片总大小: {result['image_bytes'] / 1024 ** 2:.1f} MB\n"
 
             info_text += "\n各类别分布:\n"
 
@@ -870,16 +1961,26 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, event):
         """关闭事件"""
-        # 保存标注数据
-        self.annotations_data['categories'] = self.category_manager.get_categories()
-        save_annotations(Config.ANNOTATIONS_FILE, self.annotations_data, self.current_folder)
+        # 保存标注数据（后台加载未完成时不覆盖已有文件）
+        if self.project_loaded and not self.annotations_streaming:
+            self.sync_shared_changes()
+            self.annotations_data['categories'] = self.category_manager.get_categories()
+            save_annotations(self.annotations_path(), self.annotations_data, self.annotations_data.get("image_root"))
+
+        message = "确定要退出程序吗？标注数据已自动保存。"
+        if self.annotations_streaming:
+            message = "标注数据仍在加载，现在退出不会保存本次的标注。确定要退出吗？"
 
         reply = QMessageBox.question(
-            self, "确认退出", "确定要退出程序吗？标注数据已自动保存。",
+            self, "确认退出", message,
             QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No
         )
 
         if reply == QMessageBox.StandardButton.Yes:
+            self.stream_cancelled = True
+            self.thumbnail_grid.cache.shutdown()
+            self.background_executor.shutdown(wait=False, cancel_futures=True)
+            shutdown_decode_service()
             event.accept()
         else:
             event.ignore()
\ No newline at end of file
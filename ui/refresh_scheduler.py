@@ -0,0 +1,68 @@
+import time
+
+from PyQt6.QtCore import QObject, QTimer
+
+
+class RefreshScheduler(QObject):
+    """合并界面刷新：输入处理中只标记需要刷新的面板，由定时器统一刷新
+
+    同一面板在刷新前多次标记只刷新一次；两次刷新至少间隔一帧，面板还可以设置自己的最小
+    刷新间隔（如统计信息），间隔未到时推迟到间隔结束后再刷新。
+    """
+
+    def __init__(self, parent=None, frame_ms=16):
+        super().__init__(parent)
+        self.frame = frame_ms / 1000
+        self._panels = {}  # 名称 -> [刷新函数, 最小间隔(秒), 上次刷新时间]
+        self._dirty = set()
+        self._last_flush = 0.0
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._on_timer)
+
+    def register(self, name, callback, interval_ms=0):
+        """注册面板，刷新顺序与注册顺序相同"""
+        self._panels[name] = [callback, interval_ms / 1000, 0.0]
+
+    def mark(self, *names):
+        """标记面板需要刷新"""
+        self._dirty.update(names)
+        self._schedule()
+
+    def is_dirty(self, name):
+        return name in self._dirty
+
+    def flush(self, *names):
+        """立即刷新指定面板（为空时刷新全部待刷新的面板）"""
+        self._run(set(names) if names else set(self._dirty), time.monotonic())
+        self._schedule()
+
+    def _due_time(self, name):
+        interval, last = self._panels[name][1:]
+        return max(last + interval, self._last_flush + self.frame)
+
+    def _schedule(self):
+        if not self._dirty:
+            self._timer.stop()
+            return
+        delay = min(self._due_time(name) for name in self._dirty) - time.monotonic()
+        msec = max(0, int(delay * 1000 + 0.999))
+        if self._timer.isActive() and self._timer.remainingTime() <= msec:
+            return
+        self._timer.start(msec)
+
+    def _on_timer(self):
+        now = time.monotonic()
+        self._run({name for name in self._dirty if self._due_time(name) <= now + 0.001}, now)
+        self._schedule()
+
+    def _run(self, names, now):
+        if not names:
+            return
+        self._last_flush = now
+        for name, panel in self._panels.items():
+            if name in names:
+                # 先清除标记，刷新函数中再次标记的会在下一次刷新
+                self._dirty.discard(name)
+                panel[2] = now
+                panel[0]()
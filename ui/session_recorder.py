@@ -0,0 +1,182 @@
+import os
+import json
+import time
+import datetime
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import QObject, QEvent, QPoint, QPointF, Qt
+from PyQt6.QtGui import QMouseEvent, QWheelEvent
+from PyQt6.QtTest import QTest
+
+from config import Config
+
+SESSION_FORMAT_VERSION = 1
+
+# 单独按下的修饰键不录制，重放时由组合键携带修饰状态
+_MODIFIER_KEYS = {key.value for key in (Qt.Key.Key_Shift, Qt.Key.Key_Control, Qt.Key.Key_Alt,
+                                         Qt.Key.Key_Meta, Qt.Key.Key_AltGr)}
+
+_MOUSE_EVENTS = {
+    QEvent.Type.MouseButtonPress: "mouse_press",
+    QEvent.Type.MouseButtonRelease: "mouse_release",
+    QEvent.Type.MouseMove: "mouse_move",
+}
+
+
+class SessionRecorder(QObject):
+    """录制主窗口会话中的输入事件（快捷键、列表选择、图像查看器鼠标事件）"""
+
+    def __init__(self, window):
+        super().__init__(window)
+        self.window = window
+        self.events = []
+        self.recording = False
+        self._start = 0.0
+        self._viewer = window.image_viewer.image_display
+
+    def start(self):
+        """开始录制"""
+        self.events = [{
+            "type": "header",
+            "version": SESSION_FORMAT_VERSION,
+            "app_version": Config.VERSION,
+            "image_root": self.window.annotations_data.get("image_root", ""),
+            "current_index": self.window.current_image_index,
+            "window_size": [self.window.width(), self.window.height()],
+            "viewer_size": [self._viewer.width(), self._viewer.height()],
+            "recorded_at": datetime.datetime.now().isoformat(),
+        }]
+        self._start = time.perf_counter()
+        self.recording = True
+        QApplication.instance().installEventFilter(self)
+        self.window.image_list.current_image_changed.connect(self._on_list_row_changed)
+        self.window.thumbnail_grid.image_selected.connect(self._on_grid_selected)
+
+    def stop(self, file_path=None):
+        """停止录制并保存为JSON行文件，返回文件路径"""
+        if not self.recording:
+            return None
+        self.recording = False
+        QApplication.instance().removeEventFilter(self)
+        self.window.image_list.current_image_changed.disconnect(self._on_list_row_changed)
+        self.window.thumbnail_grid.image_selected.disconnect(self._on_grid_selected)
+
+        if file_path is None:
+            stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            file_path = os.path.join(Config.SESSION_DIR, f"session_{stamp}.jsonl")
+        save_session(file_path, self.events)
+        return file_path
+
+    def _append(self, event_type, **fields):
+        self.events.append({"t": time.perf_counter() - self._start, "type": event_type, **fields})
+
+    @staticmethod
+    def _is_toggle_key(event):
+        """录制开关快捷键 (Ctrl+Shift+R) 本身不录制"""
+        return (event.key() == Qt.Key.Key_R and
+                event.modifiers() == (Qt.KeyboardModifier.ControlModifier | Qt.KeyboardModifier.ShiftModifier))
+
+    def _on_list_row_changed(self, row):
+        self._append("select_row", row=row)
+
+    def _on_grid_selected(self, row):
+        self._append("grid_select", row=row)
+
+    def eventFilter(self, obj, event):
+        event_type = event.type()
+        # ShortcutOverride 会沿焦点链（窗口、焦点控件及其父控件）逐个发送，只记录发给焦点控件的那一次；
+        # 快捷键生效时不会再有 KeyPress
+        if event_type == QEvent.Type.ShortcutOverride:
+            if (obj is (QApplication.focusWidget() or self.window) and not event.isAutoRepeat()
+                    and event.key() not in _MODIFIER_KEYS and not self._is_toggle_key(event)):
+                self._append("key", key=event.key(), modifiers=event.modifiers().value, text=event.text())
+        elif obj is self._viewer:
+            if event_type in _MOUSE_EVENTS:
+                pos = event.position()
+                self._append(_MOUSE_EVENTS[event_type], x=pos.x(), y=pos.y(),
+                             button=event.button().value, buttons=event.buttons().value,
+                             modifiers=event.modifiers().value)
+            elif event_type == QEvent.Type.Wheel:
+                pos = event.position()
+                self._append("wheel", x=pos.x(), y=pos.y(), delta=event.angleDelta().y(),
+                             modifiers=event.modifiers().value)
+        return False
+
+
+def save_session(file_path, events):
+    """保存会话（第一行为头信息）"""
+    os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+    with open(file_path, 'w', encoding='utf-8') as f:
+        for event in events:
+            f.write(json.dumps(event, ensure_ascii=False) + "\n")
+
+
+def load_session(file_path):
+    """读取会话，返回 (header, events)"""
+    with open(file_path, 'r', encoding='utf-8') as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    if not records or records[0].get("type") != "header":
+        raise ValueError("不是有效的会话文件")
+    if records[0].get("version", 0) > SESSION_FORMAT_VERSION:
+        raise ValueError(f"不支持的会话格式版本: {records[0].get('version')}")
+    return records[0], records[1:]
+
+
+class SessionReplayer:
+    """在主窗口上按原速或加速重放录制的会话，并统计每个事件的处理延迟"""
+
+    def __init__(self, window, app=None):
+        self.window = window
+        self.app = app or QApplication.instance()
+        self._viewer = window.image_viewer.image_display
+
+    def dispatch(self, event):
+        """派发单个事件"""
+        event_type = event["type"]
+        if event_type == "key":
+            # 通过 QTest 走系统按键路径，快捷键才会生效
+            target = QApplication.focusWidget() or self.window
+            QTest.keyClick(target, Qt.Key(event["key"]), Qt.KeyboardModifier(event["modifiers"]))
+        elif event_type == "select_row":
+            self.window.image_list.set_current_image(event["row"])
+        elif event_type == "grid_select":
+            self.window.thumbnail_grid.image_selected.emit(event["row"])
+        elif event_type in ("mouse_press", "mouse_release", "mouse_move"):
+            qt_type = {v: k for k, v in _MOUSE_EVENTS.items()}[event_type]
+            local = QPointF(event["x"], event["y"])
+            mouse_event = QMouseEvent(qt_type, local, QPointF(self._viewer.mapToGlobal(local.toPoint())),
+                                      Qt.MouseButton(event["button"]), Qt.MouseButton(event["buttons"]),
+                                      Qt.KeyboardModifier(event["modifiers"]))
+            QApplication.sendEvent(self._viewer, mouse_event)
+        elif event_type == "wheel":
+            local = QPointF(event["x"], event["y"])
+            wheel_event = QWheelEvent(local, QPointF(self._viewer.mapToGlobal(local.toPoint())),
+                                      QPoint(0, 0), QPoint(0, event["delta"]),
+                                      Qt.MouseButton.NoButton, Qt.KeyboardModifier(event["modifiers"]),
+                                      Qt.ScrollPhase.NoScrollPhase, False)
+            QApplication.sendEvent(self._viewer, wheel_event)
+
+    def replay(self, header, events, speed=1.0):
+        """重放事件；speed <= 0 表示不等待、尽快重放。返回 [(事件类型, 延迟ms), ...]"""
+        # 恢复录制时的窗口尺寸和当前图像，保证缩放/平移坐标一致
+        width, height = header.get("window_size", [self.window.width(), self.window.height()])
+        self.window.resize(width, height)
+        start_index = header.get("current_index", -1)
+        if 0 <= start_index < len(self.window.image_files):
+            self.window.current_image_index = start_index
+            self.window.load_current_image()
+        self.app.processEvents()
+
+        latencies = []
+        start = time.perf_counter()
+        for event in events:
+            if speed > 0:
+                due = start + event["t"] / speed
+                while time.perf_counter() < due:
+                    self.app.processEvents()
+                    time.sleep(0.001)
+            begin = time.perf_counter()
+            self.dispatch(event)
+            # 处理完派发引起的所有已投递事件（含重绘）才算结束
+            self.app.processEvents()
+            latencies.append((event["type"], (time.perf_counter() - begin) * 1000))
+        return latencies
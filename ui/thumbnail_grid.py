@@ -0,0 +1,199 @@
+import os
+from collections import OrderedDict
+from PyQt6.QtWidgets import QListView, QAbstractItemView
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex, QSize, QPoint, QTimer, pyqtSignal
+from PyQt6.QtGui import QPixmap, QImage, QColor
+
+from utils.thumbnail_cache import ThumbnailCache
+from utils.instrumentation import profiler
+from utils.memory_budget import memory_budget
+from config import Config
+
+
+class ThumbnailListModel(QAbstractListModel):
+    """缩略图列表模型，只为可见区域附近的单元格请求缩略图"""
+
+    # 工作线程完成后通过信号回到界面线程
+    _thumbnail_loaded = pyqtSignal(str, object)
+    # 内存预算的淘汰可能发生在工作线程中，QPixmap 只能在界面线程释放
+    _evict_requested = pyqtSignal(str)
+
+    def __init__(self, cache, parent=None):
+        super().__init__(parent)
+        self.cache = cache
+        self._image_files = []
+        self._rows = {}  # 路径 -> 行号
+        self._pixmaps = OrderedDict()  # 路径 -> QPixmap，界面侧LRU
+        self._pending = {}  # 路径 -> Future
+        self._max_pixmaps = max(64, Config.THUMBNAIL_MEMORY_CACHE_MB * 1024 * 1024
+                                // (Config.THUMBNAIL_SIZE * Config.THUMBNAIL_SIZE * 4))
+        self._placeholder = QPixmap(Config.THUMBNAIL_SIZE, Config.THUMBNAIL_SIZE)
+        self._placeholder.fill(QColor.fromRgb(230, 230, 230))
+        self._thumbnail_loaded.connect(self._on_thumbnail_loaded)
+        self._budget = memory_budget.register("缩略图网格", self._evict_requested.emit)
+        self._evict_requested.connect(self._evict_pixmap)
+        self.destroyed.connect(self._budget.close)
+
+    def set_image_files(self, image_files):
+        """设置图像列表并清空未完成的请求"""
+        self.beginResetModel()
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._pixmaps.clear()
+        self._budget.clear()
+        self._image_files = list(image_files)
+        self._rows = {path: i for i, path in enumerate(self._image_files)}
+        self.endResetModel()
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._image_files)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._image_files):
+            return None
+        image_path = self._image_files[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return os.path.basename(image_path)
+        if role == Qt.ItemDataRole.DecorationRole:
+            pixmap = self._pixmaps.get(image_path)
+            if pixmap is None:
+                return self._placeholder
+            self._pixmaps.move_to_end(image_path)
+            self._budget.touch(image_path)
+            return pixmap
+        if role == Qt.ItemDataRole.ToolTipRole:
+            return image_path
+        return None
+
+    def request_rows(self, first, last):
+        """请求 [first, last] 范围内的缩略图，并取消范围外尚未开始的请求"""
+        first = max(0, first)
+        last = min(len(self._image_files) - 1, last)
+        wanted = set(self._image_files[first:last + 1]) if last >= first else set()
+
+        for image_path in list(self._pending):
+            if image_path not in wanted and self._pending[image_path].cancel():
+                del self._pending[image_path]
+
+        for image_path in self._image_files[first:last + 1]:
+            if image_path in self._pixmaps or image_path in self._pending:
+                continue
+            self._pending[image_path] = self.cache.request(image_path, self._thumbnail_loaded.emit)
+            profiler.count("thumbnail_requests")
+
+    def _evict_pixmap(self, image_path):
+        """内存预算不足时淘汰（之后需要时重新从缩略图缓存加载）"""
+        if image_path not in self._budget.entries:  # 排队期间可能已重新加载
+            self._pixmaps.pop(image_path, None)
+
+    def _on_thumbnail_loaded(self, image_path, data):
+        """缩略图就绪"""
+        self._pending.pop(image_path, None)
+        row = self._rows.get(image_path)
+        if row is None or data is None:
+            return
+
+        image = QImage.fromData(data, "JPEG")
+        if image.isNull():
+            return
+        pixmap = self._pixmaps[image_path] = QPixmap.fromImage(image)
+        while len(self._pixmaps) > self._max_pixmaps:
+            self._budget.release(self._pixmaps.popitem(last=False)[0])
+        self._budget.charge(image_path, pixmap.width() * pixmap.height() * pixmap.depth() // 8)
+
+        index = self.index(row)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.DecorationRole])
+
+
+class ThumbnailGridView(QListView):
+    """缩略图网格视图"""
+
+    image_selected = pyqtSignal(int)  # 单击选中
+    image_activated = pyqtSignal(int)  # 双击打开
+
+    # 可见区域上下各预取的屏数
+    PREFETCH_SCREENS = 1
+
+    def __init__(self, cache=None, parent=None):
+        super().__init__(parent)
+        self.cache = cache or ThumbnailCache()
+        self.thumbnail_model = ThumbnailListModel(self.cache, self)
+        self.setModel(self.thumbnail_model)
+
+        size = Config.THUMBNAIL_SIZE
+        self.setViewMode(QListView.ViewMode.IconMode)
+        self.setIconSize(QSize(size, size))
+        self.setGridSize(QSize(size + 24, size + 40))
+        self.setResizeMode(QListView.ResizeMode.Adjust)
+        self.setMovement(QListView.Movement.Static)
+        self.setUniformItemSizes(True)
+        self.setLayoutMode(QListView.LayoutMode.Batched)
+        self.setBatchSize(500)
+        self.setWordWrap(False)
+        self.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
+
+        # 滚动和缩放停止后再计算可见区域
+        self._request_timer = QTimer(self)
+        self._request_timer.setSingleShot(True)
+        self._request_timer.setInterval(50)
+        self._request_timer.timeout.connect(self.request_visible_thumbnails)
+
+        self.verticalScrollBar().valueChanged.connect(self.schedule_request)
+        self.clicked.connect(lambda index: self.image_selected.emit(index.row()))
+        self.activated.connect(lambda index: self.image_activated.emit(index.row()))
+
+    def set_image_files(self, image_files):
+        """设置图像列表"""
+        self.thumbnail_model.set_image_files(image_files)
+        self.schedule_request()
+
+    def set_current_index(self, row):
+        """同步当前图像"""
+        if 0 <= row < self.thumbnail_model.rowCount():
+            index = self.thumbnail_model.index(row)
+            # 已是当前项时不改动，避免清掉多选
+            if self.currentIndex() != index:
+                self.setCurrentIndex(index)
+            self.scrollTo(index)
+
+    def schedule_request(self, *args):
+        self._request_timer.start()
+
+    def visible_range(self):
+        """计算可见区域（含预取范围）对应的行号区间"""
+        count = self.thumbnail_model.rowCount()
+        if count == 0:
+            return 0, -1
+
+        viewport = self.viewport().rect()
+        grid = self.gridSize()
+        # 取单元格中心附近的点，避免落在单元格间隙上
+        half = QPoint(grid.width() // 2, grid.height() // 2)
+        first_index = self.indexAt(viewport.topLeft() + half)
+        last_index = self.indexAt(viewport.bottomRight() - half)
+        per_row = max(1, viewport.width() // max(1, grid.width()))
+        rows_per_screen = max(1, viewport.height() // max(1, grid.height()) + 1)
+        per_screen = per_row * rows_per_screen
+
+        first = first_index.row() if first_index.isValid() else 0
+        # 最后一行未排满时右下角没有单元格，按一屏的容量估算
+        last = last_index.row() if last_index.isValid() else first + per_screen
+        margin = per_screen * self.PREFETCH_SCREENS
+        return max(0, first - margin), min(count - 1, last + margin)
+
+    def request_visible_thumbnails(self):
+        if not self.isVisible():
+            return
+        first, last = self.visible_range()
+        self.thumbnail_model.request_rows(first, last)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.schedule_request()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.schedule_request()
@@ -0,0 +1,533 @@
+import datetime
+from collections.abc import MutableMapping
+import numpy as np
+
+# 类别列中的特殊值
+UNLABELED = -1  # 有记录但没有类别
+DELETED = -2  # 记录已删除（路径仍保留在路径表中，重新写入时复用该行）
+
+# category_index / timestamp 缺失时的占位值
+_NO_INDEX = int(np.iinfo(np.int16).min)
+_MAX_INDEX = int(np.iinfo(np.int16).max)
+_NO_TIMESTAMP = int(np.iinfo(np.int64).min)
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_RECORD_KEYS = frozenset(('category', 'category_index', 'timestamp'))
+
+# 新增路径先放在字典里，超过该数量后并入有序哈希索引
+_OVERLAY_LIMIT = 65536
+
+
+def _encode_timestamp(value):
+    """isoformat 时间戳 -> 自1970年起的微秒数；无法无损还原时返回None"""
+    try:
+        dt = datetime.datetime.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+    if dt.tzinfo is not None or dt.isoformat() != value:
+        return None
+    delta = dt - _EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1000000 + delta.microseconds
+
+
+def _decode_timestamp(value):
+    return (_EPOCH + datetime.timedelta(microseconds=int(value))).isoformat()
+
+
+class ColumnarAnnotations(MutableMapping):
+    """列式标注存储
+
+    路径以UTF-8连续存放在一块字节缓冲区中（偏移量数组定位），配合64位哈希的有序索引查找；
+    类别ID（int16）、类别序号（int16）和时间戳（int64微秒）各占一列。
+    对外保持 {相对路径: {'category', 'category_index', 'timestamp'}} 的字典接口，
+    读取时按需生成记录字典（修改返回的字典不会写回，需要重新赋值）。
+    不符合上述结构的记录原样保存在 _extra 中。
+    """
+
+    def __init__(self, capacity=1024):
+        self._blob = bytearray()
+        self._offsets = np.zeros(capacity + 1, dtype=np.int64)
+        self._category = np.full(capacity, DELETED, dtype=np.int16)
+        self._category_index = np.full(capacity, _NO_INDEX, dtype=np.int16)
+        self._timestamp = np.full(capacity, _NO_TIMESTAMP, dtype=np.int64)
+        self._size = 0  # 已使用的行数（含已删除）
+        self._count = 0  # 有效记录数
+
+        self._index_hashes = np.zeros(0, dtype=np.int64)  # 有序哈希
+        self._index_rows = np.zeros(0, dtype=np.int64)
+        self._overlay = {}  # 尚未并入哈希索引的路径 -> 行号
+
+        self._category_names = []  # 类别ID -> 名称
+        self._category_ids = {}
+        self._extra = {}  # 行号 -> 原始记录
+
+    # ---- 构建 ----
+
+    @classmethod
+    def from_dict(cls, annotations):
+        """由普通字典批量构建"""
+        store = cls(capacity=max(1024, len(annotations)))
+        paths = list(annotations)
+        encoded = [p.encode('utf-8') for p in paths]
+        store._blob = bytearray(b''.join(encoded))
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=len(encoded))
+        np.cumsum(lengths, out=store._offsets[1:len(paths) + 1])
+        store._size = len(paths)
+
+        # 先在Python列表中编码，再一次性写入各列
+        encoded_rows = [store._encode(record) for record in annotations.values()]
+        if encoded_rows:
+            cids, indices, timestamps, fits = zip(*encoded_rows)
+            n = len(paths)
+            store._category[:n] = cids
+            store._category_index[:n] = indices
+            store._timestamp[:n] = timestamps
+            for row in np.flatnonzero(~np.array(fits, dtype=bool)):
+                store._extra[int(row)] = dict(annotations[paths[row]])
+        store._count = len(paths)
+
+        hashes = np.fromiter((hash(p) for p in paths), dtype=np.int64, count=len(paths))
+        order = np.argsort(hashes, kind='stable')
+        store._index_hashes = hashes[order]
+        store._index_rows = order.astype(np.int64)
+        return store
+
+    def to_dict(self):
+        """转换为普通字典（用于JSON序列化）"""
+        return dict(self.items())
+
+    # ---- 内部工具 ----
+
+    def _grow(self, needed):
+        capacity = len(self._category)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2)
+        extra = new_capacity - capacity
+        self._offsets = np.concatenate([self._offsets, np.zeros(extra, dtype=np.int64)])
+        self._category = np.concatenate([self._category, np.full(extra, DELETED, dtype=np.int16)])
+        self._category_index = np.concatenate([self._category_index, np.full(extra, _NO_INDEX, dtype=np.int16)])
+        self._timestamp = np.concatenate([self._timestamp, np.full(extra, _NO_TIMESTAMP, dtype=np.int64)])
+
+    def category_id(self, name):
+        """类别名称 -> 类别ID（不存在时新建）"""
+        cid = self._category_ids.get(name)
+        if cid is None:
+            cid = len(self._category_names)
+            self._category_names.append(name)
+            self._category_ids[name] = cid
+        return cid
+
+    def _encode(self, record):
+        """记录 -> (类别ID, 类别序号, 时间戳, 是否符合列结构)"""
+        fits = record.keys() <= _RECORD_KEYS
+
+        category = record.get('category')
+        if category is None and 'category' not in record:
+            cid = UNLABELED
+        elif isinstance(category, str) and category:
+            cid = self.category_id(category)
+        else:
+            cid = UNLABELED
+            fits = False
+
+        category_index = record.get('category_index', _NO_INDEX)
+        if category_index is not _NO_INDEX and not (
+                type(category_index) is int and _NO_INDEX < category_index <= _MAX_INDEX):
+            category_index = _NO_INDEX
+            fits = False
+
+        timestamp = _NO_TIMESTAMP
+        if 'timestamp' in record:
+            timestamp = _encode_timestamp(record['timestamp'])
+            if timestamp is None:
+                timestamp = _NO_TIMESTAMP
+                fits = False
+
+        return cid, category_index, timestamp, fits
+
+    def _write_row(self, row, record):
+        """把一条记录写入各列"""
+        cid, category_index, timestamp, fits = self._encode(record)
+        self._category[row] = cid
+        self._category_index[row] = category_index
+        self._timestamp[row] = timestamp
+        if fits:
+            self._extra.pop(row, None)
+        else:
+            self._extra[row] = dict(record)
+
+    def _read_row(self, row):
+        """由各列还原记录字典"""
+        extra = self._extra.get(row)
+        if extra is not None:
+            return dict(extra)
+        record = {}
+        cid = self._category[row]
+        if cid >= 0:
+            record['category'] = self._category_names[cid]
+        if self._category_index[row] != _NO_INDEX:
+            record['category_index'] = int(self._category_index[row])
+        if self._timestamp[row] != _NO_TIMESTAMP:
+            record['timestamp'] = _decode_timestamp(self._timestamp[row])
+        return record
+
+    def _path_at(self, row):
+        return self._blob[self._offsets[row]:self._offsets[row + 1]].decode('utf-8')
+
+    def _find(self, path):
+        """查找路径所在行，不存在返回None（含已删除的行）"""
+        row = self._overlay.get(path)
+        if row is not None:
+            return row
+        hashes = self._index_hashes
+        if not len(hashes):
+            return None
+        h = hash(path)
+        i = int(np.searchsorted(hashes, h))
+        while i < len(hashes) and hashes[i] == h:
+            row = int(self._index_rows[i])
+            if self._path_at(row) == path:
+                return row
+            i += 1
+        return None
+
+    def _append(self, path):
+        """在路径表末尾新增一行"""
+        row = self._size
+        self._grow(row + 1)
+        encoded = path.encode('utf-8')
+        self._blob += encoded
+        self._offsets[row + 1] = self._offsets[row] + len(encoded)
+        self._size += 1
+        self._overlay[path] = row
+        if len(self._overlay) > max(_OVERLAY_LIMIT, len(self._index_hashes) // 8):
+            self._merge_overlay()
+        return row
+
+    def _merge_overlay(self):
+        """把新增路径并入有序哈希索引"""
+        if not self._overlay:
+            return
+        hashes = np.fromiter((hash(p) for p in self._overlay), dtype=np.int64, count=len(self._overlay))
+        rows = np.fromiter(self._overlay.values(), dtype=np.int64, count=len(self._overlay))
+        all_hashes = np.concatenate([self._index_hashes, hashes])
+        all_rows = np.concatenate([self._index_rows, rows])
+        order = np.argsort(all_hashes, kind='stable')
+        self._index_hashes = all_hashes[order]
+        self._index_rows = all_rows[order]
+        self._overlay = {}
+
+    # ---- 字典接口 ----
+
+    def __getitem__(self, path):
+        row = self._find(path)
+        if row is None or self._category[row] == DELETED:
+            raise KeyError(path)
+        return self._read_row(row)
+
+    def __setitem__(self, path, record):
+        row = self._find(path)
+        if row is None:
+            row = self._append(path)
+        if self._category[row] == DELETED:
+            self._count += 1
+        self._write_row(row, record)
+
+    def __delitem__(self, path):
+        row = self._find(path)
+        if row is None or self._category[row] == DELETED:
+            raise KeyError(path)
+        self._category[row] = DELETED
+        self._category_index[row] = _NO_INDEX
+        self._timestamp[row] = _NO_TIMESTAMP
+        self._extra.pop(row, None)
+        self._count -= 1
+
+    def __contains__(self, path):
+        row = self._find(path)
+        return row is not None and self._category[row] != DELETED
+
+    def __len__(self):
+        return self._count
+
+    def _live_rows(self):
+        return np.flatnonzero(self._category[:self._size] != DELETED)
+
+    def __iter__(self):
+        for row in self._live_rows():
+            yield self._path_at(row)
+
+    def items(self):
+        for row in self._live_rows():
+            yield self._path_at(row), self._read_row(row)
+
+    def values(self):
+        for row in self._live_rows():
+            yield self._read_row(row)
+
+    def __repr__(self):
+        return f"<ColumnarAnnotations {self._count} 条记录>"
+
+    # ---- 向量化操作 ----
+
+    def find_rows(self, paths):
+        """批量查找路径所在行，不存在或已删除为-1
+
+        有序索引部分先用64位哈希批量定位，再核对命中行的路径；哈希相同而路径不同时（冲突，
+        或索引中有重复的哈希）改用 _find 逐条查找，结果与 _find 一致。
+        """
+        paths = list(paths)
+        rows = np.full(len(paths), -1, dtype=np.int64)
+        if not paths:
+            return rows
+
+        if len(self._index_hashes):
+            hashes = np.fromiter((hash(p) for p in paths), dtype=np.int64, count=len(paths))
+            positions = np.searchsorted(self._index_hashes, hashes)
+            positions = np.minimum(positions, len(self._index_hashes) - 1)
+            found = np.flatnonzero(self._index_hashes[positions] == hashes)
+            matched = self._index_rows[positions[found]]
+            rows[found] = matched
+            blob = self._blob
+            starts = self._offsets[matched].tolist()
+            ends = self._offsets[matched + 1].tolist()
+            for i, start, end in zip(found.tolist(), starts, ends):
+                if blob[start:end].decode('utf-8') != paths[i]:
+                    row = self._find(paths[i])
+                    rows[i] = -1 if row is None else row
+
+        if self._overlay:
+            overlay = self._overlay
+            for i, path in enumerate(paths):
+                row = overlay.get(path)
+                if row is not None:
+                    rows[i] = row
+
+        valid = rows >= 0
+        rows[valid & (self._category[np.maximum(rows, 0)] == DELETED)] = -1
+        return rows
+
+    def labeled_mask(self, paths):
+        """批量判断路径是否已标注"""
+        rows = self.find_rows(paths)
+        mask = rows >= 0
+        mask[mask] = self._category[rows[mask]] >= 0
+        return mask
+
+    def categories_of(self, paths):
+        """批量取路径的类别名称，没有记录或未标注为 None"""
+        rows = self.find_rows(paths)
+        cids = np.where(rows >= 0, self._category[np.maximum(rows, 0)], UNLABELED)
+        names = self._category_names
+        return [names[cid] if cid >= 0 else None for cid in cids.tolist()]
+
+    def category_counts(self, paths=None):
+        """各类别的记录数；paths 不为空时只统计这些路径，返回 (stats, total)
+
+        与 get_annotation_stats 一致：有记录但没有类别的计入 '未标注'。
+        """
+        if paths is None:
+            categories = self._category[:self._size]
+            categories = categories[categories != DELETED]
+        else:
+            rows = self.find_rows(paths)
+            categories = self._category[rows[rows >= 0]]
+
+        stats = {}
+        labeled = categories[categories >= 0]
+        for cid, count in enumerate(np.bincount(labeled, minlength=len(self._category_names))):
+            if count:
+                stats[self._category_names[cid]] = int(count)
+        unlabeled = int(np.count_nonzero(categories == UNLABELED))
+        if unlabeled:
+            stats['未标注'] = unlabeled
+        return stats, int(len(categories))
+
+    def _append_paths(self, paths):
+        """在路径表末尾批量新增多行（各列由调用方写入），返回起始行号"""
+        start = self._size
+        n = len(paths)
+        self._grow(start + n)
+        encoded = [p.encode('utf-8') for p in paths]
+        lengths = np.fromiter((len(b) for b in encoded), dtype=np.int64, count=n)
+        self._blob += b''.join(encoded)
+        self._offsets[start + 1:start + n + 1] = self._offsets[start] + np.cumsum(lengths)
+        self._size += n
+        self._count += n
+
+        self._overlay.update(zip(paths, range(start, start + n)))
+        if len(self._overlay) > max(_OVERLAY_LIMIT, len(self._index_hashes) // 8):
+            self._merge_overlay()
+        return start
+
+    def _new_paths(self, paths):
+        """paths 中本存储还没有的路径的位置"""
+        rows = self.find_rows(paths).tolist()
+        return [i for i, (p, row) in enumerate(zip(paths, rows)) if row < 0 or self._path_at(row) != p]
+
+    def insert_new(self, items):
+        """批量写入尚不存在的路径，已有的记录保持不变（用于流式加载），返回写入数量
+
+        items 为 (路径, 记录) 序列，或另一个 ColumnarAnnotations（各列直接复制，不再逐条编码）。
+        """
+        if isinstance(items, ColumnarAnnotations):
+            return self._insert_new_store(items)
+
+        records = dict(items)  # 同一批中重复的路径以最后一条为准（与 json.load 相同）
+        if self._count < self._size:
+            # 有已删除的行时逐条写入，复用同一路径的已删除行
+            paths = [p for p in records if p not in self]
+            for path in paths:
+                self[path] = records[path]
+            return len(paths)
+
+        paths = list(records)
+        paths = [paths[i] for i in self._new_paths(paths)]
+        if not paths:
+            return 0
+        cids, indices, timestamps, fits = zip(*(self._encode(records[p]) for p in paths))
+        start = self._append_paths(paths)
+        end = start + len(paths)
+        self._category[start:end] = cids
+        self._category_index[start:end] = indices
+        self._timestamp[start:end] = timestamps
+        for i in np.flatnonzero(~np.array(fits, dtype=bool)):
+            self._extra[start + int(i)] = dict(records[paths[i]])
+        return len(paths)
+
+    def _insert_new_store(self, other):
+        live = other._live_rows()
+        paths = [other._path_at(row) for row in live.tolist()]
+        if self._count < self._size:
+            return self.insert_new((p, other._read_row(row)) for p, row in zip(paths, live.tolist()))
+
+        keep = self._new_paths(paths)
+        if not keep:
+            return 0
+        rows = live[keep]
+        start = self._append_paths([paths[i] for i in keep])
+        end = start + len(rows)
+
+        # 类别ID按名称换算到本存储
+        categories = other._category[rows]
+        table = np.array([self.category_id(name) for name in other._category_names] or [0], dtype=np.int16)
+        self._category[start:end] = np.where(categories >= 0, table[np.maximum(categories, 0)], categories)
+        self._category_index[start:end] = other._category_index[rows]
+        self._timestamp[start:end] = other._timestamp[rows]
+        if other._extra:
+            for i, row in enumerate(rows.tolist()):
+                if row in other._extra:
+                    self._extra[start + i] = dict(other._extra[row])
+        return len(rows)
+
+    def iter_labels(self, chunk_rows=65536):
+        """逐条产出已标注记录的 (路径, 类别名称)，不还原记录字典（用于流式导出）"""
+        names = self._category_names
+        blob = self._blob
+        for start in range(0, self._size, chunk_rows):
+            end = min(start + chunk_rows, self._size)
+            categories = self._category[start:end]
+            rows = np.flatnonzero(categories >= 0)
+            offsets = self._offsets[start:end + 1].tolist()
+            for row, cid in zip(rows.tolist(), categories[rows].tolist()):
+                yield blob[offsets[row]:offsets[row + 1]].decode('utf-8'), names[cid]
+
+    def paths_with_category(self, name):
+        """某类别下的所有路径"""
+        cid = self._category_ids.get(name)
+        if cid is None:
+            return []
+        return [self._path_at(row) for row in np.flatnonzero(self._category[:self._size] == cid)]
+
+    def assign(self, paths, category_name, category_index, timestamp):
+        """把同一类别批量写入多条路径，返回写入数量"""
+        paths = list(paths)
+        rows = self.find_rows(paths)
+        for i in np.flatnonzero(rows < 0):
+            path = paths[i]
+            row = self._find(path)
+            rows[i] = row if row is not None else self._append(path)
+
+        rows = np.unique(rows)
+        newly_live = int(np.count_nonzero(self._category[rows] == DELETED))
+        self._category[rows] = self.category_id(category_name)
+        self._category_index[rows] = category_index
+        encoded = _encode_timestamp(timestamp)
+        self._timestamp[rows] = _NO_TIMESTAMP if encoded is None else encoded
+        for row in rows:
+            self._extra.pop(int(row), None)
+        self._count += newly_live
+        return len(paths)
+
+    # ---- 类别表操作 ----
+
+    def rename_category(self, old_name, new_name):
+        """重命名类别，返回受影响的记录数
+
+        新名称未被使用时只修改ID->名称表（O(1)）；否则等同于把旧类别合并进新类别。
+        """
+        cid = self._category_ids.get(old_name)
+        if cid is None or old_name == new_name:
+            return 0
+        if new_name in self._category_ids:
+            return self.merge_categories([old_name], new_name)
+        self._category_names[cid] = new_name
+        del self._category_ids[old_name]
+        self._category_ids[new_name] = cid
+        self._remap_extra({old_name: new_name})
+        return int(np.count_nonzero(self._category[:self._size] == cid))
+
+    def merge_categories(self, source_names, target_name):
+        """把若干类别的记录并入目标类别，返回受影响的记录数"""
+        target = self.category_id(target_name)
+        sources = [self._category_ids[name] for name in source_names
+                   if name in self._category_ids and name != target_name]
+        if not sources:
+            return 0
+        mask = np.isin(self._category[:self._size], sources)
+        self._category[:self._size][mask] = target
+        self._remap_extra({name: target_name for name in source_names if name != target_name})
+        return int(np.count_nonzero(mask))
+
+    def delete_category(self, name):
+        """删除某类别的所有记录（图片变为未标注），返回删除的记录数"""
+        cid = self._category_ids.get(name)
+        if cid is None:
+            return 0
+        rows = np.flatnonzero(self._category[:self._size] == cid)
+        self._category[rows] = DELETED
+        self._category_index[rows] = _NO_INDEX
+        self._timestamp[rows] = _NO_TIMESTAMP
+        for row in rows:
+            self._extra.pop(int(row), None)
+        self._count -= len(rows)
+        return len(rows)
+
+    def sync_category_indices(self, categories):
+        """按当前类别列表批量更新各记录的 category_index（不在列表中的类别保持不变）"""
+        lut = np.full(len(self._category_names) + 1, _NO_INDEX, dtype=np.int16)
+        for i, name in enumerate(categories):
+            cid = self._category_ids.get(name)
+            if cid is not None:
+                lut[cid] = i
+        categories_col = self._category[:self._size]
+        mask = categories_col >= 0
+        mask[mask] = lut[categories_col[mask]] != _NO_INDEX
+        self._category_index[:self._size][mask] = lut[categories_col[mask]]
+        positions = {name: i for i, name in enumerate(categories)}
+        for record in self._extra.values():
+            if record.get('category') in positions:
+                record['category_index'] = positions[record['category']]
+
+    def _remap_extra(self, mapping):
+        """原样保存的记录中的类别名称同步修改"""
+        for record in self._extra.values():
+            if record.get('category') in mapping:
+                record['category'] = mapping[record['category']]
+
+    def memory_usage(self):
+        """各列及索引占用的字节数（近似）"""
+        return (len(self._blob) + self._offsets.nbytes + self._category.nbytes +
+                self._category_index.nbytes + self._timestamp.nbytes +
+                self._index_hashes.nbytes + self._index_rows.nbytes)
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import codecs
+
+from config import Config
+
+_WHITESPACE = re.compile(r'[ \t\n\r]*')
+# 标注对象中的一项: "键": （键中不含转义时可直接使用）
+_ENTRY_KEY = re.compile(r'[ \t\n\r]*"((?:[^"\\]|\\.)*)"[ \t\n\r]*:[ \t\n\r]*', re.DOTALL)
+_SEPARATOR = re.compile(r'[ \t\n\r]*([,}])')
+_READ_SIZE = 1 << 20
+_MIN_AHEAD = 1 << 16  # 解析每一项前缓冲区中至少保留的字符数
+
+
+class StreamFormatError(ValueError):
+    """文件不适合流式读取（例如旧版本格式），应改用 load_annotations 整体读取"""
+
+
+class _StreamReader:
+    """按块读取UTF-8文件的JSON解析游标"""
+
+    def __init__(self, f):
+        self.f = f
+        self.size = os.fstat(f.fileno()).st_size
+        self.bytes_read = 0
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.json_decoder = json.JSONDecoder()
+        self.buf = ""
+        self.pos = 0
+        self.eof = False
+
+    def progress(self):
+        return self.bytes_read / self.size if self.size else 1.0
+
+    def fill(self):
+        """读入更多数据；缓冲区较大时按现有长度读取，单个很大的值也只需重试几次"""
+        data = self.f.read(max(_READ_SIZE, len(self.buf) - self.pos))
+        self.bytes_read += len(data)
+        self.eof = not data
+        self.buf = self.buf[self.pos:] + self.decoder.decode(data, final=self.eof)
+        self.pos = 0
+
+    def peek(self):
+        """跳过空白，返回下一个字符（文件结束时为空字符串）"""
+        while True:
+            self.pos = _WHITESPACE.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf) or self.eof:
+                return self.buf[self.pos:self.pos + 1]
+            self.fill()
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError(f"位置 {self.bytes_read} 附近应为 '{char}'")
+        self.pos += 1
+
+    def value(self):
+        """解析下一个完整的JSON值"""
+        self.peek()
+        while True:
+            try:
+                value, end = self.json_decoder.raw_decode(self.buf, self.pos)
+                # 值恰好在缓冲区末尾结束时（如数字）可能还没读完
+                if end < len(self.buf) or self.eof:
+                    self.pos = end
+                    return value
+            except ValueError:
+                if self.eof:
+                    raise
+            self.fill()
+
+    def iter_object(self, chunk_rows):
+        """逐项解析一个JSON对象，每 chunk_rows 项产出一次 [(键, 值)]"""
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        raw_decode = self.json_decoder.raw_decode
+        rows = []
+        while True:
+            if len(self.buf) - self.pos < _MIN_AHEAD and not self.eof:
+                self.fill()
+            buf = self.buf
+            match = _ENTRY_KEY.match(buf, self.pos)
+            try:
+                if match is None:
+                    raise ValueError("标注项格式错误")
+                key = match.group(1)
+                if "\\" in key:
+                    key = json.loads(f'"{key}"')
+                value, end = raw_decode(buf, match.end())
+                separator = _SEPARATOR.match(buf, end)
+                if separator is None:
+                    raise ValueError("标注项之间缺少分隔符")
+            except ValueError:
+                if self.eof:
+                    raise
+                self.fill()  # 这一项跨过了缓冲区末尾，读入更多后重新解析
+                continue
+
+            rows.append((key, value))
+            self.pos = separator.end()
+            if separator.group(1) == "}":
+                break
+            if len(rows) >= chunk_rows:
+                yield rows
+                rows = []
+        if rows:
+            yield rows
+
+
+def iter_annotation_file(file_path, chunk_rows=None):
+    """流式读取标注文件，逐步产出 (类型, 内容, 进度)
+
+    类型为 "header"（annotations 之前的顶层字段）、"annotations"（[(相对路径, 记录)]，每块最多
+    chunk_rows 项）和 "trailer"（annotations 之后的顶层字段），进度为已读取字节的比例。
+    内存占用只与块大小有关。文件不是当前版本格式时在产出任何内容前抛出 StreamFormatError。
+    """
+    chunk_rows = chunk_rows or Config.STREAM_CHUNK_ROWS
+    with open(file_path, 'rb') as f:
+        reader = _StreamReader(f)
+        if reader.peek() != "{":
+            raise StreamFormatError("标注文件不是JSON对象")
+        reader.pos += 1
+
+        header = {}
+        trailer = None
+        fields = header
+        while reader.peek() != "}":
+            key = reader.value()
+            if not isinstance(key, str):
+                raise ValueError("顶层字段名应为字符串")
+            reader.expect(":")
+            if key == "annotations" and trailer is None:
+                if "format_version" not in header:
+                    raise StreamFormatError("旧版本标注文件需要整体读取并升级格式")
+                yield "header", header, reader.progress()
+                for rows in reader.iter_object(chunk_rows):
+                    yield "annotations", rows, reader.progress()
+                fields = trailer = {}
+            else:
+                fields[key] = reader.value()
+            if reader.peek() == ",":
+                reader.pos += 1
+            elif reader.peek() != "}":
+                raise ValueError("顶层字段之间缺少分隔符")
+
+        if trailer is None:
+            if "format_version" not in header:
+                raise StreamFormatError("旧版本标注文件需要整体读取并升级格式")
+            yield "header", header, 1.0
+        yield "trailer", trailer or {}, 1.0
+
+
+def should_stream(file_path):
+    """标注文件是否大到需要流式加载（Config.STREAM_LOAD_MIN_MB，分片项目目录除外）"""
+    try:
+        return os.path.isfile(file_path) and os.path.getsize(file_path) >= Config.STREAM_LOAD_MIN_MB * 1024 * 1024
+    except OSError:
+        return False
@@ -0,0 +1,90 @@
+import heapq
+
+
+def _bigrams(text):
+    return {text[i:i + 2] for i in range(len(text) - 1)}
+
+
+class CategorySearchIndex:
+    """类别名称的n-gram倒排索引
+
+    单字查询用字符倒排表，多字查询取各二元组倒排表的交集再核对子串；
+    没有子串匹配时按字符和二元组做模糊匹配。每次查询只访问相关的倒排表，
+    不遍历全部类别。
+    """
+
+    def __init__(self, names=()):
+        self.set_names(names)
+
+    def set_names(self, names):
+        """重建索引（类别增删改时调用）"""
+        self.names = list(names)
+        self._lower = [name.lower() for name in self.names]
+        self._chars = {}
+        self._grams = {}
+        for i, name in enumerate(self._lower):
+            for ch in set(name):
+                self._chars.setdefault(ch, set()).add(i)
+            for gram in _bigrams(name):
+                self._grams.setdefault(gram, set()).add(i)
+
+    def _substring_candidates(self, query):
+        if len(query) == 1:
+            return self._chars.get(query, set())
+        postings = []
+        for gram in _bigrams(query):
+            posting = self._grams.get(gram)
+            if not posting:
+                return set()
+            postings.append(posting)
+        return {i for i in self._intersect(postings) if query in self._lower[i]}
+
+    def _intersect(self, postings):
+        if not postings or not all(postings):
+            return set()
+        postings = sorted(postings, key=len)
+        result = set(postings[0])
+        for posting in postings[1:]:
+            result &= posting
+            if not result:
+                break
+        return result
+
+    def _overlap(self, query):
+        """各类别与查询共享的二元组数量"""
+        overlap = {}
+        for gram in _bigrams(query):
+            for i in self._grams.get(gram, ()):
+                overlap[i] = overlap.get(i, 0) + 1
+        return overlap
+
+    def search(self, query, limit=200, boost=None):
+        """返回按匹配程度排序的类别序号列表
+
+        多个空格分隔的词须同时出现。没有子串匹配时依次尝试：包含查询中的全部字符
+        （容忍字符顺序错误），与查询共享至少一半的二元组。
+        """
+        query = query.strip().lower()
+        if not query:
+            return list(range(min(limit, len(self.names))))
+
+        boost = boost or (lambda i: 0)
+        terms = query.split()
+        candidates = self._intersect([self._substring_candidates(term) for term in terms])
+        if candidates:
+            first = terms[0]
+
+            def key(i):
+                name = self._lower[i]
+                position = name.find(first)
+                return (name != query, position != 0, position, -boost(i), len(name), i)
+            return heapq.nsmallest(limit, candidates, key=key)
+
+        compact = query.replace(" ", "")
+        overlap = self._overlap(compact)
+        candidates = self._intersect([self._chars.get(ch, set()) for ch in set(compact)])
+        if not candidates:
+            threshold = max(1, len(_bigrams(compact)) // 2)
+            candidates = [i for i, n in overlap.items() if n >= threshold]
+        return heapq.nsmallest(limit, candidates,
+                               key=lambda i: (-overlap.get(i, 0), -boost(i), len(self._lower[i]), i))
@@ -0,0 +1,338 @@
+import os
+import re
+import json
+import getpass
+import contextlib
+
+from config import Config
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+LOG_SUFFIX = ".jsonl"
+# 标注数据中记录已合并到的日志位置（{日志文件名: 字节数}），随标注文件一起保存
+MERGED_LOGS_KEY = "merged_change_logs"
+# 类别操作：categories 中的类别改为 target（删除时 target 为 null）
+CATEGORY_OPS = ("rename", "merge", "delete")
+
+
+@contextlib.contextmanager
+def file_lock(lock_path):
+    """进程间互斥锁（锁文件上的 flock / msvcrt.locking），阻塞直到获得锁"""
+    lock_dir = os.path.dirname(lock_path)
+    if lock_dir:
+        os.makedirs(lock_dir, exist_ok=True)
+    with open(lock_path, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def default_annotator():
+    """当前标注员名称：Config.ANNOTATOR_NAME，为空时使用系统用户名"""
+    if Config.ANNOTATOR_NAME:
+        return Config.ANNOTATOR_NAME
+    try:
+        return getpass.getuser()
+    except Exception:
+        return "annotator"
+
+
+def log_path(log_dir, annotator):
+    """标注员的变更日志文件（名称中的特殊字符替换为下划线）"""
+    return os.path.join(log_dir, re.sub(r'[^\w.-]', '_', annotator) + LOG_SUFFIX)
+
+
+def read_changes(file_path, offset=0):
+    """读取日志从 offset 开始的完整行，返回 (变更列表, 新的 offset)
+
+    不加锁：日志只追加，末尾未写完的行留到下次读取。
+    """
+    try:
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+    except FileNotFoundError:
+        return [], offset
+
+    end = chunk.rfind(b"\n") + 1
+    changes = []
+    for line in chunk[:end].splitlines():
+        if not line.strip():
+            continue
+        try:
+            changes.append(json.loads(line))
+        except ValueError:
+            print(f"跳过损坏的变更记录: {file_path}")
+    return changes, offset + end
+
+
+class ChangeLog:
+    """单个标注员的变更日志（JSON行，只追加）
+
+    每行为一次标注变更：{"path", "category", "category_index", "timestamp", "annotator"}，
+    category 为 null 表示清除标注；或一次类别操作：{"op", "categories", "target", "timestamp", "annotator"}，
+    op 为 rename/merge/delete。追加时持有日志的文件锁，同名标注员的多个实例也不会写乱。
+    """
+
+    def __init__(self, log_dir, annotator=None):
+        self.log_dir = log_dir
+        self.annotator = annotator or default_annotator()
+        self.path = log_path(log_dir, self.annotator)
+
+    def record_many(self, rel_paths, category, category_index, timestamp):
+        """把同一类别写入多张图片的变更一次追加到日志，返回记录数量"""
+        return self.append([{
+            "path": rel_path,
+            "category": category,
+            "category_index": category_index,
+            "timestamp": timestamp,
+        } for rel_path in rel_paths])
+
+    def append(self, changes):
+        """追加变更（标注员统一记为本日志的标注员），返回记录数量"""
+        lines = [json.dumps(dict(change, annotator=self.annotator), ensure_ascii=False) + "\n"
+                 for change in changes]
+        if not lines:
+            return 0
+
+        os.makedirs(self.log_dir, exist_ok=True)
+        with file_lock(self.path + ".lock"):
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write("".join(lines))
+        return len(lines)
+
+    def record(self, rel_path, category, category_index=None, timestamp=None):
+        if timestamp is None:
+            import datetime
+            timestamp = datetime.datetime.now().isoformat()
+        return self.record_many([rel_path], category, category_index, timestamp)
+
+    def record_category_op(self, op, categories, target=None, timestamp=None):
+        """记录类别的重命名、合并或删除，返回写入的记录"""
+        if timestamp is None:
+            import datetime
+            timestamp = datetime.datetime.now().isoformat()
+        change = {"op": op, "categories": list(categories), "target": target, "timestamp": timestamp}
+        self.append([change])
+        return dict(change, annotator=self.annotator)
+
+
+class ChangeMerger:
+    """把各标注员的变更日志合并到标注数据
+
+    每次合并只读取各日志上次之后新增的完整行，一次线性遍历：同一图片取时间戳最新的变更
+    （时间戳相同按标注员名称），已有标注比变更更新时保留已有标注。
+    不同标注员对同一图片给出不同类别时记入冲突报告。读取日志不需要加锁。
+
+    类别操作按时间顺序应用到标注数据和类别表（本实例自己做过的操作除外，见 note_local），
+    早于类别操作的标注变更在比较和写入前也按这些操作换算类别，重新合并旧的变更不会恢复改名前的类别。
+    """
+
+    def __init__(self, log_dir):
+        self.log_dir = log_dir
+        self.offsets = {}  # 日志文件 -> 已读取的字节数
+        self.applied = {}  # 图片 -> (时间戳, 标注员, 类别)，已生效的最新变更
+        self.conflicts = []
+        self.category_ops = []  # 读取到的类别操作（按时间排序）
+        self._local_ops = set()  # 本实例已经应用过的类别操作
+
+    def log_files(self):
+        if not os.path.isdir(self.log_dir):
+            return []
+        return sorted(os.path.join(self.log_dir, name) for name in os.listdir(self.log_dir)
+                      if name.endswith(LOG_SUFFIX))
+
+    def note_local(self, change):
+        """本实例已经应用到标注数据的类别操作，之后从日志读到时不再重复应用"""
+        self._local_ops.add(_op_key(change))
+
+    def merge_project(self, data):
+        """合并到整个标注数据（标注和类别表），返回 merge() 的结果
+
+        从标注数据中记录的日志位置继续读取，合并后更新该位置：已写入标注文件的变更
+        在重新启动或由其他实例合并时不会从头重放。
+        """
+        saved = data.get(MERGED_LOGS_KEY)
+        if isinstance(saved, dict):
+            self.offsets = {os.path.join(self.log_dir, name): offset for name, offset in saved.items()
+                            if isinstance(offset, int)}
+        result = self.merge(data["annotations"], data["categories"])
+        data[MERGED_LOGS_KEY] = {os.path.basename(path): offset for path, offset in self.offsets.items()}
+        return result
+
+    def merge(self, annotations, categories=None):
+        """合并新增的变更，返回结果字典
+
+        categories 为类别列表时按其重新计算 category_index，日志中出现的新类别追加到列表末尾，
+        类别操作在列表中重命名、合并或删除类别。
+        结果: {"changes": 读取的变更数, "applied": 生效的图片数（含类别操作涉及的标注）,
+               "conflicts": 本次的冲突, "new_categories": 新增的类别}
+        """
+        winners = {}  # 图片 -> 本次时间戳最新的变更
+        candidates = {}  # 图片 -> {标注员: 该标注员本次最后的变更}
+        new_ops = []
+        total = 0
+        for file_path in self.log_files():
+            offset = self.offsets.get(file_path, 0)
+            if offset > os.path.getsize(file_path):
+                offset = 0  # 日志被清空后重新开始
+            changes, self.offsets[file_path] = read_changes(file_path, offset)
+            total += len(changes)
+            for change in changes:
+                rel_path = change.get("path")
+                if rel_path is None:
+                    if _is_category_op(change):
+                        new_ops.append(change)
+                    continue
+                winner = winners.get(rel_path)
+                if winner is None or _order(change) > _order(winner):
+                    winners[rel_path] = change
+                candidates.setdefault(rel_path, {})[change.get("annotator", "")] = change
+
+        applied = 0
+        if new_ops:
+            new_ops.sort(key=_order)
+            self.category_ops = sorted(self.category_ops + new_ops, key=_order)
+            applied += self._apply_category_ops(new_ops, annotations, categories)
+
+        positions = {name: i for i, name in enumerate(categories)} if categories is not None else None
+        new_categories = []
+        conflicts = []
+        for rel_path, change in winners.items():
+            previous = self.applied.get(rel_path) or _baseline(annotations.get(rel_path))
+            batch = {annotator: self._category_of(c) for annotator, c in candidates[rel_path].items()}
+            category = self._category_of(change)
+            if ((change.get("timestamp"), category) == (previous[0], previous[2])
+                    or (category is None and previous[2] is None and rel_path not in annotations)):
+                # 标注数据中已包含该变更（例如重复合并同一日志）
+                winner = self.applied[rel_path] = _order(change) + (previous[2],)
+            elif _order(change) > previous[:2]:
+                if category is None:
+                    annotations.pop(rel_path, None)
+                else:
+                    category_index = change.get("category_index")
+                    if positions is not None:
+                        if category not in positions:
+                            positions[category] = len(categories)
+                            categories.append(category)
+                            new_categories.append(category)
+                        category_index = positions[category]
+                    annotations[rel_path] = {
+                        "category": category,
+                        "category_index": category_index,
+                        "timestamp": change.get("timestamp"),
+                    }
+                winner = self.applied[rel_path] = _order(change) + (category,)
+                applied += 1
+                if previous[1] and previous[1] not in batch:
+                    batch = {previous[1]: previous[2], **batch}
+            else:
+                # 已有标注更新，本次的变更全部落选
+                winner = previous
+
+            overridden = {annotator: category for annotator, category in batch.items()
+                          if category != winner[2]}
+            if overridden:
+                conflicts.append(_conflict(rel_path, winner, overridden))
+
+        self.conflicts.extend(conflicts)
+        return {"changes": total, "applied": applied, "conflicts": conflicts, "new_categories": new_categories}
+
+    def _category_of(self, change):
+        """标注变更的类别按之后的类别操作换算（例如改名前给出的旧名称）"""
+        category = change.get("category")
+        if category is not None and self.category_ops:
+            order = _order(change)
+            for op in self.category_ops:
+                if category in op["categories"] and _order(op) > order:
+                    category = op["target"]
+        return category
+
+    def _apply_category_ops(self, ops, annotations, categories):
+        """按时间顺序应用新读取的类别操作，返回涉及的标注数"""
+        from utils.file_utils import (rename_category_in_annotations, merge_categories_in_annotations,
+                                      delete_categories_from_annotations, sync_category_indices)
+
+        count = 0
+        changed = False
+        for op in ops:
+            names, target = op["categories"], op["target"]
+            order = _order(op)
+            for rel_path, (timestamp, annotator, category) in self.applied.items():
+                if category in names and (timestamp, annotator) < order:
+                    self.applied[rel_path] = (timestamp, annotator, target)
+            if _op_key(op) in self._local_ops:
+                continue  # 本实例做过的操作，标注数据和类别表中已经生效
+
+            if target is None:
+                affected = delete_categories_from_annotations(annotations, names)
+            elif op["op"] == "rename" and len(names) == 1:
+                affected = rename_category_in_annotations(annotations, names[0], target)
+            else:
+                affected = merge_categories_in_annotations(annotations, names, target)
+            count += affected
+            changed = True
+            if categories is not None:
+                _apply_to_categories(categories, names, target, affected)
+
+        if changed and categories is not None:
+            sync_category_indices(annotations, categories)
+        return count
+
+
+def _is_category_op(change):
+    names = change.get("categories")
+    target = change.get("target")
+    return (change.get("op") in CATEGORY_OPS and isinstance(names, list)
+            and all(isinstance(name, str) for name in names)
+            and (target is None or isinstance(target, str)))
+
+
+def _op_key(change):
+    return (_order(change), change.get("op"), tuple(change["categories"]), change.get("target"))
+
+
+def _apply_to_categories(categories, names, target, affected):
+    """类别表中的 names 改为 target：第一个的位置换成 target（target 已在表中时去掉），删除时全部去掉"""
+    positions = [i for i, name in enumerate(categories) if name in names and name != target]
+    if target is not None and target not in categories:
+        if positions:
+            categories[positions.pop(0)] = target
+        elif affected:
+            categories.append(target)
+    for i in reversed(positions):
+        del categories[i]
+
+
+def _baseline(record):
+    """没有合并记录的图片以现有标注为基准（标注员为空）"""
+    if not record:
+        return ("", "", None)
+    return (record.get("timestamp") or "", "", record.get("category"))
+
+
+def _order(change):
+    return (change.get("timestamp") or "", change.get("annotator", ""))
+
+
+def _conflict(rel_path, winner, overridden):
+    timestamp, annotator, category = winner
+    return {
+        "path": rel_path,
+        "winner": {"annotator": annotator, "category": category, "timestamp": timestamp},
+        "overridden": [{"annotator": a, "category": c} for a, c in sorted(overridden.items())],
+    }
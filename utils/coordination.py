@@ -0,0 +1,308 @@
+"""多人标注协调服务器与客户端
+
+服务器持有项目的标注数据，把未标注的图片按批次租给各标注员（同一时间每张图片只属于一个批次），
+提交的标注写入各标注员的变更日志后合并到标注数据，并定期写回标注文件。
+只使用标准库（http.server / urllib），可直接在本机 127.0.0.1 上运行和测试。
+
+接口（请求和响应均为JSON）:
+    GET  /status                                   服务器状态
+    GET  /conflicts                                全部冲突记录
+    POST /claim    {"annotator", "size"}           领取批次 -> {"image_root", "paths", "categories"}
+    POST /submit   {"annotator", "changes": [...]} 提交变更 -> {"accepted", "applied", "conflicts"}
+    POST /release  {"annotator", "paths"}          归还未完成的图片
+"""
+import json
+import time
+import heapq
+import threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib import request as urlrequest
+from urllib.error import HTTPError
+
+from config import Config
+from utils.change_log import ChangeLog, ChangeMerger, default_annotator
+
+
+class WorkQueue:
+    """待标注图片的批次分配：每张图片同一时间只租给一个标注员，租约到期未提交时重新排队"""
+
+    def __init__(self, rel_paths, lease_seconds):
+        self.pending = deque(rel_paths)
+        self.leases = {}  # 图片 -> (标注员, 到期时间)
+        self._expiry = []  # (到期时间, 图片) 小顶堆
+        self.lease_seconds = lease_seconds
+
+    def claim(self, annotator, size, is_done, now=None):
+        now = time.monotonic() if now is None else now
+        self._expire(now)
+        expiry = now + self.lease_seconds
+        batch = []
+        while self.pending and len(batch) < size:
+            rel_path = self.pending.popleft()
+            if rel_path in self.leases or is_done(rel_path):
+                continue
+            self.leases[rel_path] = (annotator, expiry)
+            heapq.heappush(self._expiry, (expiry, rel_path))
+            batch.append(rel_path)
+        return batch
+
+    def _expire(self, now):
+        while self._expiry and self._expiry[0][0] <= now:
+            expiry, rel_path = heapq.heappop(self._expiry)
+            lease = self.leases.get(rel_path)
+            if lease and lease[1] == expiry:
+                del self.leases[rel_path]
+                self.pending.append(rel_path)
+
+    def complete(self, annotator, rel_paths):
+        """结束该标注员对这些图片的租约"""
+        done = []
+        for rel_path in rel_paths:
+            lease = self.leases.get(rel_path)
+            if lease and lease[0] == annotator:
+                del self.leases[rel_path]
+                done.append(rel_path)
+        return done
+
+    def release(self, annotator, rel_paths):
+        """归还未完成的图片，放回队首"""
+        released = self.complete(annotator, rel_paths)
+        self.pending.extendleft(reversed(released))
+        return len(released)
+
+
+class CoordinationServer:
+    """协调服务器：serve_forever() 阻塞运行，shutdown() 停止并写回标注文件"""
+
+    def __init__(self, annotations_path, image_root=None, host="127.0.0.1", port=8765,
+                 log_dir=None, lease_seconds=None, save_interval=None):
+        from utils.file_utils import load_annotations, get_image_files, get_relative_path, labeled_flags
+
+        self.annotations_path = annotations_path
+        self.data = load_annotations(annotations_path, compact=Config.COMPACT_ANNOTATIONS)
+        self.image_root = image_root or self.data.get("image_root", "")
+        self.data["image_root"] = self.image_root
+        self.log_dir = log_dir or Config.CHANGE_LOG_DIR
+        self.save_interval = save_interval or Config.COORDINATION_SAVE_INTERVAL
+        self.lock = threading.Lock()
+        self.logs = {}  # 标注员 -> ChangeLog
+
+        # 先合并已有的变更日志（上次运行未写回的提交）
+        self.merger = ChangeMerger(self.log_dir)
+        result = self.merger.merge_project(self.data)
+        self.dirty = result["applied"] > 0
+
+        rel_paths = [get_relative_path(p, self.image_root) for p in get_image_files(self.image_root)]
+        labeled = labeled_flags(self.data["annotations"], rel_paths)
+        self.total_images = len(rel_paths)
+        self.queue = WorkQueue([p for p, done in zip(rel_paths, labeled) if not done],
+                               lease_seconds or Config.COORDINATION_LEASE_SECONDS)
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.coordinator = self
+        self._stop = threading.Event()
+        self._saver = threading.Thread(target=self._save_loop, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def serve_forever(self):
+        self._saver.start()
+        try:
+            self.httpd.serve_forever()
+        finally:
+            self.httpd.server_close()
+
+    def shutdown(self):
+        self._stop.set()
+        self.httpd.shutdown()
+        self.save()
+
+    def _save_loop(self):
+        while not self._stop.wait(self.save_interval):
+            self.save()
+
+    def save(self):
+        from utils.file_utils import save_annotations
+
+        with self.lock:
+            if not self.dirty:
+                return True
+            success = save_annotations(self.annotations_path, self.data, self.image_root)
+            self.dirty = not success
+            return success
+
+    def _is_done(self, rel_path):
+        annotation = self.data["annotations"].get(rel_path)
+        return bool(annotation and annotation.get("category"))
+
+    # ---- 接口 ----
+
+    def claim(self, annotator, size):
+        with self.lock:
+            paths = self.queue.claim(annotator, max(0, int(size)), self._is_done)
+            return {"image_root": self.image_root, "paths": paths,
+                    "categories": list(self.data["categories"]),
+                    "lease_seconds": self.queue.lease_seconds}
+
+    def submit(self, annotator, changes):
+        with self.lock:
+            log = self.logs.get(annotator)
+            if log is None:
+                log = self.logs[annotator] = ChangeLog(self.log_dir, annotator)
+            accepted = log.append(change for change in changes if change.get("path"))
+            result = self.merger.merge_project(self.data)
+            self.queue.complete(annotator, [change["path"] for change in changes if change.get("path")])
+            self.dirty = self.dirty or result["applied"] > 0
+            return {"accepted": accepted, "applied": result["applied"], "conflicts": result["conflicts"],
+                    "categories": list(self.data["categories"])}
+
+    def release(self, annotator, paths):
+        with self.lock:
+            return {"released": self.queue.release(annotator, paths)}
+
+    def status(self):
+        from utils.file_utils import get_annotation_stats
+
+        with self.lock:
+            stats, _ = get_annotation_stats(self.data["annotations"])
+            leased = {}
+            for annotator, _ in self.queue.leases.values():
+                leased[annotator] = leased.get(annotator, 0) + 1
+            return {"image_root": self.image_root, "total_images": self.total_images,
+                    "annotated_images": sum(n for c, n in stats.items() if c != '未标注'),
+                    "pending": len(self.queue.pending), "leased": leased,
+                    "conflicts": len(self.merger.conflicts), "unsaved": self.dirty}
+
+    def conflicts(self):
+        with self.lock:
+            return {"conflicts": list(self.merger.conflicts)}
+
+
+def _check_payload(path, payload):
+    """检查请求内容，格式不对时抛出 ValueError（变更写入日志后会被反复合并，必须先检查）"""
+    if not isinstance(payload, dict):
+        raise ValueError("请求必须是JSON对象")
+    if not isinstance(payload.get("annotator"), str) or not payload["annotator"]:
+        raise ValueError("annotator 必须是非空字符串")
+    if path == "/claim":
+        size = payload.get("size", Config.COORDINATION_BATCH_SIZE)
+        if not isinstance(size, int) or isinstance(size, bool):
+            raise ValueError("size 必须是整数")
+    elif path == "/submit":
+        changes = payload.get("changes", [])
+        if not isinstance(changes, list):
+            raise ValueError("changes 必须是列表")
+        for change in changes:
+            if not isinstance(change, dict):
+                raise ValueError(f"变更必须是JSON对象: {change!r}")
+            if not isinstance(change.get("path"), str) or not change["path"]:
+                raise ValueError(f"变更缺少 path: {change!r}")
+            if "category" not in change or not isinstance(change["category"], (str, type(None))):
+                raise ValueError(f"变更的 category 必须是字符串或 null: {change!r}")
+            if not isinstance(change.get("timestamp"), str):
+                raise ValueError(f"变更的 timestamp 必须是字符串: {change!r}")
+            category_index = change.get("category_index")
+            if category_index is not None and (not isinstance(category_index, int)
+                                               or isinstance(category_index, bool)):
+                raise ValueError(f"变更的 category_index 必须是整数或 null: {change!r}")
+    elif path == "/release":
+        paths = payload.get("paths", [])
+        if not isinstance(paths, list) or not all(isinstance(p, str) for p in paths):
+            raise ValueError("paths 必须是字符串列表")
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        coordinator = self.server.coordinator
+        routes = {"/status": coordinator.status, "/conflicts": coordinator.conflicts}
+        if self.path not in routes:
+            return self._reply(404, {"error": f"未知接口: {self.path}"})
+        self._reply(200, routes[self.path]())
+
+    def do_POST(self):
+        coordinator = self.server.coordinator
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            _check_payload(self.path, payload)
+            annotator = payload["annotator"]
+            if self.path == "/claim":
+                result = coordinator.claim(annotator, payload.get("size", Config.COORDINATION_BATCH_SIZE))
+            elif self.path == "/submit":
+                result = coordinator.submit(annotator, payload.get("changes", []))
+            elif self.path == "/release":
+                result = coordinator.release(annotator, payload.get("paths", []))
+            else:
+                return self._reply(404, {"error": f"未知接口: {self.path}"})
+        except (ValueError, KeyError, TypeError) as e:
+            return self._reply(400, {"error": f"请求格式错误: {e}"})
+        except Exception as e:
+            print(f"处理请求 {self.path} 失败: {e}")
+            return self._reply(500, {"error": f"服务器错误: {e}"})
+        self._reply(200, result)
+
+    def _reply(self, code, result):
+        body = json.dumps(result, ensure_ascii=False).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CoordinationClient:
+    """协调服务器客户端：标注先缓存在本地，flush() 时一次提交"""
+
+    def __init__(self, url, annotator=None, timeout=10):
+        self.url = url.rstrip("/")
+        self.annotator = annotator or default_annotator()
+        self.timeout = timeout
+        self.unsent = []  # 尚未提交成功的变更
+        self.claimed = []  # 当前批次的图片
+
+    def _call(self, path, payload=None):
+        data = None
+        if payload is not None:
+            data = json.dumps(dict(payload, annotator=self.annotator), ensure_ascii=False).encode("utf-8")
+        req = urlrequest.Request(self.url + path, data=data,
+                                 headers={"Content-Type": "application/json; charset=utf-8"})
+        try:
+            with urlrequest.urlopen(req, timeout=self.timeout) as response:
+                return json.loads(response.read())
+        except HTTPError as e:
+            raise RuntimeError(json.loads(e.read() or b"{}").get("error", str(e))) from e
+
+    def status(self):
+        return self._call("/status")
+
+    def claim(self, size=None):
+        result = self._call("/claim", {"size": size or Config.COORDINATION_BATCH_SIZE})
+        self.claimed = result["paths"]
+        return result
+
+    def release(self, paths):
+        return self._call("/release", {"paths": list(paths)})
+
+    def record_many(self, rel_paths, category, category_index, timestamp):
+        self.unsent.extend({"path": rel_path, "category": category, "category_index": category_index,
+                            "timestamp": timestamp} for rel_path in rel_paths)
+        return len(rel_paths)
+
+    def flush(self):
+        """提交缓存的变更，失败时保留到下次；返回服务器结果，无变更时返回None"""
+        if not self.unsent:
+            return None
+        changes, self.unsent = self.unsent, []
+        try:
+            return self._call("/submit", {"changes": changes})
+        except Exception:
+            self.unsent = changes + self.unsent
+            raise
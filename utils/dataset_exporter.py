@@ -1,10 +1,87 @@
 import os
+import re
+import zlib
+import array
+import itertools
 import shutil
 import json
+from json.encoder import encode_basestring
+import zipfile
+import tempfile
+import contextlib
 from pathlib import Path
 import random
 from config import Config
-from utils.file_utils import get_absolute_path
+from utils.file_utils import get_absolute_path, serializable_annotations_data, iter_labeled
+from utils.image_source import image_exists, image_stat, copy_image
+
+MANIFEST_SPLITS = ("train", "val")
+MANIFEST_FORMATS = ("csv", "jsonl", "npz")
+_WRITE_BUFFER = 1 << 20
+_CHUNK_ROWS = 65536  # 每次从存储中取出并写入的行数
+_CSV_SPECIAL = re.compile(r'[",\r\n]')
+
+
+def _csv_field(value):
+    """CSV字段（与 csv 模块的 QUOTE_MINIMAL 相同：含逗号、引号或换行时加引号）"""
+    if _CSV_SPECIAL.search(value) is None:
+        return value
+    return '"' + value.replace('"', '""') + '"'
+
+
+class _NpyColumn:
+    """一维数组列：按块追加到临时文件，导出结束时原样拷入NPZ（内存占用与行数无关）"""
+
+    def __init__(self, file_path, typecode):
+        self.file_path = file_path
+        self.typecode = typecode
+        self.count = 0
+        self._file = open(file_path, 'wb')
+
+    def extend(self, values):
+        values = array.array(self.typecode, values)
+        values.tofile(self._file)
+        self.count += len(values)
+
+    def extend_bytes(self, data):
+        self._file.write(data)
+        self.count += len(data)
+
+    def close(self):
+        self._file.close()
+
+
+def _write_npz(file_path, columns, strings):
+    """写入NPZ：columns 中的列从临时文件流式拷贝，strings 中的字符串（或字符串列表）直接写入"""
+    import numpy as np
+
+    with zipfile.ZipFile(file_path, 'w', zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for name, column in columns.items():
+            column.close()
+            header = {'descr': np.lib.format.dtype_to_descr(np.dtype(column.typecode)),
+                      'fortran_order': False, 'shape': (column.count,)}
+            with zf.open(name + ".npy", 'w', force_zip64=True) as out, open(column.file_path, 'rb') as f:
+                np.lib.format.write_array_header_1_0(out, header)
+                shutil.copyfileobj(f, out, _WRITE_BUFFER)
+        for name, value in strings.items():
+            with zf.open(name + ".npy", 'w') as out:
+                np.lib.format.write_array(out, np.asarray(value, dtype=str), allow_pickle=False)
+
+
+def _free_bytes(output_path):
+    """输出目录所在磁盘的可用空间，加上将被删除的旧导出占用的空间"""
+    existing = output_path
+    while not existing.exists() and existing.parent != existing:
+        existing = existing.parent
+    free_bytes = shutil.disk_usage(existing).free
+    if output_path.is_dir():
+        for dirpath, _, files in os.walk(output_path):
+            for name in files:
+                try:
+                    free_bytes += os.lstat(os.path.join(dirpath, name)).st_size
+                except OSError:
+                    pass
+    return free_bytes
 
 
 class DatasetExporter:
@@ -14,57 +91,91 @@ class DatasetExporter:
         self.train_ratio = Config.TRAIN_RATIO
         self.val_ratio = Config.VAL_RATIO
 
-    def export_dataset(self, annotations_data, output_dir, copy_images=True):
-        """导出数据集"""
+    def export_dataset(self, annotations_data, output_dir, copy_images=True, progress_callback=None,
+                       skip_images=None, metadata=None):
+        """导出数据集，progress_callback(done, total) 在每张图片处理后调用
+
+        skip_images 为需要跳过的相对路径集合（例如完整性检查发现损坏的图片）。
+        复制图片前先检查磁盘剩余空间；metadata 为 {图片绝对路径: ImageMetadata} 时在数据集信息中
+        加入分辨率和格式统计（便于预先规划缩放等处理）。
+        """
         try:
-            # 创建输出目录结构
             output_path = Path(output_dir)
             train_dir = output_path / "train"
             val_dir = output_path / "val"
 
-            # 清空并创建目录
-            if output_path.exists():
-                shutil.rmtree(output_path)
-
-            output_path.mkdir(parents=True, exist_ok=True)
-            train_dir.mkdir(exist_ok=True)
-            val_dir.mkdir(exist_ok=True)
-
             categories = annotations_data.get("categories", [])
             annotations = annotations_data.get("annotations", {})
             image_root = annotations_data.get("image_root", "")
 
-            # 为每个类别创建子目录
-            for category in categories:
-                (train_dir / category).mkdir(exist_ok=True)
-                (val_dir / category).mkdir(exist_ok=True)
-
             # 按类别分组图像
             categorized_images = {}
             missing_files = []
+            skipped_files = []
+            image_bytes = 0
+            unknown_categories = {}
+            known_categories = set(categories)
 
             for rel_path, annotation in annotations.items():
-                if annotation.get('category') and annotation['category'] in categories:
-                    category = annotation['category']
-                    abs_path = get_absolute_path(rel_path, image_root)
+                category = annotation.get('category')
+                if not category:
+                    continue
+                if category not in known_categories:
+                    # 类别已不在类别列表中（如旧文件中残留的名称），单独统计而不是静默丢弃
+                    unknown_categories[category] = unknown_categories.get(category, 0) + 1
+                    continue
+                if skip_images and rel_path in skip_images:
+                    skipped_files.append(rel_path)
+                    continue
+
+                abs_path = get_absolute_path(rel_path, image_root)
+                try:
+                    image_bytes += image_stat(abs_path)[0]
+                except OSError:
+                    missing_files.append((rel_path, abs_path))
+                    continue
+                if category not in categorized_images:
+                    categorized_images[category] = []
+                categorized_images[category].append((rel_path, abs_path))
 
-                    if os.path.exists(abs_path):
-                        if category not in categorized_images:
-                            categorized_images[category] = []
-                        categorized_images[category].append((rel_path, abs_path))
-                    else:
-                        missing_files.append((rel_path, abs_path))
+            if unknown_categories:
+                print(f"警告: {sum(unknown_categories.values())} 条标注的类别不在类别列表中，已跳过: "
+                      f"{', '.join(unknown_categories)}")
 
             if missing_files:
                 print(f"警告: 发现 {len(missing_files)} 个缺失的图片文件")
                 for rel_path, abs_path in missing_files:
                     print(f"  缺失: {rel_path} -> {abs_path}")
+            if skipped_files:
+                print(f"警告: 跳过 {len(skipped_files)} 张损坏的图片")
+
+            # 清空输出目录前检查磁盘空间（旧的导出会被删除，其占用计入可用空间），
+            # 空间不足时保留旧的导出，也避免复制到一半失败
+            if copy_images:
+                free_bytes = _free_bytes(output_path)
+                if image_bytes > free_bytes:
+                    return False, (f"磁盘空间不足: 需要 {image_bytes / 1024 ** 3:.2f} GB，"
+                                   f"可用 {free_bytes / 1024 ** 3:.2f} GB")
+
+            # 清空并创建目录结构
+            if output_path.exists():
+                shutil.rmtree(output_path)
+
+            output_path.mkdir(parents=True, exist_ok=True)
+            train_dir.mkdir(exist_ok=True)
+            val_dir.mkdir(exist_ok=True)
+
+            # 为每个类别创建子目录
+            for category in categories:
+                (train_dir / category).mkdir(exist_ok=True)
+                (val_dir / category).mkdir(exist_ok=True)
 
             # 统计信息
             total_images = 0
             train_count = 0
             val_count = 0
             category_stats = {}
+            total_to_export = sum(len(image_list) for image_list in categorized_images.values())
 
             # 为每个类别分割数据
             for category, image_list in categorized_images.items():
@@ -80,15 +191,19 @@ class DatasetExporter:
                 for rel_path, abs_path in train_images:
                     dest_path = train_dir / category / os.path.basename(abs_path)
                     if copy_images:
-                        shutil.copy2(abs_path, dest_path)
+                        copy_image(abs_path, dest_path)
                     train_count += 1
+                    if progress_callback:
+                        progress_callback(train_count + val_count, total_to_export)
 
                 # 复制验证集图像
                 for rel_path, abs_path in val_images:
                     dest_path = val_dir / category / os.path.basename(abs_path)
                     if copy_images:
-                        shutil.copy2(abs_path, dest_path)
+                        copy_image(abs_path, dest_path)
                     val_count += 1
+                    if progress_callback:
+                        progress_callback(train_count + val_count, total_to_export)
 
                 category_stats[category] = {
                     'total': num_images,
@@ -106,6 +221,7 @@ class DatasetExporter:
                 'train_images': train_count,
                 'val_images': val_count,
                 'missing_files': len(missing_files),
+                'skipped_files': len(skipped_files),
                 'split_ratio': {
                     'train': self.train_ratio,
                     'val': self.val_ratio
@@ -116,9 +232,17 @@ class DatasetExporter:
                     'source_annotations': len(annotations),
                     'source_image_root': image_root
                 },
+                'skipped_unknown_categories': unknown_categories,
                 'missing_files_list': [{"relative_path": rel, "expected_path": abs_path}
-                                       for rel, abs_path in missing_files]
+                                       for rel, abs_path in missing_files],
+                'skipped_files_list': skipped_files,
+                'image_bytes': image_bytes
             }
+            if metadata is not None:
+                from utils.image_metadata import summarize
+                dataset_info['image_summary'] = summarize(
+                    metadata[abs_path] for image_list in categorized_images.values()
+                    for _, abs_path in image_list if abs_path in metadata)
 
             # 保存数据集信息
             with open(output_path / "dataset_info.json", 'w', encoding='utf-8') as f:
@@ -130,7 +254,7 @@ class DatasetExporter:
                 json.dump(class_indices, f, ensure_ascii=False, indent=2)
 
             # 保存源标注文件的副本
-            source_annotations = annotations_data.copy()
+            source_annotations = serializable_annotations_data(annotations_data)
             with open(output_path / "source_annotations.json", 'w', encoding='utf-8') as f:
                 json.dump(source_annotations, f, ensure_ascii=False, indent=2)
 
@@ -140,11 +264,170 @@ class DatasetExporter:
             print(f"导出数据集失败: {e}")
             return False, str(e)
 
+    def export_manifest(self, annotations_data, output_dir, formats=MANIFEST_FORMATS, check_exists=False,
+                        progress_callback=None, skip_images=None):
+        """导出文件清单（不复制图片）：每个划分一个 CSV/JSONL 文件，以及全部样本的 manifest.npz
+
+        标注逐条从存储中读出并直接写入缓冲文件，内存占用与样本数无关。样本按相对路径的哈希
+        划分训练/验证集，重复导出结果相同。check_exists=True 时跳过不存在的图片，skip_images 中的
+        相对路径（例如损坏的图片）也会跳过。
+        CSV/JSONL 每行: path（完整路径）, relative_path, label, label_index。
+        manifest.npz: paths（相对路径UTF-8拼接）与 path_offsets（第i个路径为 paths[offsets[i]:offsets[i+1]]）、
+        labels（类别序号）、splits（0=训练, 1=验证）、categories、image_root。
+        """
+        try:
+            output_path = Path(output_dir)
+            output_path.mkdir(parents=True, exist_ok=True)
+
+            categories = annotations_data.get("categories", [])
+            annotations = annotations_data.get("annotations", {})
+            image_root = annotations_data.get("image_root", "")
+            positions = {category: idx for idx, category in enumerate(categories)}
+            # 每个类别的 CSV/JSON 行尾只生成一次
+            csv_suffixes = [f",{_csv_field(category)},{idx}\n" for idx, category in enumerate(categories)]
+            json_suffixes = [f', "label": {encode_basestring(category)}, "label_index": {idx}}}\n'
+                             for idx, category in enumerate(categories)]
+            threshold = self.train_ratio * 4294967296  # crc32 的取值范围
+            # 根目录前缀只计算一次，逐行拼接（与 get_absolute_path 结果相同）
+            root_prefix = get_absolute_path("", image_root) if image_root else ""
+
+            counts = [0, 0]
+            category_stats = {category: [0, 0] for category in categories}
+            unknown_categories = {}
+            missing_files = 0
+            skipped_files = 0
+            total = len(annotations)
+            done = 0
+
+            with contextlib.ExitStack() as stack:
+                csv_files = []
+                jsonl_files = []
+                for split in MANIFEST_SPLITS:
+                    if "csv" in formats:
+                        f = stack.enter_context(open(output_path / f"{split}.csv", 'w', encoding='utf-8',
+                                                     newline='', buffering=_WRITE_BUFFER))
+                        f.write("path,relative_path,label,label_index\n")
+                        csv_files.append(f)
+                    if "jsonl" in formats:
+                        jsonl_files.append(stack.enter_context(
+                            open(output_path / f"{split}.jsonl", 'w', encoding='utf-8', buffering=_WRITE_BUFFER)))
+
+                columns = None
+                if "npz" in formats:
+                    tmp_dir = stack.enter_context(tempfile.TemporaryDirectory(dir=output_path))
+                    columns = {
+                        "paths": _NpyColumn(os.path.join(tmp_dir, "paths"), 'B'),
+                        "path_offsets": _NpyColumn(os.path.join(tmp_dir, "path_offsets"), 'q'),
+                        "labels": _NpyColumn(os.path.join(tmp_dir, "labels"), 'i'),
+                        "splits": _NpyColumn(os.path.join(tmp_dir, "splits"), 'B'),
+                    }
+                    for column in columns.values():
+                        stack.callback(column.close)
+                    columns["path_offsets"].extend([0])
+                    blob_size = 0
+
+                rows = iter(iter_labeled(annotations))
+                while True:
+                    batch = list(itertools.islice(rows, _CHUNK_ROWS))
+                    if not batch:
+                        break
+                    done += len(batch)
+
+                    selected = ([], [])  # 每个划分: (完整路径, 相对路径, 类别, 类别序号)
+                    encoded_paths, labels, splits = [], [], []
+                    for rel_path, category in batch:
+                        idx = positions.get(category)
+                        if idx is None:
+                            unknown_categories[category] = unknown_categories.get(category, 0) + 1
+                            continue
+                        if skip_images and rel_path in skip_images:
+                            skipped_files += 1
+                            continue
+                        abs_path = rel_path if os.path.isabs(rel_path) else root_prefix + rel_path
+                        if check_exists and not image_exists(abs_path):
+                            missing_files += 1
+                            continue
+
+                        encoded = rel_path.encode('utf-8')
+                        split = 0 if zlib.crc32(encoded) < threshold else 1
+                        selected[split].append((abs_path, rel_path, category, idx))
+                        category_stats[category][split] += 1
+                        if columns is not None:
+                            encoded_paths.append(encoded)
+                            labels.append(idx)
+                            splits.append(split)
+
+                    for split, samples in enumerate(selected):
+                        counts[split] += len(samples)
+                        if csv_files:
+                            csv_files[split].write("".join(
+                                f"{_csv_field(abs_path)},{_csv_field(rel_path)}" + csv_suffixes[idx]
+                                for abs_path, rel_path, _, idx in samples))
+                        if jsonl_files:
+                            jsonl_files[split].write("".join(
+                                f'{{"path": {encode_basestring(abs_path)}, '
+                                f'"relative_path": {encode_basestring(rel_path)}' + json_suffixes[idx]
+                                for abs_path, rel_path, _, idx in samples))
+                    if columns is not None and labels:
+                        offsets = list(itertools.accumulate(map(len, encoded_paths), initial=blob_size))
+                        blob_size = offsets[-1]
+                        columns["paths"].extend_bytes(b"".join(encoded_paths))
+                        columns["path_offsets"].extend(offsets[1:])
+                        columns["labels"].extend(labels)
+                        columns["splits"].extend(splits)
+
+                    if progress_callback:
+                        progress_callback(done, total)
+
+                if columns is not None:
+                    _write_npz(output_path / "manifest.npz", columns,
+                               {"categories": categories, "image_root": image_root})
+
+            if progress_callback:
+                progress_callback(total, total)
+            if unknown_categories:
+                print(f"警告: {sum(unknown_categories.values())} 条标注的类别不在类别列表中，已跳过: "
+                      f"{', '.join(unknown_categories)}")
+            if missing_files:
+                print(f"警告: 跳过 {missing_files} 个缺失的图片文件")
+            if skipped_files:
+                print(f"警告: 跳过 {skipped_files} 张损坏的图片")
+
+            manifest_info = {
+                'name': 'Exported Manifest',
+                'categories': categories,
+                'num_classes': len(categories),
+                'total_images': counts[0] + counts[1],
+                'train_images': counts[0],
+                'val_images': counts[1],
+                'missing_files': missing_files,
+                'skipped_files': skipped_files,
+                'split_ratio': {
+                    'train': self.train_ratio,
+                    'val': self.val_ratio
+                },
+                'category_stats': {category: {'total': train + val, 'train': train, 'val': val}
+                                   for category, (train, val) in category_stats.items() if train + val},
+                'formats': [fmt for fmt in MANIFEST_FORMATS if fmt in formats],
+                'source_image_root': image_root,
+                'skipped_unknown_categories': unknown_categories,
+            }
+            with open(output_path / "manifest_info.json", 'w', encoding='utf-8') as f:
+                json.dump(manifest_info, f, ensure_ascii=False, indent=2)
+            with open(output_path / "class_indices.json", 'w', encoding='utf-8') as f:
+                json.dump(positions, f, ensure_ascii=False, indent=2)
+
+            return True, manifest_info
+
+        except Exception as e:
+            print(f"导出文件清单失败: {e}")
+            return False, str(e)
+
     def export_annotations_only(self, annotations_data, output_file):
         """仅导出标注文件"""
         try:
             with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(annotations_data, f, ensure_ascii=False, indent=2)
+                json.dump(serializable_annotations_data(annotations_data), f, ensure_ascii=False, indent=2)
             return True
         except Exception as e:
             print(f"导出标注文件失败: {e}")
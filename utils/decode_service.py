@@ -0,0 +1,245 @@
+import os
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+from config import Config
+from utils.memory_budget import memory_budget
+
+_SEGMENT_ALIGN = 1 << 20  # 共享内存段按1MB取整，便于不同尺寸的图片复用
+
+
+def _decode_worker(image_path, segment_name, capacity):
+    """在解码进程中运行：把图片解码为RGB写入共享内存段
+
+    返回 ("ok", 高, 宽)；段容量不足时只读文件头，返回 ("need", 字节数)；解码失败返回 ("error", 信息)
+    """
+    import io
+    import numpy as np
+    from PIL import Image
+    from utils.image_source import read_image_bytes
+    from utils.image_decoders import decoder_registry
+
+    try:
+        data = read_image_bytes(image_path)
+        width, height = Image.open(io.BytesIO(data)).size
+        nbytes = width * height * 3
+        if nbytes > capacity:
+            return "need", nbytes
+        pixels = decoder_registry().decode(data)
+        segment = shared_memory.SharedMemory(name=segment_name)
+        try:
+            target = np.ndarray((height, width, 3), dtype=np.uint8, buffer=segment.buf)
+            target[...] = pixels
+            del target
+        finally:
+            segment.close()
+        return "ok", height, width
+    except Exception as e:
+        return "error", str(e)
+
+
+def _unlink(segment):
+    try:
+        segment.close()
+    except BufferError:
+        pass  # 仍有数组引用这段内存，解除链接后由系统在引用释放时回收
+    try:
+        segment.unlink()
+    except OSError:
+        pass
+
+
+class SegmentPool:
+    """可复用的共享内存段；空闲段计入内存预算，预算不足时释放"""
+
+    def __init__(self, max_free_bytes=None):
+        self.max_free_bytes = max_free_bytes or Config.DECODE_SEGMENT_POOL_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        self._free = {}  # 段名 -> SharedMemory
+        self._budget = memory_budget.register("解码共享内存", self._evict)
+
+    def acquire(self, nbytes):
+        """取一个不小于 nbytes 的空闲段（取最小的），没有时新建"""
+        with self._lock:
+            fits = [s for s in self._free.values() if s.size >= nbytes]
+            segment = min(fits, key=lambda s: s.size) if fits else None
+            if segment is not None:
+                del self._free[segment.name]
+        if segment is not None:
+            self._budget.release(segment.name)
+            return segment
+        size = max(_SEGMENT_ALIGN, -(-nbytes // _SEGMENT_ALIGN) * _SEGMENT_ALIGN)
+        return shared_memory.SharedMemory(create=True, size=size)
+
+    def release(self, segment):
+        """归还段；空闲段总量超过上限时直接释放"""
+        name, size = segment.name, segment.size
+        with self._lock:
+            if sum(s.size for s in self._free.values()) + segment.size <= self.max_free_bytes:
+                self._free[segment.name] = segment
+                segment = None
+        if segment is None:
+            self._budget.charge(name, size)
+            return
+        _unlink(segment)
+
+    def _evict(self, name):
+        with self._lock:
+            segment = self._free.pop(name, None)
+        if segment is not None:
+            _unlink(segment)
+
+    def close(self):
+        with self._lock:
+            segments, self._free = list(self._free.values()), {}
+        for segment in segments:
+            _unlink(segment)
+        self._budget.close()
+
+
+class DecodedImage:
+    """解码结果：共享内存段上的RGB像素，使用完后需调用 release 归还段"""
+
+    def __init__(self, pool, segment, height, width):
+        self._pool = pool
+        self._segment = segment
+        self.shape = (height, width, 3)
+
+    @property
+    def array(self):
+        """直接指向共享内存的 numpy 数组（不复制）"""
+        import numpy as np
+        return np.ndarray(self.shape, dtype=np.uint8, buffer=self._segment.buf)
+
+    def release(self):
+        if self._segment is not None:
+            self._pool.release(self._segment)
+            self._segment = None
+
+
+class DecodeService:
+    """在进程池中解码大图，像素通过共享内存交回，避免大图解码占用界面进程的GIL
+
+    进程池第一次使用时才启动。解码进程崩溃（例如损坏的文件触发解码库错误）时重建进程池，
+    受影响的请求重试一次，再次崩溃则报告失败，不影响主程序。
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or Config.DECODE_WORKERS
+        self.pool = SegmentPool()
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def process_bytes(self, image_path):
+        """应在进程池中解码时返回解码后的字节数，否则返回0
+
+        扩展名在 Config.DECODE_PROCESS_FORMATS 中且像素数足够大时才使用进程池（只读文件头）
+        """
+        from utils.image_source import open_image
+
+        if os.path.splitext(image_path)[1].lower() not in Config.DECODE_PROCESS_FORMATS:
+            return 0
+        try:
+            with open_image(image_path) as pil_image:
+                width, height = pil_image.size
+        except Exception:
+            return 0  # 打不开的图片交给原有流程报告错误
+        return width * height * 3 if width * height >= Config.DECODE_PROCESS_MIN_PIXELS else 0
+
+    def _get_executor(self):
+        with self._lock:
+            if self._executor is None:
+                # 界面进程中有多个线程，不能 fork
+                self._executor = ProcessPoolExecutor(max_workers=self.max_workers,
+                                                     mp_context=multiprocessing.get_context("spawn"))
+            return self._executor
+
+    def _reset_executor(self, broken):
+        """进程池损坏后丢弃（多个请求同时发现时只重建一次）"""
+        with self._lock:
+            if self._executor is broken:
+                self._executor = None
+        broken.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, image_path, nbytes=0):
+        """提交解码请求，返回 Future，结果为 DecodedImage，失败时为 OSError
+
+        nbytes 为预计的解码后字节数（process_bytes 的结果），不足时解码进程会要求更大的段
+        """
+        future = Future()
+        self._submit(future, image_path, self.pool.acquire(nbytes), retried=False)
+        return future
+
+    def _submit(self, future, image_path, segment, retried):
+        executor = self._get_executor()
+        try:
+            task = executor.submit(_decode_worker, image_path, segment.name, segment.size)
+        except BrokenProcessPool:
+            self._on_broken(future, image_path, segment, retried, executor)
+            return
+        except RuntimeError as e:  # 已关闭
+            self.pool.release(segment)
+            future.set_exception(OSError(f"解码服务已关闭: {e}"))
+            return
+        task.add_done_callback(lambda t: self._on_done(future, image_path, segment, retried, executor, t))
+
+    def _on_done(self, future, image_path, segment, retried, executor, task):
+        try:
+            result = task.result()
+        except BrokenProcessPool:
+            self._on_broken(future, image_path, segment, retried, executor)
+            return
+        except Exception as e:
+            self.pool.release(segment)
+            future.set_exception(OSError(f"解码失败: {e}"))
+            return
+
+        if result[0] == "ok":
+            future.set_result(DecodedImage(self.pool, segment, result[1], result[2]))
+        elif result[0] == "need":
+            self.pool.release(segment)
+            self._submit(future, image_path, self.pool.acquire(result[1]), retried)
+        else:
+            self.pool.release(segment)
+            future.set_exception(OSError(result[1]))
+
+    def _on_broken(self, future, image_path, segment, retried, executor):
+        self._reset_executor(executor)
+        if retried:
+            self.pool.release(segment)
+            future.set_exception(OSError("解码进程异常退出（文件可能已损坏）"))
+            return
+        print(f"解码进程异常退出，重试: {image_path}")
+        self._submit(future, image_path, segment, retried=True)
+
+    def shutdown(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        self.pool.close()
+
+
+_service = None
+_service_lock = threading.Lock()
+
+
+def decode_service():
+    """全局解码服务"""
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = DecodeService()
+        return _service
+
+
+def shutdown_decode_service():
+    """退出前关闭解码进程并释放共享内存"""
+    global _service
+    with _service_lock:
+        service, _service = _service, None
+    if service is not None:
+        service.shutdown()
@@ -2,25 +2,27 @@ import os
 import json
 from pathlib import Path
 from config import Config
+from utils.image_source import iter_images, image_exists, is_archive, is_remote, member_path, ARCHIVE_SEPARATOR
 
 
-def get_image_files(folder_path):
-    """获取文件夹中的所有图像文件"""
-    image_files = []
+def iter_image_files(folder_path):
+    """逐个产出文件夹（或ZIP/TAR压缩包）中的图像文件（未排序）"""
+    return iter_images(folder_path)
 
-    if not os.path.exists(folder_path):
-        return image_files
 
-    for root, dirs, files in os.walk(folder_path):
-        for file in files:
-            if any(file.lower().endswith(ext) for ext in Config.SUPPORTED_FORMATS):
-                image_files.append(os.path.join(root, file))
-
-    return sorted(image_files)
+def get_image_files(folder_path):
+    """获取文件夹中的所有图像文件"""
+    return sorted(iter_image_files(folder_path))
 
 
 def get_relative_path(file_path, base_path):
-    """获取相对于基础路径的相对路径"""
+    """获取相对于基础路径的相对路径（以压缩包为基础路径时为成员名）"""
+    if file_path.startswith(base_path + ARCHIVE_SEPARATOR):
+        return file_path[len(base_path) + len(ARCHIVE_SEPARATOR):]
+    if is_remote(base_path):
+        # 远程路径始终以 / 分隔
+        prefix = base_path.rstrip("/") + "/"
+        return file_path[len(prefix):] if file_path.startswith(prefix) else file_path
     try:
         return os.path.relpath(file_path, base_path)
     except ValueError:
@@ -32,11 +34,30 @@ def get_absolute_path(relative_path, base_path):
     """根据相对路径和基础路径获取绝对路径"""
     if os.path.isabs(relative_path):
         return relative_path
+    if is_archive(base_path):
+        return member_path(base_path, relative_path)
+    if is_remote(base_path):
+        return base_path.rstrip("/") + "/" + relative_path.replace("\\", "/")
     return os.path.join(base_path, relative_path)
 
 
-def load_annotations(file_path):
-    """加载标注数据"""
+def load_annotations(file_path, compact=False, sharded=False):
+    """加载标注数据
+
+    compact=True 时 annotations 使用列式存储（ColumnarAnnotations），接口与字典相同；
+    file_path 为分片项目目录或 sharded=True 时 annotations 为 ShardedAnnotations（不存在时新建空项目）
+    """
+    if sharded or os.path.isdir(file_path):
+        return _load_sharded_project(file_path)
+
+    data = _load_annotations_dict(file_path)
+    if compact:
+        from utils.annotation_store import ColumnarAnnotations
+        data["annotations"] = ColumnarAnnotations.from_dict(data.get("annotations", {}))
+    return data
+
+
+def _load_annotations_dict(file_path):
     if os.path.exists(file_path):
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -53,7 +74,36 @@ def load_annotations(file_path):
         except Exception as e:
             print(f"加载标注文件失败: {e}")
 
-    # 返回默认格式
+    return default_annotations_data()
+
+
+def _load_sharded_project(project_dir):
+    from utils.sharded_store import ShardedAnnotations, is_sharded_project
+
+    if is_sharded_project(project_dir):
+        try:
+            store, data = ShardedAnnotations.open(project_dir)
+            data["annotations"] = store
+            return data
+        except Exception as e:
+            print(f"加载分片项目失败: {e}")
+    return new_annotations_data(sharded_dir=project_dir)
+
+
+def new_annotations_data(compact=False, sharded_dir=None):
+    """空的标注数据；sharded_dir 不为空时为新的分片项目（保存时才写入磁盘）"""
+    data = default_annotations_data()
+    if sharded_dir:
+        from utils.sharded_store import ShardedAnnotations
+        data["annotations"] = ShardedAnnotations.create(sharded_dir, categories=data["categories"])
+    elif compact:
+        from utils.annotation_store import ColumnarAnnotations
+        data["annotations"] = ColumnarAnnotations()
+    return data
+
+
+def default_annotations_data():
+    """默认格式的空标注数据"""
     return {
         "format_version": Config.ANNOTATION_FORMAT_VERSION,
         "categories": Config.DEFAULT_CATEGORIES.copy(),
@@ -117,7 +167,11 @@ def save_annotations(file_path, data, image_root=None):
         # 更新统计信息
         annotations = data.get("annotations", {})
         data["metadata"]["total_images"] = len(annotations)
-        data["metadata"]["annotated_images"] = len([a for a in annotations.values() if a.get("category")])
+        if hasattr(annotations, "category_counts"):
+            stats, _ = annotations.category_counts()
+            data["metadata"]["annotated_images"] = sum(n for c, n in stats.items() if c != '未标注')
+        else:
+            data["metadata"]["annotated_images"] = len([a for a in annotations.values() if a.get("category")])
 
         # 更新格式版本
         data["format_version"] = Config.ANNOTATION_FORMAT_VERSION
@@ -126,17 +180,140 @@ def save_annotations(file_path, data, image_root=None):
         if image_root:
             data["image_root"] = image_root
 
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        # 多个实例共用同一项目时按文件锁串行写入；先写临时文件再替换，读取方不会看到写了一半的文件
+        from utils.change_log import file_lock
+        with file_lock(file_path.rstrip("/\\") + ".lock"):
+            if hasattr(annotations, "save"):
+                # 分片项目：只写修改过的分片和索引
+                annotations.save(data)
+                return True
+
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            tmp_path = file_path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(serializable_annotations_data(data), f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, file_path)
         return True
     except Exception as e:
         print(f"保存标注文件失败: {e}")
         return False
 
 
-def get_annotation_stats(annotations):
-    """获取标注统计信息"""
+def serializable_annotations_data(data):
+    """返回可直接 json.dump 的标注数据（列式存储转换为普通字典）"""
+    annotations = data.get("annotations")
+    if annotations is not None and not isinstance(annotations, dict):
+        return dict(data, annotations=annotations.to_dict())
+    return data
+
+
+def apply_category_to_images(annotations, rel_paths, category_name, category_index, timestamp):
+    """把同一类别一次性写入多张图片的标注，返回写入数量"""
+    if hasattr(annotations, "assign"):
+        return annotations.assign(rel_paths, category_name, category_index, timestamp)
+    annotations.update({
+        rel_path: {
+            'category': category_name,
+            'category_index': category_index,
+            'timestamp': timestamp
+        }
+        for rel_path in rel_paths
+    })
+    return len(rel_paths)
+
+
+def insert_new_annotations(annotations, items):
+    """写入尚不存在的标注（流式加载时不覆盖加载期间新标注的图片），返回写入数量"""
+    if hasattr(annotations, "insert_new"):
+        return annotations.insert_new(items)
+    count = 0
+    for rel_path, annotation in items:
+        if rel_path not in annotations:
+            annotations[rel_path] = annotation
+            count += 1
+    return count
+
+
+def rename_category_in_annotations(annotations, old_name, new_name):
+    """重命名标注中的类别（新名称已存在时即合并），返回受影响的图片数"""
+    if hasattr(annotations, "rename_category"):
+        return annotations.rename_category(old_name, new_name)
+    return merge_categories_in_annotations(annotations, [old_name], new_name)
+
+
+def merge_categories_in_annotations(annotations, source_names, target_name):
+    """把若干类别的标注并入目标类别，返回受影响的图片数"""
+    if hasattr(annotations, "merge_categories"):
+        return annotations.merge_categories(source_names, target_name)
+    sources = set(source_names) - {target_name}
+    count = 0
+    for annotation in annotations.values():
+        if annotation.get('category') in sources:
+            annotation['category'] = target_name
+            count += 1
+    return count
+
+
+def delete_categories_from_annotations(annotations, names):
+    """删除这些类别的全部标注（图片变为未标注），返回删除数量"""
+    if hasattr(annotations, "delete_category"):
+        return sum(annotations.delete_category(name) for name in names)
+    names = set(names)
+    rel_paths = [p for p, a in annotations.items() if a.get('category') in names]
+    for rel_path in rel_paths:
+        del annotations[rel_path]
+    return len(rel_paths)
+
+
+def sync_category_indices(annotations, categories):
+    """类别列表变化后，按新顺序更新标注中的 category_index"""
+    if hasattr(annotations, "sync_category_indices"):
+        annotations.sync_category_indices(categories)
+        return
+    positions = {name: i for i, name in enumerate(categories)}
+    for annotation in annotations.values():
+        index = positions.get(annotation.get('category'))
+        if index is not None:
+            annotation['category_index'] = index
+
+
+def labeled_flags(annotations, rel_paths):
+    """批量判断图片是否已标注，返回与 rel_paths 等长的布尔序列"""
+    if hasattr(annotations, "labeled_mask"):
+        return annotations.labeled_mask(rel_paths).tolist()
+    flags = []
+    for rel_path in rel_paths:
+        annotation = annotations.get(rel_path)
+        flags.append(bool(annotation and annotation.get('category')))
+    return flags
+
+
+def image_categories(annotations, rel_paths):
+    """批量取图片的类别，未标注为 None，返回与 rel_paths 等长的列表"""
+    if hasattr(annotations, "categories_of"):
+        return annotations.categories_of(rel_paths)
+    categories = []
+    for rel_path in rel_paths:
+        annotation = annotations.get(rel_path)
+        categories.append((annotation and annotation.get('category')) or None)
+    return categories
+
+
+def iter_labeled(annotations):
+    """逐条产出已标注图片的 (相对路径, 类别)"""
+    if hasattr(annotations, "iter_labels"):
+        return annotations.iter_labels()
+    return ((rel_path, annotation.get('category')) for rel_path, annotation in annotations.items()
+            if annotation.get('category'))
+
+
+def get_annotation_stats(annotations, rel_paths=None):
+    """获取标注统计信息；rel_paths 不为空时只统计这些图片"""
+    if hasattr(annotations, "category_counts"):
+        return annotations.category_counts(rel_paths)
+    if rel_paths is not None:
+        annotations = {p: annotations[p] for p in rel_paths if p in annotations}
+
     stats = {}
     total = len(annotations)
 
@@ -155,18 +332,22 @@ def migrate_annotations_to_new_folder(annotations_data, old_root, new_root):
     # 更新图片根路径
     annotations_data["image_root"] = new_root
 
-    # 检查并更新不存在的图片路径
-    updated_annotations = {}
+    if hasattr(annotations_data["annotations"], "save"):
+        # 分片项目不逐条检查（需要加载全部分片），缺失的图片在打开对应目录时自然不会出现
+        return annotations_data, []
+
+    # 检查并更新不存在的图片路径（保持原有的存储类型）
+    updated_annotations = type(annotations_data["annotations"])()
     missing_files = []
 
     for rel_path, annotation in annotations_data["annotations"].items():
         old_abs_path = get_absolute_path(rel_path, old_root)
         new_abs_path = get_absolute_path(rel_path, new_root)
 
-        if os.path.exists(new_abs_path):
+        if image_exists(new_abs_path):
             # 图片存在于新位置
             updated_annotations[rel_path] = annotation
-        elif os.path.exists(old_abs_path):
+        elif image_exists(old_abs_path):
             # 图片仍在旧位置，需要用户手动移动
             missing_files.append((rel_path, old_abs_path, new_abs_path))
             updated_annotations[rel_path] = annotation
@@ -189,7 +370,7 @@ def validate_image_paths(annotations_data):
 
     for rel_path, annotation in annotations.items():
         abs_path = get_absolute_path(rel_path, image_root)
-        if os.path.exists(abs_path):
+        if image_exists(abs_path):
             valid_images.append((rel_path, abs_path))
         else:
             missing_images.append((rel_path, abs_path))
@@ -0,0 +1,281 @@
+"""图片解码后端：PIL、OpenCV、Qt
+
+所有后端输出相同：按文件中存储的方向（不应用EXIF旋转）、RGB顺序、8位的 (高, 宽, 3) numpy 数组。
+只有 RGB/灰度的 JPEG、PNG、BMP、WEBP 才会使用 OpenCV 或 Qt，其余（16位、CMYK、带调色板透明度、
+TIFF 等）始终由 PIL 解码。各格式、各尺寸档位使用哪个后端由本机上的小测试决定（首次使用时在后台运行，
+结果保存在 Config.DECODER_PROFILE_FILE），Config.DECODER_OVERRIDES 可以强制指定。
+"""
+import io
+import os
+import json
+import time
+import platform
+import threading
+import multiprocessing
+
+from config import Config
+
+# 可以在PIL之外选择其他后端的格式，以及这些后端需要的图片模式
+FAST_FORMATS = ("JPEG", "PNG", "BMP", "WEBP")
+FAST_MODES = ("RGB", "L")
+# 尺寸档位：(名称, 像素数上限, 测试图片尺寸)
+SIZE_CLASSES = (
+    ("small", 1_000_000, (1024, 768)),
+    ("medium", 8_000_000, (2448, 2048)),
+    ("large", None, (3500, 2400)),
+)
+_CALIBRATE_REPEAT = 2
+# 其他后端至少比 PIL 快这么多才选用，避免测试误差导致来回切换
+_MIN_SPEEDUP = 0.9
+
+
+def size_class(width, height):
+    pixels = width * height
+    for name, limit, _ in SIZE_CLASSES:
+        if limit is None or pixels < limit:
+            return name
+
+
+def _decode_pil(data, pil_image=None):
+    import numpy as np
+    from PIL import Image
+
+    if pil_image is None:
+        pil_image = Image.open(io.BytesIO(data))
+    if pil_image.mode != 'RGB':
+        pil_image = pil_image.convert('RGB')
+    return np.array(pil_image)
+
+
+def _decode_opencv(data, pil_image=None):
+    import cv2
+    import numpy as np
+
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR | cv2.IMREAD_IGNORE_ORIENTATION)
+    if image is None:
+        raise ValueError("OpenCV 无法解码")
+    return cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+
+
+def _decode_qt(data, pil_image=None):
+    import numpy as np
+    from PyQt6.QtGui import QImage
+
+    image = QImage.fromData(data)
+    if image.isNull():
+        raise ValueError("Qt 无法解码")
+    image = image.convertToFormat(QImage.Format.Format_RGB888)
+    width, height, stride = image.width(), image.height(), image.bytesPerLine()
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    rows = np.frombuffer(bits, np.uint8).reshape(height, stride)
+    return rows[:, :width * 3].reshape(height, width, 3).copy()
+
+
+def _opencv_available():
+    try:
+        import cv2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def _qt_available():
+    try:
+        from PyQt6.QtGui import QImage  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# 名称 -> (解码函数, 是否可用)
+BACKENDS = {
+    "pil": (_decode_pil, lambda: True),
+    "opencv": (_decode_opencv, _opencv_available),
+    "qt": (_decode_qt, _qt_available),
+}
+
+
+def available_backends():
+    return [name for name, (_, available) in BACKENDS.items()
+            if name in Config.DECODER_BACKENDS and available()]
+
+
+def machine_signature():
+    """本机与各解码库的版本；变化后需要重新测试"""
+    import PIL
+    signature = {"machine": platform.machine(), "system": platform.system(), "cpus": os.cpu_count(),
+                 "pillow": PIL.__version__}
+    if _opencv_available():
+        import cv2
+        signature["opencv"] = cv2.__version__
+    if _qt_available():
+        from PyQt6.QtCore import QT_VERSION_STR
+        signature["qt"] = QT_VERSION_STR
+    return signature
+
+
+def _sample_images(image_format, size):
+    """生成测试用的编码图片（渐变加噪声，压缩率接近普通照片）"""
+    import numpy as np
+    from PIL import Image
+
+    width, height = size
+    rng = np.random.default_rng(0)
+    pixels = np.empty((height, width, 3), dtype=np.uint8)
+    pixels[..., 0] = (np.arange(width) * 255 // max(1, width - 1))[None, :]
+    pixels[..., 1] = (np.arange(height) * 255 // max(1, height - 1))[:, None]
+    pixels[..., 2] = rng.integers(0, 64, (height, width), dtype=np.uint8)
+    options = {"JPEG": {"quality": 90}, "PNG": {"compress_level": 1}, "WEBP": {"quality": 90}}
+    buffer = io.BytesIO()
+    Image.fromarray(pixels).save(buffer, image_format, **options.get(image_format, {}))
+    return buffer.getvalue()
+
+
+def calibrate(progress_callback=None):
+    """在本机测试各后端的解码速度，返回 {格式: {尺寸档位: 最快的后端}}
+
+    只选用输出与 PIL 完全一致、且明显快于 PIL 的后端
+    """
+    import numpy as np
+
+    backends = available_backends()
+    steps = [(f, c) for f in FAST_FORMATS for c in SIZE_CLASSES]
+    table = {}
+    timings = {}
+    for step, (image_format, (class_name, _, size)) in enumerate(steps):
+        data = _sample_images(image_format, size)
+        reference = _decode_pil(data)
+        best, best_time, pil_time = "pil", None, None
+        for name in backends:
+            decode = BACKENDS[name][0]
+            try:
+                elapsed = []
+                for _ in range(_CALIBRATE_REPEAT):
+                    start = time.perf_counter()
+                    result = decode(data)
+                    elapsed.append(time.perf_counter() - start)
+            except Exception:
+                continue
+            if result.shape != reference.shape or not np.array_equal(result, reference):
+                continue
+            timings[f"{image_format}/{class_name}/{name}"] = round(min(elapsed) * 1000, 2)
+            if name == "pil":
+                pil_time = min(elapsed)
+            elif pil_time is not None and min(elapsed) > pil_time * _MIN_SPEEDUP:
+                continue
+            if best_time is None or min(elapsed) < best_time:
+                best, best_time = name, min(elapsed)
+        table.setdefault(image_format, {})[class_name] = best
+        if progress_callback:
+            progress_callback(step + 1, len(steps))
+    return table, timings
+
+
+def _calibrate_process(profile_file):
+    DecoderRegistry(profile_file).run_calibration()
+
+
+class DecoderRegistry:
+    """按格式和尺寸档位选择解码后端"""
+
+    def __init__(self, profile_file=None):
+        self.profile_file = profile_file or Config.DECODER_PROFILE_FILE
+        self.table = {}
+        self._lock = threading.Lock()
+        self._loaded = False
+
+    def load_profile(self):
+        """读取已保存的测试结果；不存在或与本机不符时返回 False"""
+        try:
+            with open(self.profile_file, 'r', encoding='utf-8') as f:
+                profile = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if profile.get("signature") != machine_signature():
+            return False
+        self.table = profile.get("table", {})
+        return True
+
+    def run_calibration(self, progress_callback=None):
+        """运行测试并保存结果，返回 (选择表, 各后端耗时ms)"""
+        table, timings = calibrate(progress_callback)
+        self.table = table
+        try:
+            os.makedirs(os.path.dirname(self.profile_file) or ".", exist_ok=True)
+            tmp_path = self.profile_file + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump({"signature": machine_signature(), "table": table, "timings_ms": timings},
+                          f, ensure_ascii=False, indent=2)
+            os.replace(tmp_path, self.profile_file)
+        except OSError as e:
+            print(f"保存解码后端测试结果失败: {e}")
+        return table, timings
+
+    def _ensure_profile(self):
+        """首次使用时读取测试结果；没有时在独立进程中测试（不占用界面进程的GIL），完成前使用PIL"""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            # 解码进程等子进程只读取结果，不重复测试
+            if (self.load_profile() or not Config.DECODER_AUTO_CALIBRATE
+                    or multiprocessing.parent_process() is not None):
+                return
+
+        process = multiprocessing.get_context("spawn").Process(
+            target=_calibrate_process, args=(self.profile_file,), name="decoder-calibration", daemon=True)
+        process.start()
+
+        def wait():
+            process.join()
+            if not self.load_profile():
+                print("解码后端测试失败，继续使用PIL")
+
+        threading.Thread(target=wait, name="decoder-calibration", daemon=True).start()
+
+    def choose(self, image_format, width, height):
+        """格式和尺寸对应的后端名称"""
+        self._ensure_profile()
+        overrides = Config.DECODER_OVERRIDES
+        name = overrides.get(image_format) or overrides.get("*")
+        if name is None:
+            name = self.table.get(image_format, {}).get(size_class(width, height), "pil")
+        if name not in BACKENDS or not BACKENDS[name][1]():
+            return "pil"
+        return name
+
+    def decode(self, data):
+        """把编码的图片数据解码为RGB数组"""
+        from PIL import Image
+
+        # PIL 只读文件头即可得到格式、尺寸和模式，不适合其他后端的图片直接由它解码
+        pil_image = Image.open(io.BytesIO(data))
+        if pil_image.format not in FAST_FORMATS or pil_image.mode not in FAST_MODES:
+            return _decode_pil(data, pil_image)
+        name = self.choose(pil_image.format, *pil_image.size)
+        if name != "pil":
+            try:
+                return BACKENDS[name][0](data)
+            except Exception as e:
+                print(f"{name} 解码失败，改用PIL: {e}")
+        return _decode_pil(data, pil_image)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def decoder_registry():
+    """全局解码后端选择"""
+    global _registry
+    with _registry_lock:
+        if _registry is None:
+            _registry = DecoderRegistry()
+        return _registry
+
+
+def decode_image(image_path):
+    """读取图片（本地、压缩包或远程）并解码为RGB数组"""
+    from utils.image_source import read_image_bytes
+    return decoder_registry().decode(read_image_bytes(image_path))
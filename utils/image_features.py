@@ -0,0 +1,170 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from PIL import Image
+from config import Config
+from utils.image_source import image_stat, open_image, canonical_path
+from utils.result_cache import ResultCache
+
+# 特征组成：8x8缩略图(RGB) + 每通道8个区间的颜色直方图
+TINY_SIZE = 8
+HIST_BINS = 8
+FEATURE_DIM = TINY_SIZE * TINY_SIZE * 3 + HIST_BINS * 3
+
+
+def compute_image_feature(image_path):
+    """计算单张图像的廉价特征向量（float32）"""
+    with open_image(image_path) as pil_image:
+        pil_image.draft('RGB', (64, 64))
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+        small = np.asarray(pil_image.resize((64, 64), Image.Resampling.BILINEAR), dtype=np.uint8)
+
+    tiny = small.reshape(TINY_SIZE, 64 // TINY_SIZE, TINY_SIZE, 64 // TINY_SIZE, 3).mean(axis=(1, 3))
+    tiny = tiny.ravel() / 255.0
+
+    bins = (small.reshape(-1, 3) // (256 // HIST_BINS)).astype(np.intp)
+    hist = np.zeros((3, HIST_BINS), dtype=np.float64)
+    for channel in range(3):
+        hist[channel] = np.bincount(bins[:, channel], minlength=HIST_BINS)
+    hist = hist.ravel() / bins.shape[0]
+
+    return np.concatenate([tiny, hist]).astype(np.float32)
+
+
+class FeatureCache(ResultCache):
+    """图像特征缓存（特征以float16保存）"""
+
+    NAME = "特征缓存"
+
+    def __init__(self, cache_file=None):
+        super().__init__(cache_file or Config.FEATURE_CACHE_FILE)
+
+    def _encode(self, features):
+        return {'features': (np.stack(features) if features else np.zeros((0, FEATURE_DIM))).astype(np.float16)}
+
+    def _decode(self, data):
+        if data['features'].shape[1] != FEATURE_DIM:
+            return None
+        return data['features'].astype(np.float32)
+
+    def get_or_compute(self, image_path):
+        """获取特征，缓存失效时重新计算；无法读取时返回None"""
+        abs_path = canonical_path(image_path)
+        try:
+            stat = image_stat(abs_path)
+        except OSError:
+            return None
+
+        feature = self._cached(abs_path, stat)
+        if feature is not None:
+            return feature
+
+        try:
+            feature = compute_image_feature(abs_path)
+        except Exception as e:
+            print(f"计算图像特征失败: {image_path}: {e}")
+            return None
+
+        self._store(abs_path, stat, feature)
+        return feature
+
+
+def compute_features(image_files, cache, max_workers=None, progress_callback=None):
+    """并行计算特征矩阵，返回 (features, valid_mask)"""
+    features = np.zeros((len(image_files), FEATURE_DIM), dtype=np.float32)
+    valid = np.zeros(len(image_files), dtype=bool)
+
+    with ThreadPoolExecutor(max_workers=max_workers or Config.FEATURE_WORKERS) as executor:
+        for i, feature in enumerate(executor.map(cache.get_or_compute, image_files)):
+            if feature is not None:
+                features[i] = feature
+                valid[i] = True
+            if progress_callback and (i + 1) % 200 == 0:
+                progress_callback(i + 1, len(image_files))
+
+    if progress_callback:
+        progress_callback(len(image_files), len(image_files))
+    return features, valid
+
+
+def _squared_distances(x, centers):
+    """x (n,d) 与 centers (k,d) 两两之间的平方欧氏距离"""
+    return (np.einsum('ij,ij->i', x, x)[:, None]
+            - 2.0 * x @ centers.T
+            + np.einsum('ij,ij->i', centers, centers)[None, :])
+
+
+def kmeans(features, k, iterations=10, seed=0, chunk_size=65536):
+    """向量化的k-means，返回 (labels, centers)"""
+    rng = np.random.default_rng(seed)
+    n = features.shape[0]
+    centers = features[rng.choice(n, size=k, replace=False)].copy()
+    labels = np.zeros(n, dtype=np.intp)
+
+    for _ in range(iterations):
+        # 分块计算距离，控制内存占用
+        for start in range(0, n, chunk_size):
+            block = features[start:start + chunk_size]
+            labels[start:start + chunk_size] = np.argmin(_squared_distances(block, centers), axis=1)
+
+        counts = np.bincount(labels, minlength=k)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, labels, features)
+        nonempty = counts > 0
+        centers[nonempty] = sums[nonempty] / counts[nonempty, None]
+
+    return labels, centers
+
+
+def nearest_neighbour_chain(features, start=0):
+    """最近邻链：从start出发，每次走到最近的未访问点"""
+    n = features.shape[0]
+    distances = _squared_distances(features, features)
+    visited = np.zeros(n, dtype=bool)
+    order = [start]
+    visited[start] = True
+    current = start
+    for _ in range(n - 1):
+        row = np.where(visited, np.inf, distances[current])
+        current = int(np.argmin(row))
+        visited[current] = True
+        order.append(current)
+    return np.array(order, dtype=np.intp)
+
+
+def similarity_order(features, max_chain_size=2000, seed=0):
+    """返回相似图像相邻的排列顺序（索引数组）"""
+    n = features.shape[0]
+    if n <= 2:
+        return np.arange(n)
+    if n <= max_chain_size:
+        return nearest_neighbour_chain(features)
+
+    # 先聚类，再按簇中心的最近邻链排列各簇，簇内继续链式排序
+    k = int(min(256, max(2, np.sqrt(n / 2))))
+    labels, centers = kmeans(features, k, seed=seed)
+    order = []
+    for cluster in nearest_neighbour_chain(centers):
+        members = np.flatnonzero(labels == cluster)
+        if members.size == 0:
+            continue
+        if members.size <= max_chain_size:
+            order.append(members[nearest_neighbour_chain(features[members])])
+        else:
+            # 簇过大时按到中心的距离排序
+            distances = _squared_distances(features[members], centers[cluster:cluster + 1])[:, 0]
+            order.append(members[np.argsort(distances, kind='stable')])
+    return np.concatenate(order)
+
+
+def order_images_by_similarity(image_files, cache=None, progress_callback=None):
+    """按图像相似度重新排列文件列表；无法读取的图像排在最后"""
+    cache = cache or FeatureCache()
+    features, valid = compute_features(image_files, cache, progress_callback=progress_callback)
+    cache.save()
+
+    valid_indices = np.flatnonzero(valid)
+    order = valid_indices[similarity_order(features[valid_indices])]
+    ordered = [image_files[i] for i in order]
+    ordered.extend(image_files[i] for i in np.flatnonzero(~valid))
+    return ordered
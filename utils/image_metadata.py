@@ -0,0 +1,166 @@
+import io
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from config import Config
+from utils.image_source import (image_stat, canonical_path, open_image, read_image_head, source_for,
+                                LOCAL_SOURCE)
+from utils.result_cache import ResultCache
+
+# 只读文件头得到的图片信息；orientation 为EXIF方向（1-8，没有时为1），file_size 为文件字节数
+ImageMetadata = namedtuple("ImageMetadata", "width height mode format orientation file_size")
+
+# 分辨率档位：(名称, 像素数上限)
+RESOLUTION_BUCKETS = (
+    ("< 0.3MP", 300_000),
+    ("0.3-1MP", 1_000_000),
+    ("1-4MP", 4_000_000),
+    ("4-12MP", 12_000_000),
+    ("12-24MP", 24_000_000),
+    (">= 24MP", None),
+)
+_EXIF_ORIENTATION = 0x0112
+_CHUNK_SIZE = 256
+
+
+class HeaderTooLarge(Exception):
+    """文件头超出读取范围（例如TIFF的IFD在文件末尾），不记入索引"""
+
+
+def _metadata_of(pil_image, file_size):
+    width, height = pil_image.size
+    try:
+        orientation = int(pil_image.getexif().get(_EXIF_ORIENTATION, 1))
+    except Exception:
+        orientation = 1
+    return ImageMetadata(width, height, pil_image.mode, pil_image.format or "", orientation, file_size)
+
+
+def read_metadata(image_path, file_size=0):
+    """读取图片尺寸、模式、格式和EXIF方向，不解码像素
+
+    本地文件由PIL按需读取；压缩包和远程图片只读取开头一段（远程为一次Range请求，不经过下载缓存），
+    不够解析时再读一次更长的一段，仍不够时抛出 HeaderTooLarge。
+    """
+    from PIL import Image
+
+    if source_for(image_path) is LOCAL_SOURCE:
+        with open_image(image_path) as pil_image:
+            return _metadata_of(pil_image, file_size)
+
+    length = Config.METADATA_HEADER_KB * 1024
+    for length in (length, length * 16):
+        head = read_image_head(image_path, length)
+        try:
+            with Image.open(io.BytesIO(head)) as pil_image:
+                return _metadata_of(pil_image, file_size)
+        except Exception:
+            if len(head) < length:
+                raise  # 已读到文件末尾，确实无法识别
+    raise HeaderTooLarge(image_path)
+
+
+def oriented_size(metadata):
+    """按EXIF方向旋转后的显示尺寸 (宽, 高)"""
+    if metadata.orientation in (5, 6, 7, 8):
+        return metadata.height, metadata.width
+    return metadata.width, metadata.height
+
+
+def resolution_bucket(metadata):
+    pixels = metadata.width * metadata.height
+    for name, limit in RESOLUTION_BUCKETS:
+        if limit is None or pixels < limit:
+            return name
+
+
+def summarize(metadata_list):
+    """汇总图片信息：格式、模式、分辨率分布、需要旋转的数量、总字节数和总像素数"""
+    formats, modes = {}, {}
+    resolutions = {name: 0 for name, _ in RESOLUTION_BUCKETS}
+    rotated = total_bytes = total_pixels = max_width = max_height = 0
+    count = 0
+    for metadata in metadata_list:
+        count += 1
+        formats[metadata.format] = formats.get(metadata.format, 0) + 1
+        modes[metadata.mode] = modes.get(metadata.mode, 0) + 1
+        resolutions[resolution_bucket(metadata)] += 1
+        rotated += metadata.orientation > 1
+        total_bytes += metadata.file_size
+        total_pixels += metadata.width * metadata.height
+        max_width = max(max_width, metadata.width)
+        max_height = max(max_height, metadata.height)
+    return {"images": count, "formats": formats, "modes": modes, "resolutions": resolutions,
+            "rotated": rotated, "total_bytes": total_bytes, "total_pixels": total_pixels,
+            "max_width": max_width, "max_height": max_height}
+
+
+class MetadataIndex(ResultCache):
+    """图片信息索引
+
+    无法读取的图片也会记录（宽高为0），文件变化前不再重复读取
+    """
+
+    NAME = "图片信息索引"
+
+    def __init__(self, cache_file=None):
+        super().__init__(cache_file or Config.METADATA_INDEX_FILE)
+
+    def _encode(self, entries):
+        return {'widths': np.array([m.width for m in entries], dtype=np.int32),
+                'heights': np.array([m.height for m in entries], dtype=np.int32),
+                'modes': np.array([m.mode for m in entries], dtype=str),
+                'formats': np.array([m.format for m in entries], dtype=str),
+                'orientations': np.array([m.orientation for m in entries], dtype=np.int8)}
+
+    def _decode(self, data):
+        return [ImageMetadata(int(width), int(height), str(mode), str(image_format), int(orientation), int(size))
+                for width, height, mode, image_format, orientation, size in zip(
+                    data['widths'], data['heights'], data['modes'], data['formats'],
+                    data['orientations'], data['sizes'])]
+
+    def get(self, image_path):
+        """获取图片信息，索引失效时重新读取文件头；无法读取时返回None"""
+        abs_path = canonical_path(image_path)
+        try:
+            stat = image_stat(abs_path)
+        except OSError:
+            return None
+
+        metadata = self._cached(abs_path, stat)
+        if metadata is None:
+            try:
+                metadata = read_metadata(abs_path, stat[0])
+            except HeaderTooLarge:
+                return None
+            except Exception:
+                metadata = ImageMetadata(0, 0, "", "", 1, stat[0])
+            self._store(abs_path, stat, metadata)
+        return metadata if metadata.width else None
+
+
+def index_metadata(image_files, index=None, progress_callback=None, cancelled=None, max_workers=None):
+    """并行读取图片信息，返回 {图片路径: ImageMetadata}（不包含无法读取的图片）
+
+    读取文件头主要是等待I/O，使用线程池。cancelled() 返回 True 时停止（已读取的结果仍写入索引）。
+    """
+    index = index if index is not None else MetadataIndex()
+    result = {}
+    done = 0
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers or Config.METADATA_WORKERS) as executor:
+            for start in range(0, len(image_files), _CHUNK_SIZE):
+                if cancelled and cancelled():
+                    break
+                chunk = image_files[start:start + _CHUNK_SIZE]
+                for image_path, metadata in zip(chunk, executor.map(index.get, chunk)):
+                    if metadata is not None:
+                        result[image_path] = metadata
+                done += len(chunk)
+                if progress_callback:
+                    progress_callback(done, len(image_files))
+    finally:
+        index.save()
+    return result
@@ -0,0 +1,369 @@
+import os
+import io
+import re
+import mmap
+import zlib
+import shutil
+import struct
+import hashlib
+import threading
+
+from config import Config
+
+# 远程对象存储的路径前缀（见 utils/remote_source.py）
+REMOTE_PREFIX = "s3://"
+
+# 压缩包成员的路径写作 "<压缩包路径>!/<成员名>"，以压缩包为图片根目录时标注键就是成员名
+ARCHIVE_SEPARATOR = "!/"
+ARCHIVE_SUFFIXES = ('.zip', '.tar')
+_MEMBER_PATTERN = re.compile(r'^(.*?\.(?:zip|tar))![/\\](.*)$', re.IGNORECASE | re.DOTALL)
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+
+def is_remote(path):
+    return path.startswith(REMOTE_PREFIX)
+
+
+def canonical_path(path):
+    """用作缓存键的规范路径：本地路径取绝对路径，远程路径不变"""
+    return path if is_remote(path) else os.path.abspath(path)
+
+
+def is_archive(path):
+    """路径是否为可直接浏览的压缩包（按扩展名判断；tar 须未压缩才能随机读取）"""
+    return path.lower().endswith(ARCHIVE_SUFFIXES) and ARCHIVE_SEPARATOR not in path
+
+
+def split_member_path(path):
+    """拆分压缩包成员路径，返回 (压缩包路径, 成员名)；普通文件返回 (None, path)"""
+    match = _MEMBER_PATTERN.match(path)
+    if match is None:
+        return None, path
+    return match.group(1), match.group(2).replace("\\", "/")
+
+
+def member_path(archive_path, member):
+    return archive_path + ARCHIVE_SEPARATOR + member
+
+
+def is_image_name(name):
+    return name.lower().endswith(tuple(Config.SUPPORTED_FORMATS))
+
+
+class ArchiveIndex:
+    """压缩包中图片成员的索引：成员名（排序）-> 数据偏移、压缩后大小、原始大小、压缩方式
+
+    ZIP 读取中央目录并解析各成员的本地文件头，TAR 记录各成员数据的偏移。索引按
+    (路径, 大小, 修改时间) 持久化到 Config.ARCHIVE_INDEX_DIR，之后打开无需再扫描压缩包。
+    成员数据通过 mmap 随机读取，存储或 deflate 压缩的成员不经过 zipfile。
+    """
+
+    def __init__(self, path, names, offsets, csizes, sizes, methods):
+        self.path = path
+        self.names = names
+        self.offsets = offsets
+        self.csizes = csizes
+        self.sizes = sizes
+        self.methods = methods
+        self.mtime_ns = os.stat(path).st_mtime_ns
+        self._file = None
+        self._map = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def open(cls, path):
+        """加载持久化的索引，不存在或已过期时扫描压缩包重建"""
+        import numpy as np
+
+        index_file = cls._index_file(path)
+        if os.path.exists(index_file):
+            try:
+                with np.load(index_file) as data:
+                    return cls(path, data["names"], data["offsets"], data["csizes"],
+                               data["sizes"], data["methods"])
+            except Exception as e:
+                print(f"读取压缩包索引失败，重新建立: {e}")
+
+        if path.lower().endswith('.zip'):
+            entries = _scan_zip(path)
+        else:
+            entries = _scan_tar(path)
+        entries.sort()
+        names = np.array([e[0] for e in entries], dtype=str)
+        columns = [np.array([e[i] for e in entries], dtype=np.int64) for i in range(1, 5)]
+        index = cls(path, names, *columns)
+
+        try:
+            os.makedirs(os.path.dirname(index_file), exist_ok=True)
+            tmp_file = index_file + ".tmp.npz"
+            np.savez(tmp_file, names=names, offsets=columns[0], csizes=columns[1],
+                     sizes=columns[2], methods=columns[3])
+            os.replace(tmp_file, index_file)
+        except OSError as e:
+            print(f"保存压缩包索引失败: {e}")
+        return index
+
+    @staticmethod
+    def _index_file(path):
+        st = os.stat(path)
+        raw = f"{os.path.abspath(path)}|{st.st_size}|{st.st_mtime_ns}"
+        return os.path.join(Config.ARCHIVE_INDEX_DIR, hashlib.sha1(raw.encode('utf-8')).hexdigest() + ".npz")
+
+    def __len__(self):
+        return len(self.names)
+
+    def find(self, name):
+        """成员在索引中的位置，不存在返回-1"""
+        import numpy as np
+
+        i = int(np.searchsorted(self.names, name))
+        return i if i < len(self.names) and self.names[i] == name else -1
+
+    def read(self, name):
+        i = self.find(name)
+        if i < 0:
+            raise FileNotFoundError(member_path(self.path, name))
+        with self._lock:
+            if self._map is None:
+                self._file = open(self.path, 'rb')
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        start = int(self.offsets[i])
+        data = self._map[start:start + int(self.csizes[i])]
+        method = int(self.methods[i])
+        if method == ZIP_STORED:
+            return data
+        if method == ZIP_DEFLATED:
+            return zlib.decompress(data, -15)
+        # 其他压缩方式（bzip2/lzma）交给 zipfile
+        import zipfile
+        with zipfile.ZipFile(self.path) as zf:
+            return zf.read(name)
+
+    def read_head(self, name, length):
+        """读取成员开头最多 length 字节，deflate 成员只解压需要的部分"""
+        i = self.find(name)
+        if i < 0:
+            raise FileNotFoundError(member_path(self.path, name))
+        method = int(self.methods[i])
+        if method not in (ZIP_STORED, ZIP_DEFLATED):
+            return self.read(name)[:length]
+        with self._lock:
+            if self._map is None:
+                self._file = open(self.path, 'rb')
+                self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        start, end = int(self.offsets[i]), int(self.offsets[i]) + int(self.csizes[i])
+        if method == ZIP_STORED:
+            return self._map[start:min(end, start + length)]
+        decompressor = zlib.decompressobj(-15)
+        head = b""
+        while start < end and len(head) < length and not decompressor.eof:
+            chunk = self._map[start:min(end, start + 64 * 1024)]
+            start += len(chunk)
+            head += decompressor.decompress(chunk, length - len(head))
+        return head
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._file.close()
+                self._map = self._file = None
+
+
+def _scan_zip(path):
+    """读取ZIP中央目录，返回 [(名称, 数据偏移, 压缩后大小, 原始大小, 压缩方式)]"""
+    import zipfile
+
+    entries = []
+    with zipfile.ZipFile(path) as zf, open(path, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            for info in zf.infolist():
+                if info.is_dir() or info.flag_bits & 0x1 or not is_image_name(info.filename):
+                    continue  # 目录、加密成员和非图片
+                # 本地文件头: 30字节固定部分 + 文件名 + 扩展字段
+                name_len, extra_len = struct.unpack_from('<HH', mapped, info.header_offset + 26)
+                data_offset = info.header_offset + 30 + name_len + extra_len
+                entries.append((info.filename, data_offset, info.compress_size, info.file_size,
+                                info.compress_type))
+    return entries
+
+
+def _scan_tar(path):
+    """遍历TAR成员头，返回与 _scan_zip 相同格式的列表（TAR不压缩）"""
+    import tarfile
+
+    entries = []
+    with tarfile.open(path, 'r:') as tf:
+        for info in tf:
+            if info.isfile() and is_image_name(info.name):
+                name = info.name
+                while name.startswith("./"):
+                    name = name[2:]
+                entries.append((name, info.offset_data, info.size, info.size, ZIP_STORED))
+            tf.members = []  # 不保留成员列表，大包也只占常量内存
+    return entries
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def open_archive(path):
+    """打开（或复用已打开的）压缩包索引；压缩包被修改后重新建立"""
+    key = os.path.abspath(path)
+    with _archives_lock:
+        index = _archives.get(key)
+        if index is not None and index.mtime_ns == os.stat(path).st_mtime_ns:
+            return index
+        if index is not None:
+            index.close()
+        index = _archives[key] = ArchiveIndex.open(path)
+        return index
+
+
+class LocalSource:
+    """本地文件系统"""
+
+    def iter_images(self, root):
+        if not os.path.exists(root):
+            return
+        supported = tuple(Config.SUPPORTED_FORMATS)
+        for dirpath, dirs, files in os.walk(root):
+            for file in files:
+                if file.lower().endswith(supported):
+                    yield os.path.join(dirpath, file)
+                elif Config.SCAN_ARCHIVES and is_archive(file):
+                    yield from ARCHIVE_SOURCE.iter_images(os.path.join(dirpath, file))
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def read_head(self, path, length):
+        """读取开头最多 length 字节（读取文件头用）"""
+        with open(path, 'rb') as f:
+            return f.read(length)
+
+    def stat(self, path):
+        """(大小, 修改时间ns)，用于缓存失效判断"""
+        st = os.stat(path)
+        return st.st_size, st.st_mtime_ns
+
+    def open_image(self, path):
+        from PIL import Image
+        return Image.open(path)
+
+    def copy(self, path, dest_path):
+        shutil.copy2(path, dest_path)
+
+    def prefetch(self, paths):
+        """提前读取即将使用的图片（本地文件无需预取）"""
+
+
+class ArchiveSource(LocalSource):
+    """ZIP/TAR 压缩包中的图片，路径形如 "<压缩包>!/<成员名>" """
+
+    def iter_images(self, root):
+        try:
+            index = open_archive(root)
+        except Exception as e:
+            print(f"读取压缩包失败: {root}: {e}")
+            return
+        for name in index.names:
+            yield member_path(root, str(name))
+
+    def _index(self, path):
+        """成员路径对应的 (索引, 成员名)；压缩包损坏等错误统一为 OSError"""
+        archive_path, member = split_member_path(path)
+        try:
+            return open_archive(archive_path), member
+        except OSError:
+            raise
+        except Exception as e:
+            raise OSError(f"无法读取压缩包 {archive_path}: {e}") from e
+
+    def exists(self, path):
+        try:
+            index, member = self._index(path)
+        except OSError:
+            return False
+        return index.find(member) >= 0
+
+    def read(self, path):
+        index, member = self._index(path)
+        return index.read(member)
+
+    def read_head(self, path, length):
+        index, member = self._index(path)
+        return index.read_head(member, length)
+
+    def stat(self, path):
+        index, member = self._index(path)
+        i = index.find(member)
+        if i < 0:
+            raise FileNotFoundError(path)
+        return int(index.sizes[i]), index.mtime_ns
+
+    def open_image(self, path):
+        from PIL import Image
+        return Image.open(io.BytesIO(self.read(path)))
+
+    def copy(self, path, dest_path):
+        with open(dest_path, 'wb') as f:
+            f.write(self.read(path))
+
+
+LOCAL_SOURCE = LocalSource()
+ARCHIVE_SOURCE = ArchiveSource()
+
+
+def source_for(path):
+    """路径对应的图片来源"""
+    if is_remote(path):
+        from utils.remote_source import remote_source
+        return remote_source()
+    if is_archive(path) or split_member_path(path)[0] is not None:
+        return ARCHIVE_SOURCE
+    return LOCAL_SOURCE
+
+
+def iter_images(root):
+    """逐个产出图片路径（文件夹或压缩包，未排序）"""
+    return source_for(root).iter_images(root)
+
+
+def image_exists(path):
+    return source_for(path).exists(path)
+
+
+def read_image_bytes(path):
+    return source_for(path).read(path)
+
+
+def read_image_head(path, length):
+    """读取图片开头最多 length 字节，远程对象只请求这一段"""
+    return source_for(path).read_head(path, length)
+
+
+def image_stat(path):
+    return source_for(path).stat(path)
+
+
+def open_image(path):
+    """打开图片（PIL.Image），压缩包成员直接从内存解码"""
+    return source_for(path).open_image(path)
+
+
+def copy_image(path, dest_path):
+    source_for(path).copy(path, dest_path)
+
+
+def prefetch_images(paths):
+    """提示来源即将读取这些图片（远程来源在后台下载到本地缓存）"""
+    if paths:
+        source_for(paths[0]).prefetch(paths)
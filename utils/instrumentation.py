@@ -0,0 +1,192 @@
+import os
+import json
+import math
+import time
+import threading
+from collections import deque
+from functools import wraps
+
+# 每个操作保留的最近耗时样本数 / 跟踪事件数上限
+MAX_SAMPLES = 10000
+MAX_TRACE_EVENTS = 200000
+
+
+class _NullSpan:
+    """关闭时使用的空计时段"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+class _Span:
+    """计时段，退出时记录耗时和跟踪事件"""
+
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        self.profiler.record(self.name, (end - self.start) * 1000, start=self.start)
+        return False
+
+
+def percentile(sorted_values, p):
+    """已排序序列的百分位数（最近秩）"""
+    if not sorted_values:
+        return 0.0
+    rank = math.ceil(p / 100 * len(sorted_values))
+    return sorted_values[min(len(sorted_values), max(1, rank)) - 1]
+
+
+class Profiler:
+    """热点路径计时、计数器与延迟直方图；关闭时开销仅为一次属性判断"""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._samples = {}  # 操作名 -> deque[耗时ms]
+        self._totals = {}  # 操作名 -> 调用次数
+        self._counters = {}
+        self._events = deque(maxlen=MAX_TRACE_EVENTS)
+        self._origin = time.perf_counter()
+        self._tracemalloc = False
+
+    def enable(self, enabled=True, tracemalloc_frames=0):
+        """开启/关闭统计；tracemalloc_frames > 0 时同时开启内存跟踪"""
+        self.enabled = enabled
+        if enabled and tracemalloc_frames > 0:
+            import tracemalloc
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(tracemalloc_frames)
+            self._tracemalloc = True
+        elif not enabled and self._tracemalloc:
+            import tracemalloc
+            tracemalloc.stop()
+            self._tracemalloc = False
+
+    def reset(self):
+        """清空已记录的数据"""
+        with self._lock:
+            self._samples.clear()
+            self._totals.clear()
+            self._counters.clear()
+            self._events.clear()
+
+    def span(self, name):
+        """计时段：with profiler.span("name"): ..."""
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def record(self, name, duration_ms, start=None):
+        """记录一次耗时（毫秒）"""
+        if not self.enabled:
+            return
+        if start is None:
+            start = time.perf_counter() - duration_ms / 1000
+        with self._lock:
+            samples = self._samples.get(name)
+            if samples is None:
+                samples = self._samples[name] = deque(maxlen=MAX_SAMPLES)
+            samples.append(duration_ms)
+            self._totals[name] = self._totals.get(name, 0) + 1
+            self._events.append((name, start, duration_ms, threading.get_ident()))
+
+    def count(self, name, n=1):
+        """累加计数器"""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def last(self, name):
+        """最近一次耗时，无记录时返回None"""
+        samples = self._samples.get(name)
+        return samples[-1] if samples else None
+
+    def stats(self):
+        """各操作的次数与 p50/p95/p99/max（毫秒）"""
+        with self._lock:
+            snapshot = {name: sorted(samples) for name, samples in self._samples.items()}
+            totals = dict(self._totals)
+        result = {}
+        for name, values in snapshot.items():
+            result[name] = {
+                "count": totals.get(name, len(values)),
+                "p50": percentile(values, 50),
+                "p95": percentile(values, 95),
+                "p99": percentile(values, 99),
+                "max": values[-1] if values else 0.0,
+                "mean": sum(values) / len(values) if values else 0.0,
+            }
+        return result
+
+    def counters(self):
+        with self._lock:
+            return dict(self._counters)
+
+    def memory_top(self, limit=20):
+        """tracemalloc 按代码行统计的内存占用前 limit 项"""
+        if not self._tracemalloc:
+            return []
+        import tracemalloc
+        snapshot = tracemalloc.take_snapshot()
+        return [{"location": str(stat.traceback), "size_kb": stat.size / 1024, "count": stat.count}
+                for stat in snapshot.statistics('lineno')[:limit]]
+
+    def export_chrome_trace(self, file_path):
+        """导出为 Chrome trace-event JSON（可用 chrome://tracing 或 Perfetto 打开）"""
+        with self._lock:
+            events = list(self._events)
+        pid = os.getpid()
+        trace_events = [{
+            "name": name,
+            "ph": "X",
+            "ts": (start - self._origin) * 1e6,
+            "dur": duration_ms * 1000,
+            "pid": pid,
+            "tid": tid,
+        } for name, start, duration_ms, tid in events]
+
+        data = {
+            "traceEvents": trace_events,
+            "displayTimeUnit": "ms",
+            "otherData": {
+                "stats": self.stats(),
+                "counters": self.counters(),
+                "memory_top": self.memory_top(),
+            },
+        }
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False)
+        return len(trace_events)
+
+
+# 全局统计实例
+profiler = Profiler()
+
+
+def timed_span(name):
+    """方法装饰器：统计开启时为调用计时"""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return func(*args, **kwargs)
+            with _Span(profiler, name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,191 @@
+import os
+import io
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+
+import numpy as np
+
+from config import Config
+from utils.image_source import image_stat, canonical_path, read_image_bytes, source_for, LOCAL_SOURCE
+from utils.result_cache import ResultCache
+
+# 检查级别：快速检查只看文件头和结束标记，完整检查解码全部像素
+QUICK = 1
+FULL = 2
+_TAIL_BYTES = 1024
+_HEAD_BYTES = 64 * 1024
+_BATCH_SIZE = 32
+MISSING = "文件不存在或无法读取"
+
+
+def _read_head_tail(image_path):
+    """读取文件开头和结尾（本地文件不读中间部分），返回 (开头, 结尾, 是否完整内容)"""
+    if source_for(image_path) is LOCAL_SOURCE:
+        with open(image_path, 'rb') as f:
+            head = f.read(_HEAD_BYTES)
+            size = f.seek(0, os.SEEK_END)
+            if size <= _HEAD_BYTES:
+                return head, head, True
+            f.seek(max(0, size - _TAIL_BYTES))
+            return head, f.read(), False
+    data = read_image_bytes(image_path)
+    return data, data[-_TAIL_BYTES:], True
+
+
+def check_image(image_path, level=FULL):
+    """检查一张图片，正常返回 None，否则返回问题描述"""
+    from PIL import Image, UnidentifiedImageError
+
+    try:
+        if level == QUICK:
+            head, tail, complete = _read_head_tail(image_path)
+            if not head:
+                return "文件为空"
+            pil_image = Image.open(io.BytesIO(head))
+            if pil_image.format == "JPEG" and b"\xff\xd9" not in tail:
+                return "JPEG 缺少结束标记（文件可能被截断）"
+            if pil_image.format == "PNG" and b"IEND" not in tail:
+                return "PNG 缺少 IEND 块（文件可能被截断）"
+            if complete and pil_image.format not in ("JPEG", "PNG"):
+                pil_image.verify()
+            return None
+
+        # 完整检查使用 PIL 解码：截断或数据损坏时报错（OpenCV 会静默返回不完整的图像）
+        with Image.open(io.BytesIO(read_image_bytes(image_path))) as pil_image:
+            pil_image.load()
+        return None
+    except UnidentifiedImageError:
+        return "无法识别的图片格式"
+    except Exception as e:
+        return str(e) or type(e).__name__
+
+
+def _check_batch(image_paths, level):
+    """在检查进程中运行"""
+    return [(image_path, check_image(image_path, level)) for image_path in image_paths]
+
+
+class IntegrityCache(ResultCache):
+    """检查结果缓存，结果为 (级别, 问题描述或'')
+
+    完整检查的结果同时满足快速检查；只做过快速检查的图片在完整检查时会重新检查
+    """
+
+    NAME = "完整性检查缓存"
+
+    def __init__(self, cache_file=None):
+        super().__init__(cache_file or Config.INTEGRITY_CACHE_FILE)
+
+    def _encode(self, results):
+        return {'levels': np.array([r[0] for r in results], dtype=np.int8),
+                'messages': np.array([r[1] for r in results], dtype=str)}
+
+    def _decode(self, data):
+        return [(int(level), str(message)) for level, message in zip(data['levels'], data['messages'])]
+
+    def lookup(self, abs_path, stat, level):
+        """缓存有效时返回 (True, 问题描述或None)"""
+        result = self._cached(abs_path, stat)
+        if result and result[0] >= level:
+            return True, result[1] or None
+        return False, None
+
+    def store(self, abs_path, stat, level, message):
+        self._store(abs_path, stat, (level, message or ''))
+
+
+def scan_images(image_paths, level=FULL, cache=None, progress_callback=None, cancelled=None, max_workers=None):
+    """在进程池中检查图片，返回 {图片路径: 问题描述}（只包含有问题的图片）
+
+    已检查过且文件未变化的图片直接使用缓存结果；无法读取大小和修改时间的图片视为缺失。
+    检查进程崩溃（例如解码库处理损坏文件时出错）时重建进程池并逐张重试，
+    单独检查仍然崩溃的图片记为损坏。cancelled() 返回 True 时尽快停止（已完成的结果仍会缓存）。
+    """
+    cache = cache if cache is not None else IntegrityCache()
+    total = len(image_paths)
+    bad = {}
+    done = 0
+    pending = []  # [(图片路径, 绝对路径, stat)]
+
+    for image_path in image_paths:
+        abs_path = canonical_path(image_path)
+        try:
+            stat = image_stat(abs_path)
+        except OSError:
+            bad[image_path] = MISSING
+            done += 1
+            continue
+        hit, message = cache.lookup(abs_path, stat, level)
+        if hit:
+            done += 1
+            if message:
+                bad[image_path] = message
+        else:
+            pending.append((image_path, abs_path, stat))
+    if progress_callback:
+        progress_callback(done, total)
+
+    by_path = {item[0]: item for item in pending}
+    queue = [[item[0] for item in pending[i:i + _BATCH_SIZE]] for i in range(0, len(pending), _BATCH_SIZE)]
+    suspects = []  # 所在批次遇到进程崩溃的图片，逐张单独检查
+    max_workers = max_workers or Config.INTEGRITY_WORKERS or os.cpu_count() or 1
+    context = multiprocessing.get_context("spawn")
+    executor = None
+
+    def record(results):
+        nonlocal done
+        for image_path, message in results:
+            _, abs_path, stat = by_path[image_path]
+            cache.store(abs_path, stat, level, message)
+            if message:
+                bad[image_path] = message
+        done += len(results)
+        if progress_callback:
+            progress_callback(done, total)
+
+    try:
+        while (queue or suspects) and not (cancelled and cancelled()):
+            if executor is None:
+                executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+            if not queue:
+                # 每次只运行一张，进程崩溃时就能确定是哪张图片
+                image_path = suspects.pop()
+                try:
+                    record(executor.submit(_check_batch, [image_path], level).result())
+                except BrokenProcessPool:
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = None
+                    record([(image_path, "检查进程崩溃（文件可能已损坏）")])
+                continue
+
+            # 同时提交的批次有限，取消时不必等待大量排队的任务
+            running = {}
+            while queue or running:
+                while queue and len(running) < max_workers * 2 and not (cancelled and cancelled()):
+                    batch = queue.pop()
+                    running[executor.submit(_check_batch, batch, level)] = batch
+                if not running:
+                    break
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                broken = False
+                for future in finished:
+                    batch = running.pop(future)
+                    try:
+                        record(future.result())
+                    except BrokenProcessPool:
+                        suspects.extend(batch)
+                        broken = True
+                if broken:
+                    # 进程池已损坏，其余正在运行的批次也无法完成
+                    for batch in running.values():
+                        suspects.extend(batch)
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    executor = None
+                    break
+    finally:
+        if executor is not None:
+            executor.shutdown(wait=True, cancel_futures=True)
+        cache.save()
+    return bad
@@ -0,0 +1,194 @@
+import os
+import threading
+from itertools import islice
+from collections import OrderedDict
+
+from config import Config
+from utils.instrumentation import profiler
+
+
+def available_memory():
+    """系统当前可用内存（字节），无法获取时返回None"""
+    try:
+        with open("/proc/meminfo", "r") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        return os.sysconf("SC_AVPHYS_PAGES") * os.sysconf("SC_PAGE_SIZE")
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+class BudgetAccount:
+    """某个缓存在内存预算中的账户；条目按最近使用排序"""
+
+    def __init__(self, budget, name, evict, weight):
+        self.budget = budget
+        self.name = name
+        self.evict = evict
+        self.weight = weight
+        self.entries = OrderedDict()  # 键 -> [字节数, 优先级, 序号]
+        self.bytes = 0
+        self.closed = False
+
+    def charge(self, key, nbytes):
+        """新增或更新条目（视为一次访问），超出预算时淘汰其他条目"""
+        self.budget._charge(self, key, nbytes)
+
+    def touch(self, key):
+        """缓存命中时调用，刷新条目的优先级"""
+        self.budget._touch(self, key)
+
+    def release(self, *keys):
+        """缓存自行删除条目时调用（已被预算淘汰的键会被忽略）"""
+        self.budget._release(self, keys)
+
+    def clear(self):
+        self.budget._release(self, list(self.entries))
+
+    def close(self):
+        """缓存销毁时注销账户，之后的 charge 会被忽略"""
+        self.budget._unregister(self)
+
+
+class MemoryBudget:
+    """图片、QPixmap、缩略图等缓存共用的内存预算
+
+    缓存通过 register 注册账户并在新增、命中、删除条目时通知预算；总量超出上限时在所有缓存之间
+    统一淘汰。淘汰顺序按 GreedyDual：条目优先级为访问时的基准值加所属缓存的权重（重新生成的代价，
+    例如解码大图高于读取缩略图），淘汰优先级最低的条目后基准值提升到它的优先级，因此代价高的条目
+    保留更久，长期未访问的条目最终都会被淘汰。淘汰回调在锁外调用，可能来自任意线程。
+    """
+
+    def __init__(self, limit_bytes=None):
+        self.limit = limit_bytes if limit_bytes is not None else Config.MEMORY_BUDGET_MB * 1024 * 1024
+        self._lock = threading.Lock()
+        self._accounts = []
+        self._total = 0
+        self._base = 0.0  # GreedyDual 基准值
+        self._seq = 0
+        self.evicted_bytes = 0
+
+    def register(self, name, evict=None, weight=1.0):
+        """注册缓存账户；evict(key) 为空时条目只计入统计，不会被淘汰（例如当前显示的图片）"""
+        account = BudgetAccount(self, name, evict, weight)
+        with self._lock:
+            self._accounts.append(account)
+        return account
+
+    def _unregister(self, account):
+        with self._lock:
+            account.closed = True
+            if account in self._accounts:
+                self._accounts.remove(account)
+                self._total -= account.bytes
+                account.entries.clear()
+                account.bytes = 0
+
+    def _priority(self, account):
+        self._seq += 1
+        return self._base + account.weight, self._seq
+
+    def _charge(self, account, key, nbytes):
+        with self._lock:
+            if account.closed:
+                return
+            entry = account.entries.pop(key, None)
+            if entry is not None:
+                account.bytes -= entry[0]
+                self._total -= entry[0]
+            account.entries[key] = [nbytes, *self._priority(account)]
+            account.bytes += nbytes
+            self._total += nbytes
+            victims = self._select_victims(self.limit, keep=(account, key))
+        self._evict(victims)
+
+    def _touch(self, account, key):
+        with self._lock:
+            entry = account.entries.get(key)
+            if entry is not None:
+                entry[1:] = self._priority(account)
+                account.entries.move_to_end(key)
+
+    def _release(self, account, keys):
+        with self._lock:
+            for key in keys:
+                entry = account.entries.pop(key, None)
+                if entry is not None:
+                    account.bytes -= entry[0]
+                    self._total -= entry[0]
+
+    def _select_victims(self, target, keep=None):
+        """在锁内选出需要淘汰的条目并从账户中移除，直到总量不超过 target"""
+        victims = []
+        while self._total > target:
+            best = None
+            for account in self._accounts:
+                if account.evict is None or not account.entries:
+                    continue
+                # 同一账户内优先级随访问顺序递增，只需比较各账户最早的条目
+                key, entry = next(iter(account.entries.items()))
+                if (account, key) == keep:
+                    if len(account.entries) == 1:
+                        continue
+                    key, entry = next(islice(account.entries.items(), 1, None))
+                if best is None or entry[1:] < best[2][1:]:
+                    best = (account, key, entry)
+            if best is None:
+                break
+            account, key, entry = best
+            del account.entries[key]
+            account.bytes -= entry[0]
+            self._total -= entry[0]
+            self._base = entry[1]
+            victims.append((account, key, entry[0]))
+        return victims
+
+    def _evict(self, victims):
+        if not victims:
+            return
+        freed = sum(nbytes for _, _, nbytes in victims)
+        self.evicted_bytes += freed
+        profiler.count("memory_evictions", len(victims))
+        profiler.count("memory_evicted_bytes", freed)
+        for account, key, _ in victims:
+            try:
+                account.evict(key)
+            except Exception as e:
+                print(f"淘汰缓存失败: {account.name}: {e}")
+
+    def trim(self, target_bytes):
+        """淘汰到总量不超过 target_bytes，返回释放的字节数"""
+        with self._lock:
+            victims = self._select_victims(max(0, target_bytes))
+        self._evict(victims)
+        return sum(nbytes for _, _, nbytes in victims)
+
+    def set_limit(self, limit_bytes):
+        self.limit = limit_bytes
+        return self.trim(limit_bytes)
+
+    def check_pressure(self):
+        """系统可用内存低于 Config.MEMORY_PRESSURE_MB 时把缓存淘汰到一半，返回释放的字节数"""
+        available = available_memory()
+        if available is None or available >= Config.MEMORY_PRESSURE_MB * 1024 * 1024:
+            return 0
+        return self.trim(self._total // 2)
+
+    def total(self):
+        return self._total
+
+    def usage(self):
+        """各缓存当前占用的字节数（同名账户合并）"""
+        result = {}
+        with self._lock:
+            for account in self._accounts:
+                result[account.name] = result.get(account.name, 0) + account.bytes
+        return result
+
+
+# 全局内存预算
+memory_budget = MemoryBudget()
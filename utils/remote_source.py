@@ -0,0 +1,480 @@
+import os
+import io
+import hmac
+import time
+import queue
+import hashlib
+import datetime
+import threading
+import contextlib
+import http.client
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, quote
+from xml.etree import ElementTree
+
+from config import Config
+from utils.image_source import LocalSource, is_image_name, REMOTE_PREFIX
+
+
+class RemoteError(OSError):
+    """对象存储返回错误"""
+
+
+def split_remote_path(path):
+    """"s3://桶/键" -> (桶, 键)"""
+    bucket, _, key = path[len(REMOTE_PREFIX):].partition("/")
+    return bucket, key
+
+
+def _hmac(key, msg):
+    return hmac.new(key, msg.encode("utf-8"), hashlib.sha256).digest()
+
+
+def _quote(value, safe="-_.~"):
+    return quote(value, safe=safe)
+
+
+def sign_v4(method, host, path, query, headers, region, access_key, secret_key, now,
+            payload_hash="UNSIGNED-PAYLOAD"):
+    """AWS Signature Version 4：返回加上 x-amz-* 和 Authorization 的请求头（path 为未编码的路径）"""
+    amz_date = now.strftime("%Y%m%dT%H%M%SZ")
+    date = amz_date[:8]
+    headers = {k.lower(): str(v).strip() for k, v in headers.items()}
+    headers.update({"host": host, "x-amz-content-sha256": payload_hash, "x-amz-date": amz_date})
+
+    signed_headers = ";".join(sorted(headers))
+    canonical_request = "\n".join([
+        method,
+        _quote(path, safe="/-_.~"),
+        "&".join(f"{_quote(k)}={_quote(v)}" for k, v in sorted(query.items())),
+        "".join(f"{k}:{headers[k]}\n" for k in sorted(headers)),
+        signed_headers,
+        payload_hash,
+    ])
+    scope = f"{date}/{region}/s3/aws4_request"
+    string_to_sign = "\n".join(["AWS4-HMAC-SHA256", amz_date, scope,
+                                hashlib.sha256(canonical_request.encode("utf-8")).hexdigest()])
+    key = _hmac(("AWS4" + secret_key).encode("utf-8"), date)
+    for part in (region, "s3", "aws4_request"):
+        key = _hmac(key, part)
+    signature = hmac.new(key, string_to_sign.encode("utf-8"), hashlib.sha256).hexdigest()
+    headers["authorization"] = (f"AWS4-HMAC-SHA256 Credential={access_key}/{scope}, "
+                                f"SignedHeaders={signed_headers}, Signature={signature}")
+    return headers
+
+
+class ConnectionPool:
+    """保持连接（keep-alive）的HTTP连接池，最多 size 个并发连接"""
+
+    def __init__(self, scheme, host, port, size, timeout=30):
+        self.connection_class = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    @contextlib.contextmanager
+    def connection(self):
+        self._slots.acquire()
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            conn = self.connection_class(self.host, self.port, timeout=self.timeout)
+        reusable = False
+        try:
+            yield conn
+            reusable = True
+        finally:
+            if reusable:
+                self._idle.put(conn)
+            else:
+                conn.close()
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class S3Client:
+    """S3兼容对象存储的最小客户端（路径式寻址，SigV4签名，未配置密钥时匿名访问）"""
+
+    def __init__(self, endpoint_url=None, region=None, access_key=None, secret_key=None, max_connections=None):
+        self.region = region or Config.S3_REGION
+        endpoint_url = endpoint_url or Config.S3_ENDPOINT_URL or f"https://s3.{self.region}.amazonaws.com"
+        parts = urlsplit(endpoint_url)
+        self.scheme = parts.scheme or "https"
+        self.host = parts.netloc
+        self.base_path = parts.path.rstrip("/")
+        self.access_key = Config.S3_ACCESS_KEY if access_key is None else access_key
+        self.secret_key = Config.S3_SECRET_KEY if secret_key is None else secret_key
+        self.pool = ConnectionPool(self.scheme, parts.hostname, parts.port,
+                                   max_connections or Config.S3_MAX_CONNECTIONS)
+
+    def request(self, method, bucket, key="", query=None, headers=None):
+        """发送请求，返回 (状态码, 响应头, 响应体)；连接池中的连接失效时重试一次"""
+        query = query or {}
+        path = f"{self.base_path}/{bucket}" + (f"/{key}" if key else "")
+        headers = dict(headers or {})
+        if self.access_key:
+            headers = sign_v4(method, self.host, path, query, headers, self.region,
+                              self.access_key, self.secret_key, datetime.datetime.now(datetime.timezone.utc))
+        else:
+            headers["host"] = self.host
+        url = _quote(path, safe="/-_.~")
+        if query:
+            url += "?" + "&".join(f"{_quote(k)}={_quote(v)}" for k, v in sorted(query.items()))
+
+        for attempt in range(2):
+            try:
+                with self.pool.connection() as conn:
+                    conn.request(method, url, headers=headers)
+                    response = conn.getresponse()
+                    body = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError) as e:
+                if attempt:
+                    raise RemoteError(f"连接对象存储失败: {e}") from e
+
+        if response.status == 404:
+            raise FileNotFoundError(f"{REMOTE_PREFIX}{bucket}/{key}")
+        if response.status >= 300:
+            raise RemoteError(f"对象存储返回 {response.status}: {_error_code(body)}")
+        return response.status, response.headers, body
+
+    def list_objects(self, bucket, prefix="", page_size=1000):
+        """分页列出对象，逐个产出 (键, 大小, 修改时间ns)"""
+        token = None
+        while True:
+            query = {"list-type": "2", "prefix": prefix, "max-keys": str(page_size)}
+            if token:
+                query["continuation-token"] = token
+            _, _, body = self.request("GET", bucket, query=query)
+            root = ElementTree.fromstring(body)
+            for item in _children(root, "Contents"):
+                yield (_text(item, "Key"), int(_text(item, "Size") or 0),
+                       _parse_time(_text(item, "LastModified")))
+            if _text(root, "IsTruncated") != "true":
+                return
+            token = _text(root, "NextContinuationToken")
+            if not token:
+                return
+
+    def head_object(self, bucket, key):
+        """返回 (大小, 修改时间ns)"""
+        _, headers, _ = self.request("HEAD", bucket, key)
+        modified = headers.get("Last-Modified")
+        mtime_ns = 0
+        if modified:
+            from email.utils import parsedate_to_datetime
+            mtime_ns = int(parsedate_to_datetime(modified).timestamp() * 1e9)
+        return int(headers.get("Content-Length", 0)), mtime_ns
+
+    def get_object(self, bucket, key, start=None, end=None):
+        """下载对象；给出 start/end 时只下载该字节范围（含 end）"""
+        headers = {}
+        if start is not None:
+            headers["Range"] = f"bytes={start}-{'' if end is None else end}"
+        _, _, body = self.request("GET", bucket, key, headers=headers)
+        return body
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _children(element, name):
+    return [child for child in element if _local_name(child.tag) == name]
+
+
+def _text(element, name):
+    for child in element:
+        if _local_name(child.tag) == name:
+            return child.text or ""
+    return None
+
+
+def _parse_time(text):
+    if not text:
+        return 0
+    moment = datetime.datetime.fromisoformat(text.replace("Z", "+00:00"))
+    return int(moment.timestamp() * 1e9)
+
+
+def _error_code(body):
+    try:
+        return _text(ElementTree.fromstring(body), "Code") or body[:200].decode("utf-8", "replace")
+    except ElementTree.ParseError:
+        return body[:200].decode("utf-8", "replace")
+
+
+class DiskCache:
+    """按总大小限制的磁盘LRU缓存（文件修改时间记录最近使用顺序）"""
+
+    def __init__(self, cache_dir, limit):
+        self.cache_dir = cache_dir
+        self.limit = limit
+        self._index = None  # 键 -> 大小，按最近使用排序
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _load_index(self):
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for dirpath, _, files in os.walk(self.cache_dir):
+                for name in files:
+                    if name.endswith(".tmp"):
+                        continue
+                    st = os.stat(os.path.join(dirpath, name))
+                    entries.append((st.st_mtime_ns, name, st.st_size))
+        entries.sort()
+        self._index = OrderedDict((name, size) for _, name, size in entries)
+        self._bytes = sum(self._index.values())
+
+    def __contains__(self, key):
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            return key in self._index
+
+    def get(self, key):
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            if key not in self._index:
+                return None
+            self._index.move_to_end(key)
+        try:
+            with open(self._path(key), 'rb') as f:
+                data = f.read()
+            os.utime(self._path(key))
+            return data
+        except OSError:
+            with self._lock:
+                self._bytes -= self._index.pop(key, 0)
+            return None
+
+    def read_head(self, key, length):
+        """读取缓存文件开头（不改变使用顺序），不在缓存中时返回None"""
+        if key not in self:
+            return None
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read(length)
+        except OSError:
+            return None
+
+    def put(self, key, data):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            print(f"写入远程图片缓存失败: {e}")
+            return
+        with self._lock:
+            if self._index is None:
+                self._load_index()
+            self._bytes += len(data) - self._index.pop(key, 0)
+            self._index[key] = len(data)
+            while self._bytes > self.limit and len(self._index) > 1:
+                old_key, size = self._index.popitem(last=False)
+                self._bytes -= size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+    def usage(self):
+        with self._lock:
+            return self._bytes
+
+
+class S3Source(LocalSource):
+    """S3兼容对象存储中的图片，路径形如 "s3://桶/键"
+
+    列表按页批量获取，结果（大小、修改时间）在 S3_LISTING_TTL 内复用，stat/exists 不需要逐个请求。
+    下载的对象写入磁盘缓存，大对象分段并行下载；prefetch() 在后台提前下载即将浏览的图片。
+    """
+
+    def __init__(self, client=None, cache=None):
+        self.client = client or S3Client()
+        self.cache = cache or DiskCache(Config.S3_CACHE_DIR, Config.S3_CACHE_MB * 1024 * 1024)
+        self._meta = {}  # 路径 -> (大小, 修改时间ns)
+        self._listed = {}  # 已列出的前缀路径 -> 时间
+        self._inflight = {}  # 路径 -> 下载中的 Future
+        self._lock = threading.Lock()
+        self._prefetch_executor = ThreadPoolExecutor(max_workers=Config.S3_MAX_CONNECTIONS,
+                                                     thread_name_prefix="s3-prefetch")
+        self._range_executor = ThreadPoolExecutor(max_workers=Config.S3_MAX_CONNECTIONS,
+                                                  thread_name_prefix="s3-range")
+
+    # ---- 列表与元数据 ----
+
+    def _list(self, root):
+        """列出前缀下的全部对象并记录元数据，返回路径列表"""
+        bucket, prefix = split_remote_path(root)
+        if prefix and not prefix.endswith("/"):
+            prefix += "/"
+        paths = []
+        meta = {}
+        for key, size, mtime_ns in self.client.list_objects(bucket, prefix):
+            path = f"{REMOTE_PREFIX}{bucket}/{key}"
+            meta[path] = (size, mtime_ns)
+            paths.append(path)
+        with self._lock:
+            self._meta.update(meta)
+            self._listed[root.rstrip("/")] = (time.monotonic(), paths)
+        return paths
+
+    def _listed_paths(self, root):
+        entry = self._listed.get(root.rstrip("/"))
+        if entry and time.monotonic() - entry[0] < Config.S3_LISTING_TTL:
+            return entry[1]
+        return None
+
+    def _covered(self, path):
+        """path 是否位于列表结果仍有效的前缀下（不在列表中即不存在）"""
+        now = time.monotonic()
+        for root, (listed_at, _) in list(self._listed.items()):
+            if path.startswith(root + "/") and now - listed_at < Config.S3_LISTING_TTL:
+                return True
+        return False
+
+    def iter_images(self, root):
+        paths = self._listed_paths(root)
+        if paths is None:
+            try:
+                paths = self._list(root)
+            except OSError as e:
+                print(f"列出远程图片失败: {root}: {e}")
+                return
+        for path in paths:
+            if is_image_name(path):
+                yield path
+
+    def exists(self, path):
+        if path in self._meta:
+            return True
+        bucket, key = split_remote_path(path)
+        try:
+            if not is_image_name(key):
+                # 前缀（图片根目录）：存在任意对象即可
+                return next(iter(self.client.list_objects(bucket, key.rstrip("/") + "/", page_size=1)), None) is not None
+            if self._covered(path):
+                return False
+            self._meta[path] = self.client.head_object(bucket, key)
+            return True
+        except OSError:
+            return False
+
+    def stat(self, path):
+        meta = self._meta.get(path)
+        if meta is None:
+            meta = self._meta[path] = self.client.head_object(*split_remote_path(path))
+        return meta
+
+    # ---- 读取 ----
+
+    def _cache_key(self, path):
+        size, mtime_ns = self.stat(path)
+        return hashlib.sha1(f"{path}|{size}|{mtime_ns}".encode("utf-8")).hexdigest()
+
+    def read(self, path):
+        key = self._cache_key(path)
+        data = self.cache.get(key)
+        if data is not None:
+            return data
+
+        # 同一对象只下载一次，其他线程等待同一个结果
+        with self._lock:
+            future = self._inflight.get(path)
+            owner = future is None
+            if owner:
+                from concurrent.futures import Future
+                future = self._inflight[path] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            data = self._download(path)
+            self.cache.put(key, data)
+            future.set_result(data)
+            return data
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(path, None)
+
+    def _download(self, path):
+        bucket, key = split_remote_path(path)
+        size, _ = self.stat(path)
+        chunk = max(1, int(Config.S3_RANGE_CHUNK_MB * 1024 * 1024))
+        if size <= chunk:
+            return self.client.get_object(bucket, key)
+        parts = self._range_executor.map(
+            lambda start: self.client.get_object(bucket, key, start, min(start + chunk, size) - 1),
+            range(0, size, chunk))
+        return b"".join(parts)
+
+    def read_range(self, path, start, length):
+        """只读取对象的一段（不经过缓存），用于读取文件头等"""
+        bucket, key = split_remote_path(path)
+        return self.client.get_object(bucket, key, start, start + length - 1)
+
+    def read_head(self, path, length):
+        """读取对象开头最多 length 字节：已缓存时取缓存，否则只请求这一段（不写入缓存，不挤掉预取的图片）"""
+        data = self.cache.read_head(self._cache_key(path), length)
+        if data is not None:
+            return data
+        size, _ = self.stat(path)
+        return self.read_range(path, 0, min(length, size)) if size else b""
+
+    def prefetch(self, paths):
+        """在后台下载尚未缓存的图片"""
+        for path in paths:
+            if path in self._inflight:
+                continue
+            if path in self._meta and self._cache_key(path) in self.cache:
+                continue
+            self._prefetch_executor.submit(self._prefetch_one, path)
+
+    def _prefetch_one(self, path):
+        try:
+            self.read(path)
+        except Exception as e:
+            print(f"预取远程图片失败: {path}: {e}")
+
+    def open_image(self, path):
+        from PIL import Image
+        return Image.open(io.BytesIO(self.read(path)))
+
+    def copy(self, path, dest_path):
+        with open(dest_path, 'wb') as f:
+            f.write(self.read(path))
+
+
+_remote_source = None
+_remote_source_lock = threading.Lock()
+
+
+def remote_source():
+    """按 Config 创建（并复用）S3 图片来源"""
+    global _remote_source
+    with _remote_source_lock:
+        if _remote_source is None:
+            _remote_source = S3Source()
+        return _remote_source
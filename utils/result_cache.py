@@ -0,0 +1,73 @@
+import os
+import threading
+
+import numpy as np
+
+
+class ResultCache:
+    """按 (路径, 文件大小, 修改时间) 判断是否失效的逐图片结果缓存，持久化为npz
+
+    npz 中 paths/sizes/mtimes 三列由本类读写，结果本身的列由子类的 _encode/_decode 定义。
+    子类通过 _cached/_store 读写结果（_store 可在多个线程中调用）；save() 在没有变化时跳过，
+    先写临时文件再替换，中途退出不会留下损坏的缓存。
+    """
+
+    NAME = "缓存"  # 用于错误提示
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self._entries = {}  # 绝对路径 -> (size, mtime_ns, 结果)
+        self._lock = threading.Lock()
+        self._dirty = False
+        self.load()
+
+    def _encode(self, values):
+        """结果列表 -> {列名: 数组}"""
+        raise NotImplementedError
+
+    def _decode(self, data):
+        """npz 数据 -> 与 paths 一一对应的结果序列，格式不兼容时返回None（丢弃旧缓存）"""
+        raise NotImplementedError
+
+    def load(self):
+        """从磁盘加载缓存"""
+        if not os.path.exists(self.cache_file):
+            return
+        try:
+            with np.load(self.cache_file, allow_pickle=False) as data:
+                values = self._decode(data)
+                if values is None:
+                    return
+                for path, size, mtime, value in zip(data['paths'], data['sizes'], data['mtimes'], values):
+                    self._entries[str(path)] = (int(size), int(mtime), value)
+        except Exception as e:
+            print(f"加载{self.NAME}失败: {e}")
+
+    def save(self):
+        """写回磁盘（无变化时跳过）"""
+        with self._lock:
+            if not self._dirty:
+                return
+            paths = list(self._entries)
+            entries = [self._entries[p] for p in paths]
+            self._dirty = False
+
+        os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+        tmp_file = self.cache_file + ".tmp.npz"
+        np.savez(tmp_file, paths=np.array(paths, dtype=str),
+                 sizes=np.array([e[0] for e in entries], dtype=np.int64),
+                 mtimes=np.array([e[1] for e in entries], dtype=np.int64),
+                 **self._encode([e[2] for e in entries]))
+        os.replace(tmp_file, self.cache_file)
+
+    def _cached(self, abs_path, stat):
+        """stat 为 (大小, 修改时间ns)；缓存有效时返回结果，否则返回None"""
+        entry = self._entries.get(abs_path)
+        if entry and entry[0] == stat[0] and entry[1] == stat[1]:
+            return entry[2]
+        return None
+
+    def _store(self, abs_path, stat, value):
+        with self._lock:
+            self._entries[abs_path] = (stat[0], stat[1], value)
+            self._dirty = True
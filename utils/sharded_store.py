@@ -0,0 +1,384 @@
+import os
+import json
+from collections.abc import MutableMapping
+import numpy as np
+
+from config import Config
+from utils.annotation_store import ColumnarAnnotations
+
+INDEX_FILE = "index.json"
+SHARD_DIR = "shards"
+
+# 摘要中“有记录但没有类别”的统计键
+_UNLABELED_KEY = "-1"
+
+
+def shard_key(rel_path, depth):
+    """相对路径所属的分片：前 depth 级子目录，根目录下的文件为 ''"""
+    parts = rel_path.replace("\\", "/").split("/")[:-1]
+    return "/".join(parts[:depth])
+
+
+def _write_json(file_path, data):
+    """先写临时文件再替换，避免中途中断留下损坏的文件"""
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp_path, file_path)
+
+
+def is_sharded_project(path):
+    return os.path.isfile(os.path.join(path, INDEX_FILE))
+
+
+class ShardedAnnotations(MutableMapping):
+    """按子目录分片存储的标注
+
+    项目目录下 index.json 保存类别表、各分片文件名及摘要（记录数、各类别数量），
+    shards/ 下每个分片一个JSON文件。分片在首次访问时加载（内存中为 ColumnarAnnotations），
+    保存时只写修改过的分片；全项目统计直接来自摘要，不加载分片。
+
+    分片文件中的记录以类别ID引用 index.json 中的类别表，重命名、合并、删除类别只修改类别表：
+    合并后多个ID指向同一名称，删除的ID指向 null，其记录在加载时丢弃。
+    """
+
+    def __init__(self, project_dir, index):
+        self.project_dir = project_dir
+        self.depth = index.get("shard_depth", Config.SHARD_DEPTH)
+        self.shards = index.get("shards", {})  # 分片键 -> {"file", "count", "stats"}
+        self.category_table = list(index.get("category_table", []))  # 类别ID -> 名称（None 表示已删除）
+        self.categories = list(index.get("categories", []))
+        self._loaded = {}  # 分片键 -> ColumnarAnnotations
+        self._dirty = set()
+        self._fresh = False  # 新建的项目：首次保存时清理目录中遗留的分片文件
+
+    # ---- 项目文件 ----
+
+    @classmethod
+    def open(cls, project_dir):
+        """打开分片项目，返回 (store, 其余项目数据)"""
+        with open(os.path.join(project_dir, INDEX_FILE), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        store = cls(project_dir, index)
+        data = {k: v for k, v in index.items()
+                if k not in ("shards", "category_table", "shard_depth", "layout")}
+        return store, data
+
+    @classmethod
+    def create(cls, project_dir, depth=None, annotations=None, categories=()):
+        """新建分片项目；annotations 不为空时按分片写入（用于从单文件转换）"""
+        store = cls(project_dir, {"shard_depth": depth or Config.SHARD_DEPTH, "categories": list(categories)})
+        store._fresh = True
+        ids = {}
+        for name in store.categories:
+            store._id_for(name, ids)
+        if annotations:
+            groups = {}
+            for rel_path, annotation in annotations.items():
+                groups.setdefault(shard_key(rel_path, store.depth), {})[rel_path] = annotation
+            for key, records in groups.items():
+                store._loaded[key] = ColumnarAnnotations.from_dict(records)
+                store._dirty.add(key)
+                store._write_shard(key)
+                del store._loaded[key]
+        return store
+
+    def _shard_path(self, key):
+        return os.path.join(self.project_dir, SHARD_DIR, self.shards[key]["file"])
+
+    def _category_ids(self):
+        """类别名称 -> 规范ID（同名的多个ID中最小的一个）"""
+        ids = {}
+        for cid, name in enumerate(self.category_table):
+            if name is not None and name not in ids:
+                ids[name] = cid
+        return ids
+
+    def _id_for(self, name, ids):
+        """类别名称的ID，类别表中没有时追加"""
+        cid = ids.get(name)
+        if cid is None:
+            cid = ids[name] = len(self.category_table)
+            self.category_table.append(name)
+        return cid
+
+    def _load(self, key, keep=True):
+        """加载分片；keep=False 时不留在内存中（用于遍历全部标注）"""
+        store = self._loaded.get(key)
+        if store is not None:
+            return store
+        info = self.shards.get(key)
+        if info is None:
+            return None
+
+        with open(self._shard_path(key), 'r', encoding='utf-8') as f:
+            records = json.load(f).get("annotations", {})
+
+        positions = {name: i for i, name in enumerate(self.categories)}
+        annotations = {}
+        for rel_path, record in records.items():
+            record = dict(record)
+            cid = record.pop("category_id", None)
+            if cid is not None:
+                name = self.category_table[cid] if 0 <= cid < len(self.category_table) else None
+                if name is None:
+                    continue  # 类别已删除
+                record["category"] = name
+                if name in positions:
+                    record["category_index"] = positions[name]
+            annotations[rel_path] = record
+
+        store = ColumnarAnnotations.from_dict(annotations)
+        if keep:
+            self._loaded[key] = store
+        return store
+
+    def _shard_for_write(self, rel_path):
+        key = shard_key(rel_path, self.depth)
+        store = self._load(key)
+        if store is None:
+            self.shards[key] = {"file": f"{len(self.shards):06d}.json", "count": 0, "stats": {}}
+            store = self._loaded[key] = ColumnarAnnotations()
+        self._dirty.add(key)
+        return store
+
+    def _summarize(self, key, store, ids):
+        stats, total = store.category_counts()
+        summary = {}
+        for name, count in stats.items():
+            summary[_UNLABELED_KEY if name == '未标注' else str(self._id_for(name, ids))] = count
+        self.shards[key]["count"] = total
+        self.shards[key]["stats"] = summary
+
+    def _write_shard(self, key):
+        store = self._loaded[key]
+        ids = self._category_ids()
+        records = {}
+        for rel_path, record in store.items():
+            name = record.pop("category", None)
+            if name is not None:
+                record["category_id"] = self._id_for(name, ids)
+            records[rel_path] = record
+
+        if key not in self.shards:
+            self.shards[key] = {"file": f"{len(self.shards):06d}.json", "count": 0, "stats": {}}
+        os.makedirs(os.path.join(self.project_dir, SHARD_DIR), exist_ok=True)
+        _write_json(self._shard_path(key), {"shard": key, "annotations": records})
+        self._summarize(key, store, ids)
+        self._dirty.discard(key)
+
+    def save(self, project_data):
+        """写入修改过的分片和索引，project_data 为除 annotations 外的项目数据"""
+        os.makedirs(os.path.join(self.project_dir, SHARD_DIR), exist_ok=True)
+        self.categories = list(project_data.get("categories", self.categories))
+        for key in list(self._dirty):
+            self._write_shard(key)
+        # 已加载分片的摘要可能因类别表变化而过期，一并更新
+        ids = self._category_ids()
+        for name in self.categories:
+            self._id_for(name, ids)
+        for key, store in self._loaded.items():
+            self._summarize(key, store, ids)
+
+        index = {k: v for k, v in project_data.items() if k != "annotations"}
+        index.update({
+            "layout": "sharded",
+            "shard_depth": self.depth,
+            "category_table": self.category_table,
+            "shards": self.shards,
+        })
+        _write_json(os.path.join(self.project_dir, INDEX_FILE), index)
+
+        if self._fresh:
+            referenced = {info["file"] for info in self.shards.values()}
+            shard_dir = os.path.join(self.project_dir, SHARD_DIR)
+            for file_name in os.listdir(shard_dir):
+                if file_name not in referenced:
+                    os.remove(os.path.join(shard_dir, file_name))
+            self._fresh = False
+
+    def release(self, keep_keys):
+        """写回并卸载不在 keep_keys 中的分片，使内存只保留当前工作集"""
+        for key in [k for k in self._loaded if k not in keep_keys]:
+            if key in self._dirty:
+                self._write_shard(key)
+            else:
+                self._summarize(key, self._loaded[key], self._category_ids())
+            del self._loaded[key]
+
+    def shard_keys_for(self, rel_paths):
+        return {shard_key(p, self.depth) for p in rel_paths}
+
+    @property
+    def loaded_shard_count(self):
+        return len(self._loaded)
+
+    @property
+    def dirty_shard_count(self):
+        return len(self._dirty)
+
+    # ---- 字典接口 ----
+
+    def __getitem__(self, rel_path):
+        store = self._load(shard_key(rel_path, self.depth))
+        if store is None:
+            raise KeyError(rel_path)
+        return store[rel_path]
+
+    def __contains__(self, rel_path):
+        store = self._load(shard_key(rel_path, self.depth))
+        return store is not None and rel_path in store
+
+    def __setitem__(self, rel_path, record):
+        self._shard_for_write(rel_path)[rel_path] = record
+
+    def __delitem__(self, rel_path):
+        key = shard_key(rel_path, self.depth)
+        store = self._load(key)
+        if store is None:
+            raise KeyError(rel_path)
+        del store[rel_path]
+        self._dirty.add(key)
+
+    def __len__(self):
+        return sum(len(self._loaded[key]) if key in self._loaded else self._summary_count(info)
+                   for key, info in self.shards.items())
+
+    def _summary_count(self, info):
+        return sum(count for cid, count in info.get("stats", {}).items()
+                   if cid == _UNLABELED_KEY or self.category_table[int(cid)] is not None)
+
+    def items(self):
+        """遍历全部标注；未加载的分片读完即释放"""
+        for key in sorted(self.shards):
+            yield from self._load(key, keep=False).items()
+
+    def __iter__(self):
+        for rel_path, _ in self.items():
+            yield rel_path
+
+    def values(self):
+        for _, record in self.items():
+            yield record
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def iter_labels(self):
+        """逐条产出已标注记录的 (相对路径, 类别)；未加载的分片读完即释放"""
+        for key in sorted(self.shards):
+            yield from self._load(key, keep=False).iter_labels()
+
+    def __repr__(self):
+        return f"<ShardedAnnotations {len(self.shards)} 个分片, 已加载 {len(self._loaded)} 个>"
+
+    # ---- 批量操作（按分片分组） ----
+
+    def _group(self, rel_paths):
+        groups = {}
+        for i, rel_path in enumerate(rel_paths):
+            groups.setdefault(shard_key(rel_path, self.depth), []).append(i)
+        return groups
+
+    def labeled_mask(self, rel_paths):
+        rel_paths = list(rel_paths)
+        mask = np.zeros(len(rel_paths), dtype=bool)
+        for key, positions in self._group(rel_paths).items():
+            store = self._load(key)
+            if store is not None:
+                mask[positions] = store.labeled_mask([rel_paths[i] for i in positions])
+        return mask
+
+    def categories_of(self, rel_paths):
+        rel_paths = list(rel_paths)
+        categories = [None] * len(rel_paths)
+        for key, positions in self._group(rel_paths).items():
+            store = self._load(key)
+            if store is not None:
+                for i, category in zip(positions, store.categories_of([rel_paths[i] for i in positions])):
+                    categories[i] = category
+        return categories
+
+    def category_counts(self, rel_paths=None):
+        """各类别数量；rel_paths 为空时统计整个项目（未加载的分片使用摘要）"""
+        stats = {}
+        total = 0
+        if rel_paths is None:
+            for key, info in self.shards.items():
+                if key in self._loaded:
+                    shard_stats, shard_total = self._loaded[key].category_counts()
+                else:
+                    shard_stats, shard_total = {}, 0
+                    for cid, count in info.get("stats", {}).items():
+                        name = '未标注' if cid == _UNLABELED_KEY else self.category_table[int(cid)]
+                        if name is not None:
+                            shard_stats[name] = shard_stats.get(name, 0) + count
+                            shard_total += count
+                for name, count in shard_stats.items():
+                    stats[name] = stats.get(name, 0) + count
+                total += shard_total
+            return stats, total
+
+        rel_paths = list(rel_paths)
+        for key, positions in self._group(rel_paths).items():
+            store = self._load(key)
+            if store is None:
+                continue
+            shard_stats, shard_total = store.category_counts([rel_paths[i] for i in positions])
+            for name, count in shard_stats.items():
+                stats[name] = stats.get(name, 0) + count
+            total += shard_total
+        return stats, total
+
+    def paths_with_category(self, name):
+        """已加载分片中某类别的路径"""
+        paths = []
+        for store in self._loaded.values():
+            paths.extend(store.paths_with_category(name))
+        return paths
+
+    def assign(self, rel_paths, category_name, category_index, timestamp):
+        rel_paths = list(rel_paths)
+        for key, positions in self._group(rel_paths).items():
+            store = self._shard_for_write(rel_paths[positions[0]])
+            store.assign([rel_paths[i] for i in positions], category_name, category_index, timestamp)
+        return len(rel_paths)
+
+    # ---- 类别表操作：只修改类别表和已加载的分片 ----
+
+    def _count_category(self, name):
+        return self.category_counts()[0].get(name, 0)
+
+    def rename_category(self, old_name, new_name):
+        if old_name == new_name:
+            return 0
+        if new_name in self._category_ids():
+            return self.merge_categories([old_name], new_name)
+        count = self._count_category(old_name)
+        self.category_table = [new_name if n == old_name else n for n in self.category_table]
+        for store in self._loaded.values():
+            store.rename_category(old_name, new_name)
+        return count
+
+    def merge_categories(self, source_names, target_name):
+        sources = set(source_names) - {target_name}
+        count = sum(self._count_category(name) for name in sources)
+        if target_name not in self._category_ids():
+            self.category_table.append(target_name)
+        self.category_table = [target_name if n in sources else n for n in self.category_table]
+        for store in self._loaded.values():
+            store.merge_categories(list(sources), target_name)
+        return count
+
+    def delete_category(self, name):
+        count = self._count_category(name)
+        self.category_table = [None if n == name else n for n in self.category_table]
+        for store in self._loaded.values():
+            store.delete_category(name)
+        return count
+
+    def sync_category_indices(self, categories):
+        """未加载的分片在加载时按类别列表重新计算 category_index"""
+        self.categories = list(categories)
+        for store in self._loaded.values():
+            store.sync_category_indices(categories)
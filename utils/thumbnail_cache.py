@@ -0,0 +1,200 @@
+import os
+import io
+import hashlib
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from config import Config
+from utils.image_source import image_stat, open_image, canonical_path
+from utils.memory_budget import memory_budget
+
+
+def thumbnail_key(image_path, thumb_size):
+    """根据 (路径, 文件大小, 修改时间, 缩略图尺寸) 计算缓存键"""
+    size, mtime_ns = image_stat(image_path)
+    raw = f"{canonical_path(image_path)}|{size}|{mtime_ns}|{thumb_size}"
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def make_thumbnail(image_path, thumb_size):
+    """生成缩略图，返回JPEG编码的字节串"""
+    from PIL import Image  # 延迟导入，加快启动
+
+    with open_image(image_path) as pil_image:
+        # JPEG可以在解码阶段直接按比例缩小，避免完整解码
+        pil_image.draft('RGB', (thumb_size, thumb_size))
+        pil_image.thumbnail((thumb_size, thumb_size), Image.Resampling.BILINEAR)
+        if pil_image.mode != 'RGB':
+            pil_image = pil_image.convert('RGB')
+        buffer = io.BytesIO()
+        pil_image.save(buffer, format='JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class ThumbnailCache:
+    """缩略图缓存：内存LRU + 磁盘LRU，后台线程池生成"""
+
+    def __init__(self, cache_dir=None, thumb_size=None, memory_limit=None, disk_limit=None, max_workers=None):
+        self.cache_dir = cache_dir or Config.THUMBNAIL_CACHE_DIR
+        self.thumb_size = thumb_size or Config.THUMBNAIL_SIZE
+        self.memory_limit = memory_limit or Config.THUMBNAIL_MEMORY_CACHE_MB * 1024 * 1024
+        self.disk_limit = disk_limit or Config.THUMBNAIL_DISK_CACHE_MB * 1024 * 1024
+
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()  # key -> bytes
+        self._memory_bytes = 0
+        self._disk = None  # key -> 文件大小，按最近使用排序，首次使用时从磁盘扫描
+        self._disk_bytes = 0
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or Config.THUMBNAIL_WORKERS,
+                                            thread_name_prefix="thumbnail")
+        self._budget = memory_budget.register("缩略图", self._evict_memory)
+
+    def _disk_path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".jpg")
+
+    def _load_disk_index(self):
+        """扫描磁盘缓存目录，按修改时间重建LRU顺序"""
+        entries = []
+        if os.path.isdir(self.cache_dir):
+            for root, dirs, files in os.walk(self.cache_dir):
+                for file in files:
+                    if not file.endswith(".jpg"):
+                        continue
+                    try:
+                        st = os.stat(os.path.join(root, file))
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime_ns, file[:-4], st.st_size))
+        entries.sort()
+        self._disk = OrderedDict((key, size) for _, key, size in entries)
+        self._disk_bytes = sum(self._disk.values())
+
+    def _remember(self, key, data):
+        """放入内存LRU并按容量淘汰（调用方持有锁），返回淘汰的键"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return []
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        dropped = []
+        while self._memory_bytes > self.memory_limit and len(self._memory) > 1:
+            old_key, old = self._memory.popitem(last=False)
+            self._memory_bytes -= len(old)
+            dropped.append(old_key)
+        return dropped
+
+    def _update_budget(self, key, data, dropped):
+        """在锁外通知内存预算（预算可能回调 _evict_memory）"""
+        self._budget.release(*dropped)
+        self._budget.charge(key, len(data))
+
+    def _evict_memory(self, key):
+        """内存预算不足时淘汰"""
+        with self._lock:
+            data = self._memory.pop(key, None)
+            if data is not None:
+                self._memory_bytes -= len(data)
+
+    def _trim_disk(self):
+        """磁盘缓存超出上限时删除最久未使用的缩略图（调用方持有锁）"""
+        while self._disk_bytes > self.disk_limit and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._disk_path(key))
+            except OSError:
+                pass
+
+    def get(self, image_path):
+        """只查缓存，不生成；未命中返回None"""
+        try:
+            key = thumbnail_key(image_path, self.thumb_size)
+        except OSError:
+            return None
+
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+        if data is not None:
+            self._budget.touch(key)
+            return data
+
+        with self._lock:
+            if self._disk is None:
+                self._load_disk_index()
+            if key not in self._disk:
+                return None
+            self._disk.move_to_end(key)
+
+        disk_path = self._disk_path(key)
+        try:
+            with open(disk_path, 'rb') as f:
+                data = f.read()
+            # 刷新修改时间，保证重启后LRU顺序仍然正确
+            os.utime(disk_path)
+        except OSError:
+            with self._lock:
+                size = self._disk.pop(key, 0)
+                self._disk_bytes -= size
+            return None
+
+        with self._lock:
+            dropped = self._remember(key, data)
+        self._update_budget(key, data, dropped)
+        return data
+
+    def get_or_create(self, image_path):
+        """查缓存，未命中则生成并写入磁盘"""
+        data = self.get(image_path)
+        if data is not None:
+            return data
+
+        key = thumbnail_key(image_path, self.thumb_size)
+        data = make_thumbnail(image_path, self.thumb_size)
+
+        disk_path = self._disk_path(key)
+        os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+        tmp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, disk_path)
+
+        with self._lock:
+            if self._disk is None:
+                self._load_disk_index()
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+            self._trim_disk()
+            dropped = self._remember(key, data)
+        self._update_budget(key, data, dropped)
+        return data
+
+    def request(self, image_path, callback):
+        """在线程池中获取缩略图，完成后以 callback(image_path, data) 回调（data为None表示失败）"""
+        def task():
+            try:
+                data = self.get_or_create(image_path)
+            except Exception as e:
+                print(f"生成缩略图失败: {image_path}: {e}")
+                data = None
+            callback(image_path, data)
+
+        return self._executor.submit(task)
+
+    def memory_usage(self):
+        """内存缓存占用字节数"""
+        return self._memory_bytes
+
+    def disk_usage(self):
+        """磁盘缓存占用字节数"""
+        with self._lock:
+            if self._disk is None:
+                self._load_disk_index()
+            return self._disk_bytes
+
+    def shutdown(self):
+        """停止线程池，丢弃尚未开始的任务"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._budget.close()